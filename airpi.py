@@ -18,22 +18,32 @@ sys.dont_write_bytecode = True
 
 # We don't import individual sensors classes etc.
 # here because they are imported dynamically below.
-import socket
-import RPi.GPIO as GPIO
+import argparse
 import ConfigParser
 import datetime
 import time
 import inspect
 import os
 import signal
-import urllib2
 import logging
+import json
+import resource
 import subprocess
+import threading
+import Queue
+import collections
+import functools
 from logging import handlers
-from math import isnan
+from math import isnan, floor
 from sensors import sensor
+from sensors import clock
+from sensors import hal
 from outputs import output
 from supports import support
+from supports import sampleframe
+from supports import aggregator
+from supports import replay
+from supports import envprobe
 from notifications import notification
 
 class MissingField(Exception):
@@ -100,24 +110,146 @@ def get_subclasses(mod, cls):
         if hasattr(obj, "__bases__") and cls in obj.__bases__:
             return obj
 
+class StartupTimer(object):
+    """Record how long each part of starting up takes."""
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.started = clock.monotonic()
+        self.last = self.started
+        self.stages = []
+        self.plugins = []
+        self.lock = threading.Lock()
+
+    def mark(self, stage):
+        """Record that a stage of starting up has finished.
+
+        Args:
+            self: self.
+            stage: The name of the stage.
+
+        """
+        now = clock.monotonic()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def plugin(self, name, seconds):
+        """Record how long a plugin took to initialise.
+
+        Args:
+            self: self.
+            name: The name of the plugin.
+            seconds: How long it took.
+
+        """
+        with self.lock:
+            self.plugins.append((name, seconds))
+
+    def summary(self, slowest=3):
+        """Describe how long starting up took.
+
+        Args:
+            self: self.
+            slowest: How many of the slowest plugins to list.
+
+        Returns:
+            string The total time, the time for each stage, and the
+                   slowest plugins.
+
+        """
+        total = self.last - self.started
+        msg = "%.2f s (" % total
+        msg += ", ".join("%s %.2f s" % stage for stage in self.stages) + ")"
+        plugins = sorted(self.plugins, key=lambda plugin: -plugin[1])
+        if plugins:
+            msg += "; slowest plugins: "
+            msg += ", ".join("%s %.2f s" % plugin
+                             for plugin in plugins[:slowest])
+        return msg
+
+def init_plugins(jobs):
+    """Create plugin instances, several at once.
+
+    Plugins from different modules are created at the same time as each
+    other, so that one plugin's slow I/O (e.g. reading calibration data
+    from a chip) doesn't hold up the rest. Plugins from the same module
+    are created one after another, in the order given, because they may
+    share hardware or module-level state. Modules must already have been
+    imported.
+
+    Args:
+        jobs: List of (name, module filename, factory) tuples, where
+              calling factory() creates the plugin instance.
+
+    Returns:
+        list An (instance, exception) tuple for each job, in the order
+             given. The exception is None if the instance was created,
+             and the instance is None if it wasn't.
+
+    """
+    results = [(None, None)] * len(jobs)
+    groups = collections.OrderedDict()
+    for index, job in enumerate(jobs):
+        groups.setdefault(job[1], []).append(index)
+
+    def create(indexes):
+        """Create the plugins for one module."""
+        for index in indexes:
+            name, _, factory = jobs[index]
+            started = clock.monotonic()
+            try:
+                results[index] = (factory(), None)
+            except Exception as excep:
+                results[index] = (None, excep)
+            STARTUP.plugin(name, clock.monotonic() - started)
+
+    threads = []
+    for filename, indexes in groups.items():
+        thread = threading.Thread(target=create, args=(indexes,),
+                                  name="Init-" + filename)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return results
+
 def check_conn():
     """Check internet connectivity.
 
-    Check for internet connectivity by trying to connect to a website.
+    Check for internet connectivity. The check is shared with the
+    plugins, and re-checked in the background (see
+    supports/envprobe.py).
 
     Returns:
-        boolean True if successfully connects to the site within five
-                seconds.
-        boolean False if fails to connect to the site within five
-                seconds.
+        boolean True if there was internet connectivity when last
+                checked.
 
     """
-    try:
-        urllib2.urlopen("http://www.google.com", timeout=5)
-        return True
-    except urllib2.URLError:
-        pass
-    return False
+    return envprobe.connected()
+
+def conn_changed(online):
+    """Report that internet connectivity has been lost or has returned.
+
+    Args:
+        online: Whether there is now internet connectivity.
+
+    """
+    if online:
+        msg = "Internet connectivity has returned."
+        msg = format_msg(msg, 'info')
+    else:
+        msg = "Internet connectivity has been lost; internet outputs will"
+        msg += " resume when it returns."
+        msg = format_msg(msg, 'warning')
+    logthis("error", msg)
+    if SETTINGS['PRINTERRORS']:
+        print(msg)
 
 def led_setup(redpin, greenpin):
     """Set up AirPi LEDs.
@@ -130,9 +262,10 @@ def led_setup(redpin, greenpin):
         greenpin: GPIO pin number for green pin.
 
     """
+    GPIO = hal.gpio()
     if redpin:
         GPIO.setup(redpin, GPIO.OUT, initial=GPIO.LOW)
-    if redpin:
+    if greenpin:
         GPIO.setup(greenpin, GPIO.OUT, initial=GPIO.LOW)
 
 def led_on(pin):
@@ -144,6 +277,7 @@ def led_on(pin):
         pin: Pin number of the LED to turn on.
 
     """
+    GPIO = hal.gpio()
     GPIO.output(pin, GPIO.HIGH)
 
 def led_off(pin):
@@ -155,8 +289,140 @@ def led_off(pin):
         pin: Pin number of the LED to turn off.
 
     """
+    GPIO = hal.gpio()
     GPIO.output(pin, GPIO.LOW)
 
+class LedController(object):
+    """Drive the AirPi LEDs from a background thread.
+
+    The sampling loop only posts events ('success', 'fail') to a queue,
+    so it never has to wait for an LED to be turned off again. The
+    controller thread turns the LEDs on and off to show these patterns:
+    + success pulse - the green LED is lit for 'flashtime' seconds.
+    + fail pulse    - the red LED is lit for 'flashtime' seconds.
+    + constant fail - the red LED is lit until sampling stops.
+    + heartbeat     - the green LED blinks briefly every 'heartbeat'
+                      seconds, to show that the AirPi is still running.
+    A pin number of 0 disables that LED.
+
+    """
+
+    BEATTIME = 0.1
+
+    def __init__(self, redpin, greenpin, flashtime, heartbeat):
+        """Initialise.
+
+        Start the controller thread. It is a daemon thread, so it will
+        not prevent the AirPi from stopping.
+
+        Args:
+            self: self.
+            redpin: GPIO pin number for the red LED.
+            greenpin: GPIO pin number for the green LED.
+            flashtime: How long (seconds) an LED stays lit for a pulse.
+            heartbeat: Seconds between heartbeat blinks; 0 to disable.
+
+        """
+        self.pins = {"red": redpin, "green": greenpin}
+        self.flashtime = flashtime
+        self.heartbeat = heartbeat
+        self.events = Queue.Queue()
+        self.thread = threading.Thread(target=self.run, name="leds")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def success(self):
+        """Show a successful sample (green pulse)."""
+        self.events.put(("pulse", "green"))
+
+    def fail(self, constant):
+        """Show a failed sample.
+
+        Args:
+            self: self.
+            constant: If True, keep the red LED lit until sampling
+                      stops; otherwise pulse it.
+
+        """
+        if constant:
+            self.events.put(("constant", "red"))
+        else:
+            self.events.put(("pulse", "red"))
+
+    def stop(self, timeout=2):
+        """Turn off all LEDs and stop the controller thread.
+
+        Args:
+            self: self.
+            timeout: Maximum time (seconds) to wait for the thread.
+
+        """
+        self.events.put(("stop", None))
+        self.thread.join(timeout)
+
+    def set(self, colour, lit):
+        """Turn an LED on or off.
+
+        Args:
+            self: self.
+            colour: The LED to change ('red' or 'green').
+            lit: True to turn it on, False to turn it off.
+
+        """
+        pin = self.pins[colour]
+        if not pin:
+            return
+        try:
+            if lit:
+                led_on(pin)
+            else:
+                led_off(pin)
+        except Exception as excep:
+            msg = "Could not set " + colour + " LED: " + str(excep)
+            msg = format_msg(msg, 'error')
+            logthis("error", msg)
+
+    def run(self):
+        """Handle LED events and timers, until stopped."""
+        # When each lit LED should be turned off (None = stay lit)
+        offat = {}
+        nextbeat = None
+        if self.heartbeat > 0:
+            nextbeat = clock.monotonic() + self.heartbeat
+        while True:
+            timers = [when for when in offat.values() if when is not None]
+            if nextbeat is not None:
+                timers.append(nextbeat)
+            try:
+                if timers:
+                    wait = max(0, min(timers) - clock.monotonic())
+                    event, colour = self.events.get(True, wait)
+                else:
+                    event, colour = self.events.get()
+            except Queue.Empty:
+                event, colour = None, None
+            now = clock.monotonic()
+            if event == "stop":
+                for colour in self.pins:
+                    self.set(colour, False)
+                return
+            elif event == "pulse":
+                if colour not in offat or offat[colour] is not None:
+                    offat[colour] = now + self.flashtime
+                    self.set(colour, True)
+            elif event == "constant":
+                offat[colour] = None
+                self.set(colour, True)
+            for colour, when in list(offat.items()):
+                if when is not None and when <= now:
+                    del offat[colour]
+                    self.set(colour, False)
+            if nextbeat is not None and nextbeat <= now:
+                nextbeat = now + self.heartbeat
+                if "green" not in offat:
+                    offat["green"] = now + self.BEATTIME
+                    self.set("green", True)
+
 def get_serial():
     """Get Raspberry Pi serial no.
 
@@ -182,16 +448,87 @@ def get_serial():
 def get_hostname():
     """Get current hostname.
 
-    Get the current hostname of the Raspberry Pi.
+    Get the current hostname of the Raspberry Pi. The lookup is shared
+    with the plugins (see supports/envprobe.py).
 
     Returns:
         string The hostname.
 
     """
-    if socket.gethostname().find('.') >= 0:
-        return socket.gethostname()
-    else:
-        return socket.gethostbyaddr(socket.gethostname())[0]
+    return envprobe.hostname()
+
+def get_commit():
+    """Get the Git commit of this copy of the AirPi code.
+
+    Returns:
+        string The commit hash, or None if it can't be found (e.g. Git
+               isn't installed, or this isn't a Git checkout).
+
+    """
+    try:
+        proc = subprocess.Popen(["git", "rev-parse", "HEAD"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        commit, _ = proc.communicate()
+    except OSError:
+        return None
+    if proc.returncode != 0:
+        return None
+    return commit.strip()
+
+def parse_args():
+    """Parse command line arguments.
+
+    Returns:
+        argparse.Namespace The arguments.
+
+    """
+    parser = argparse.ArgumentParser(description="Run the AirPi.")
+    parser.add_argument("--simulate", action="store_true",
+        help="use simulated hardware instead of the Raspberry Pi's (the "
+             "same as setting the AIRPI_HAL environment variable to 'sim')")
+    parser.add_argument("--benchmark", type=int, metavar="N",
+        help="take N samples from simulated hardware as fast as possible, "
+             "then report the throughput and timings as JSON")
+    parser.add_argument("--report", metavar="FILE",
+        help="write the benchmark report to FILE rather than printing it")
+    parser.add_argument("--replay", metavar="FILE",
+        help="instead of reading the sensors, replay the samples recorded "
+             "in FILE by the CSV or JSON output")
+    parser.add_argument("--speed", type=parse_speed, default=0,
+        metavar="SPEED",
+        help="how fast to replay: 'max' (as fast as possible; the default), "
+             "'realtime', or a multiple of real time such as '10x'")
+    args = parser.parse_args()
+    if args.benchmark is not None and args.benchmark < 1:
+        parser.error("--benchmark must be at least 1")
+    return args
+
+def parse_speed(speed):
+    """Parse the --speed command line argument.
+
+    Args:
+        speed: 'max', 'realtime', or a multiple of real time (e.g. '10x').
+
+    Returns:
+        float The multiple of real time, or 0 for as fast as possible.
+
+    Raises:
+        argparse.ArgumentTypeError: The speed is not recognised.
+
+    """
+    speed = speed.strip().lower()
+    if speed == "max":
+        return 0
+    if speed == "realtime":
+        return 1.0
+    try:
+        multiple = float(speed.rstrip("x"))
+    except ValueError:
+        multiple = 0
+    if multiple <= 0:
+        raise argparse.ArgumentTypeError("invalid speed '" + speed + "'")
+    return multiple
 
 def set_cfg_paths():
     """Set paths to cfg files.
@@ -298,6 +635,7 @@ def set_up_supports():
     SUPPORTNAMES = SUPPORTCONFIG.sections()
 
     supportplugins = {}
+    pending = []
 
     for plugin in SUPPORTNAMES:
         try:
@@ -346,25 +684,9 @@ def set_up_supports():
                     print(msg)
                     raise
 
-                try:
-                    logthis("info", "Starting to set instclass for " + filename)
-                    instclass = supportclass(SUPPORTCONFIG)
-                    logthis("info", "Support plugin params are: " + str(instclass.params))
-                    msg = "Successfully set instclass for " + filename
-                    msg = format_msg(msg, 'success')
-                    logthis("info", msg)
-
-                    supportplugins[instclass.name.lower()] = instclass
-                    msg = "Loaded support plugin " + str(plugin)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
-                    LOGGER.info("*******************")
-
-                except Exception as excep:
-                    msg = "Failed to import support plugin " + plugin
-                    msg = format_msg(msg, 'error')
-                    print(msg)
-                    logthis("info", msg)
+                logthis("info", "Starting to set instclass for " + filename)
+                pending.append((plugin, filename,
+                    functools.partial(supportclass, SUPPORTCONFIG)))
 
             else:
                 # Plugin is not enabled
@@ -375,7 +697,30 @@ def set_up_supports():
             msg = format_msg(msg, 'error')
             print(msg)
             raise excep
-        
+
+    # Create the plugins
+    results = init_plugins(pending)
+    for (plugin, filename, _), (instclass, excep) in zip(pending, results):
+        try:
+            if excep is not None:
+                raise excep
+            logthis("info", "Support plugin params are: " + str(instclass.params))
+            msg = "Successfully set instclass for " + filename
+            msg = format_msg(msg, 'success')
+            logthis("info", msg)
+
+            supportplugins[instclass.name.lower()] = instclass
+            msg = "Loaded support plugin " + str(plugin)
+            msg = format_msg(msg, 'success')
+            print(msg)
+            LOGGER.info("*******************")
+
+        except Exception as excep:
+            msg = "Failed to import support plugin " + plugin
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("info", msg)
+
     return supportplugins
 
 def set_up_sensors():
@@ -402,7 +747,9 @@ def set_up_sensors():
     SENSORNAMES = SENSORCONFIG.sections()
 
     sensorplugins = []
+    pending = []
 
+    GPIO = hal.gpio()
     GPIO.setwarnings(False)
     GPIO.setmode(GPIO.BCM) #Use BCM GPIO numbers.
 
@@ -468,28 +815,71 @@ def set_up_sensors():
                 plugindata = define_plugin_params(SENSORCONFIG,
                                 i, reqd, opt, common)
 
-                try:
-                    instclass = sensorclass(plugindata)
-                except Exception:
-                    msg = " GPS instance not created - socket not set up?"
-                    msg = format_msg(msg, 'error')
-                    LOGGER.error(msg)
-                    raise
+                pending.append((i, filename, sensorclass, plugindata))
+        except Exception as excep:
+            # TODO: add specific exception for missing module
+            msg = "Did not import sensor plugin " + str(i) + ": " + str(excep)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            continue
 
-                # Check for a getval() method
-                if callable(getattr(instclass, "getval", None)):
-                    sensorplugins.append(instclass)
-                    # Store sensorplugins array length for GPS plugin
-                    if "serial_gps" in filename:
-                        global gpsplugininstance
-                        gpsplugininstance = instclass
-                    msg = "Loaded sensor plugin " + str(i)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
-                else:
-                    msg = "Loaded sensor support plugin " + str(i)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
+    # Create the plugins. Sensor support plugins (those without getval(),
+    # e.g. the MCP3008) are created first, because other sensors use them.
+    results = {}
+    for supportstage in [True, False]:
+        jobs = [(i, filename, functools.partial(sensorclass, plugindata))
+                for i, filename, sensorclass, plugindata in pending
+                if callable(getattr(sensorclass, "getval", None)) !=
+                    supportstage]
+        results.update(zip([job[0] for job in jobs], init_plugins(jobs)))
+
+    for i, filename, _, _ in pending:
+        try:
+            instclass, excep = results[i]
+            if excep is not None:
+                msg = " GPS instance not created - socket not set up?"
+                msg = format_msg(msg, 'error')
+                LOGGER.error(msg)
+                raise excep
+
+            # How long a concurrent read may take before the
+            # reading is marked as stale
+            instclass.deadline = SETTINGS['DEADLINE']
+            if SENSORCONFIG.has_option(i, "deadline"):
+                instclass.deadline = SENSORCONFIG.getfloat(i, "deadline")
+
+            # How long before each sample the sensor's start() is called
+            if SENSORCONFIG.has_option(i, "leadtime"):
+                instclass.leadtime = SENSORCONFIG.getfloat(i, "leadtime")
+
+            # How often the sensor is read, as a whole number of
+            # sample periods (ticks)
+            instclass.tickinterval = 1
+            if SENSORCONFIG.has_option(i, "interval"):
+                instclass.tickinterval = get_tickinterval(i,
+                    SENSORCONFIG.getfloat(i, "interval"))
+
+            # Which statistic to report when averaging (None means
+            # the default for the type of reading)
+            instclass.aggregate = None
+            if SENSORCONFIG.has_option(i, "aggregate"):
+                instclass.aggregate = SENSORCONFIG.get(i, "aggregate")
+                aggregator.parse_statistic(instclass.aggregate)
+
+            # Check for a getval() method
+            if callable(getattr(instclass, "getval", None)):
+                sensorplugins.append(instclass)
+                # Store sensorplugins array length for GPS plugin
+                if "serial_gps" in filename:
+                    global gpsplugininstance
+                    gpsplugininstance = instclass
+                msg = "Loaded sensor plugin " + str(i)
+                msg = format_msg(msg, 'success')
+                print(msg)
+            else:
+                msg = "Loaded sensor support plugin " + str(i)
+                msg = format_msg(msg, 'success')
+                print(msg)
         except Exception as excep:
             # TODO: add specific exception for missing module
             msg = "Did not import sensor plugin " + str(i) + ": " + str(excep)
@@ -503,6 +893,33 @@ def set_up_sensors():
     if any_plugins_enabled(sensorplugins, 'sensor'):
         return sensorplugins
 
+def get_tickinterval(name, interval):
+    """Convert a sensor's sampling interval into a number of ticks.
+
+    Sensors can only be read on a tick of the scheduler, so an interval
+    which is not a whole multiple of sampleFreq is rounded to the
+    nearest one (and is never less than one tick).
+
+    Args:
+        name: The name of the sensor, as in sensors.cfg.
+        interval: The requested sampling interval (seconds).
+
+    Returns:
+        int The number of ticks between readings of the sensor.
+
+    """
+    period = SETTINGS['SAMPLEFREQ']
+    if period <= 0:
+        return 1
+    ticks = max(1, int(round(interval / period)))
+    if abs(ticks * period - interval) > 1e-6:
+        msg = "Sampling interval for " + name + " rounded to "
+        msg += str(ticks * period) + " seconds (a multiple of sampleFreq)."
+        msg = format_msg(msg, 'warning')
+        print(msg)
+        logthis("error", msg)
+    return ticks
+
 def set_up_outputs():
     """Set up AirPi output plugins.
 
@@ -529,6 +946,7 @@ def set_up_outputs():
         OUTPUTNAMES.remove("Notes")
 
     outputplugins = []
+    pending = []
 
     for plugin in OUTPUTNAMES:
         try:
@@ -577,25 +995,9 @@ def set_up_outputs():
                     print(msg)
                     raise
 
-                try:
-                    logthis("info", "Starting to set instclass for " + filename)
-                    instclass = outputclass(OUTPUTCONFIG)
-                    logthis("info", "Output plugin params are: " + str(instclass.params))
-                    msg = "Successfully set instclass for " + filename
-                    msg = format_msg(msg, 'success')
-                    logthis("info", msg)
-
-                    outputplugins.append(instclass)
-                    msg = "Loaded output plugin " + instclass.name
-                    msg = format_msg(msg, 'success')
-                    print(msg)
-                    LOGGER.info("*******************")
-
-                except Exception as excep:
-                    msg = "Failed to import plugin " + plugin + ": " + str(excep)
-                    msg = format_msg(msg, 'error')
-                    print(msg)
-                    logthis("info", msg)
+                logthis("info", "Starting to set instclass for " + filename)
+                pending.append((plugin, filename,
+                    functools.partial(outputclass, OUTPUTCONFIG)))
 
         except Exception as excep: #add specific exception for missing module
             msg = "Did not import output plugin " + str(plugin) + ": " + str(excep)
@@ -603,6 +1005,31 @@ def set_up_outputs():
             print(msg)
             raise excep
 
+    # Create the plugins
+    results = init_plugins(pending)
+    for (plugin, filename, _), (instclass, excep) in zip(pending, results):
+        try:
+            if excep is not None:
+                raise excep
+            if instclass.timeout is None:
+                instclass.timeout = SETTINGS['OUTPUTTIMEOUT']
+            logthis("info", "Output plugin params are: " + str(instclass.params))
+            msg = "Successfully set instclass for " + filename
+            msg = format_msg(msg, 'success')
+            logthis("info", msg)
+
+            outputplugins.append(instclass)
+            msg = "Loaded output plugin " + instclass.name
+            msg = format_msg(msg, 'success')
+            print(msg)
+            LOGGER.info("*******************")
+
+        except Exception as excep:
+            msg = "Failed to import plugin " + plugin + ": " + str(excep)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("info", msg)
+
     if any_plugins_enabled(outputplugins, 'output'):
         # TODO: Fix this to look at plugin.params["target"]
         #return fix_duplicate_outputs(outputplugins)
@@ -737,6 +1164,7 @@ def set_up_notifications():
     NOTIFICATIONNAMES.remove("Common")
 
     notificationPlugins = []
+    pending = []
 
     for i in NOTIFICATIONNAMES:
         try:
@@ -803,22 +1231,40 @@ def set_up_notifications():
                     print(msg)
                     logthis("info", msg)
                 else:
-                    instclass = notificationclass(plugindata)
-                    instclass.async = plugindata['async']
+                    pending.append((i, filename, notificationclass,
+                        plugindata))
 
-                # check for a sendnotification function
-                if callable(getattr(instclass, "sendnotification", None)):
-                    notificationPlugins.append(instclass)
-                    msg = "Loaded notification plugin " + str(i)
-                    msg = format_msg(msg, 'success')
-                    print(msg)
-                    logthis("info", msg)
-                else:
-                    msg = "No callable sendnotification() function"
-                    msg += " for notification plugin " + str(i)
-                    msg = format_msg(msg, 'error')
-                    print(msg)
-                    logthis("info", msg)
+        except Exception as excep:
+            msg = "Did not import notification plugin " + str(i) + ": "
+            msg += str(excep)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("error", msg)
+            raise excep
+
+    # Create the plugins
+    results = init_plugins([(i, filename,
+        functools.partial(notificationclass, plugindata))
+        for i, filename, notificationclass, plugindata in pending])
+    for (i, _, _, plugindata), (instclass, excep) in zip(pending, results):
+        try:
+            if excep is not None:
+                raise excep
+            instclass.async = plugindata['async']
+
+            # check for a sendnotification function
+            if callable(getattr(instclass, "sendnotification", None)):
+                notificationPlugins.append(instclass)
+                msg = "Loaded notification plugin " + str(i)
+                msg = format_msg(msg, 'success')
+                print(msg)
+                logthis("info", msg)
+            else:
+                msg = "No callable sendnotification() function"
+                msg += " for notification plugin " + str(i)
+                msg = format_msg(msg, 'error')
+                print(msg)
+                logthis("info", msg)
 
         except Exception as excep:
             msg = "Did not import notification plugin " + str(i) + ": "
@@ -885,15 +1331,99 @@ def set_settings():
     if mainconfig.has_option("Sampling", "dummyduration"):
         settingslist['DUMMYDURATION'] = mainconfig.getint("Sampling",
             "dummyduration")
+    # Scheduling
+    settingslist['ALIGN'] = True # Default
+    if mainconfig.has_option("Sampling", "align"):
+        settingslist['ALIGN'] = mainconfig.getboolean("Sampling", "align")
+    settingslist['MISSED'] = "skip" # Default
+    if mainconfig.has_option("Sampling", "missed"):
+        settingslist['MISSED'] = mainconfig.get("Sampling", "missed").lower()
+    if settingslist['MISSED'] not in ["skip", "catchup"]:
+        msg = "missed must be either 'skip' or 'catchup'."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("error", msg)
+        sys.exit(1)
+    # Acquisition
+    settingslist['ACQUISITION'] = "serial" # Default
+    if mainconfig.has_option("Sampling", "acquisition"):
+        settingslist['ACQUISITION'] = mainconfig.get("Sampling",
+            "acquisition").lower()
+    if settingslist['ACQUISITION'] not in ["serial", "concurrent"]:
+        msg = "acquisition must be either 'serial' or 'concurrent'."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("error", msg)
+        sys.exit(1)
+    settingslist['WORKERS'] = 4 # Default
+    if mainconfig.has_option("Sampling", "workers"):
+        settingslist['WORKERS'] = mainconfig.getint("Sampling", "workers")
+    settingslist['DEADLINE'] = 2.0 # Default
+    if mainconfig.has_option("Sampling", "deadline"):
+        settingslist['DEADLINE'] = mainconfig.getfloat("Sampling", "deadline")
+    # Multi-rate sampling
+    settingslist['FRAMES'] = "merged" # Default
+    if mainconfig.has_option("Sampling", "frames"):
+        settingslist['FRAMES'] = mainconfig.get("Sampling", "frames").lower()
+    if settingslist['FRAMES'] not in ["merged", "stream"]:
+        msg = "frames must be either 'merged' or 'stream'."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("error", msg)
+        sys.exit(1)
+    # Outputs
+    settingslist['OUTPUTMODE'] = "direct" # Default
+    if mainconfig.has_option("Outputs", "mode"):
+        settingslist['OUTPUTMODE'] = mainconfig.get("Outputs", "mode").lower()
+    if settingslist['OUTPUTMODE'] not in ["direct", "queued"]:
+        msg = "Outputs mode must be either 'direct' or 'queued'."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("error", msg)
+        sys.exit(1)
+    settingslist['QUEUESIZE'] = 10 # Default
+    if mainconfig.has_option("Outputs", "queuesize"):
+        settingslist['QUEUESIZE'] = mainconfig.getint("Outputs", "queuesize")
+    settingslist['OVERFLOW'] = "dropoldest" # Default
+    if mainconfig.has_option("Outputs", "overflow"):
+        settingslist['OVERFLOW'] = mainconfig.get("Outputs", "overflow").lower()
+    if settingslist['OVERFLOW'] not in ["dropoldest", "block", "coalesce"]:
+        msg = "Outputs overflow must be 'dropoldest', 'block' or 'coalesce'."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("error", msg)
+        sys.exit(1)
+    settingslist['OUTPUTTIMEOUT'] = 30.0 # Default
+    if mainconfig.has_option("Outputs", "timeout"):
+        settingslist['OUTPUTTIMEOUT'] = mainconfig.getfloat("Outputs", "timeout")
     # LEDs
     settingslist['REDPIN'] = mainconfig.getint("LEDs", "redPin")
     settingslist['GREENPIN'] = mainconfig.getint("LEDs", "greenPin")
     settingslist['SUCCESSLED'] = mainconfig.get("LEDs", "successLED")
     settingslist['FAILLED'] = mainconfig.get("LEDs", "failLED")
+    settingslist['FLASHTIME'] = 1.0 # Default
+    if mainconfig.has_option("LEDs", "flashtime"):
+        settingslist['FLASHTIME'] = mainconfig.getfloat("LEDs", "flashtime")
+    settingslist['HEARTBEAT'] = 0 # Default
+    if mainconfig.has_option("LEDs", "heartbeat"):
+        settingslist['HEARTBEAT'] = mainconfig.getfloat("LEDs", "heartbeat")
     # Misc
     settingslist['OPERATOR'] = mainconfig.get("Misc", "operator")
     settingslist['HELP'] = mainconfig.getboolean("Misc", "help")
     settingslist['PRINTERRORS'] = mainconfig.getboolean("Misc", "printErrors")
+    settingslist['CONNURL'] = envprobe.CONNURL # Default
+    if mainconfig.has_option("Misc", "connurl"):
+        settingslist['CONNURL'] = mainconfig.get("Misc", "connurl")
+    settingslist['CONNRECHECK'] = float(envprobe.RECHECK) # Default
+    if mainconfig.has_option("Misc", "connrecheck"):
+        settingslist['CONNRECHECK'] = mainconfig.getfloat("Misc",
+                                                          "connrecheck")
+    if settingslist['CONNRECHECK'] <= 0:
+        msg = "Misc connrecheck must be greater than zero."
+        msg = format_msg(msg, 'error')
+        print(msg)
+        logthis("error", msg)
+        sys.exit(1)
     # Debug
     settingslist['WAITTOSTART'] = mainconfig.getboolean("Debug", "waittostart")
 
@@ -1007,39 +1537,39 @@ def dummy_runs(dummyduration):
         # Note there is no sleep() here, so they will read as quickly as
         # possible for 15 seconds.
         for i in PLUGINSSENSORS:
-            if i == gpsplugininstance:
-                read_gps(i)
-            else:
-                read_sensor(i, None)
+            read_plugin(i, None)
         diff = time.time() - startdummy
     return True
 
 def read_sensor(sensorplugin, limit):
     """Read from a non-GPS sensor.
 
-    Read info from a sensor. Note this is not just the value, but also the
-    sensor name, units, symbol, etc. N.B. GPS data is read using `read_gps()`.
+    Read the value from a sensor, and check it against its limits. The
+    value comes from the sensor's collect() method, which returns the
+    reading begun by start() (see sensors/sensor.py). The
+    sensor name, units, symbol, etc. are held in the sample frame schema
+    (see supports/sampleframe.py) rather than in each reading.
+    N.B. GPS data is read using `read_gps()`.
 
     Args:
         sensorplugin: The sensor plugin which should be read.
+        limit: The limits support plugin, or None / False if limits
+               are not being checked.
 
     Returns:
-        dict The sensor data.
+        tuple The value, and whether it breaches its limits.
 
     """
-    reading = {}
-    reading["value"] = sensorplugin.getval()
-    reading["unit"] = sensorplugin.valunit
-    reading["symbol"] = sensorplugin.valsymbol
-    reading["name"] = sensorplugin.valname
-    reading["sensor"] = sensorplugin.sensorname
-    reading["description"] = sensorplugin.description
-    reading["readingtype"] = sensorplugin.readingtype
-    if limit is not None and limit is not False:
-        reading["breach"] = limit.isbreach(reading["name"], reading["value"], reading["unit"])
+    if callable(getattr(sensorplugin, "collect", None)):
+        value = sensorplugin.collect()
     else:
-        reading["breach"] = False
-    return reading
+        # Plugins which don't inherit from sensor.Sensor
+        value = sensorplugin.getval()
+    breach = False
+    if limit is not None and limit is not False:
+        breach = limit.isbreach(sensorplugin.valname, value,
+            sensorplugin.valunit)
+    return value, breach
 
 def read_gps(sensorplugin):
     """Read from a GPS sensor.
@@ -1052,7 +1582,8 @@ def read_gps(sensorplugin):
         sensorplugin: The sensor plugin which should be read.
 
     Returns:
-        dict All of the sensor data elements.
+        tuple Dict of all the GPS data elements, and False (GPS data are
+              never checked against limits).
 
     """
     reading = {}
@@ -1064,9 +1595,998 @@ def read_gps(sensorplugin):
         reading["altitude"] = val[2]
     reading["disposition"] = val[3]
     reading["exposure"] = val[4]
-    reading["name"] = sensorplugin.valname
-    reading["sensor"] = sensorplugin.sensorname
-    return reading
+    return reading, False
+
+def read_plugin(sensorplugin, limit):
+    """Read from any sensor.
+
+    Read from a sensor using `read_gps()` or `read_sensor()` as
+    appropriate for the type of sensor.
+
+    Args:
+        sensorplugin: The sensor plugin which should be read.
+        limit: The limits support plugin, or None / False if limits
+               are not being checked.
+
+    Returns:
+        tuple The value, and whether it breaches its limits.
+
+    """
+    if sensorplugin == gpsplugininstance:
+        return read_gps(sensorplugin)
+    else:
+        return read_sensor(sensorplugin, limit)
+
+def replay_schema(recording, sensorplugins):
+    """Set up the sample frame channels for a replay.
+
+    There is a channel for each channel in the recording. Where it
+    matches one of the sensors in sensors.cfg, its unit, description and
+    aggregate statistic are taken from the sensor; otherwise they are
+    unknown (and its values can't be checked against limits).
+
+    Args:
+        recording: The replay.Recording being replayed.
+        sensorplugins: The sensor plugins.
+
+    Returns:
+        tuple The SampleFrame Schema, and the aggregate statistic for
+              each channel (None for the default).
+
+    """
+    schema = sampleframe.Schema()
+    aggregates = []
+    unmatched = []
+    for column, plugin in zip(recording.columns,
+                              recording.match(sensorplugins)):
+        if plugin is None:
+            schema.add(column.name, column.sensor or column.name,
+                symbol=column.symbol, readingtype=column.readingtype,
+                gps=column.gps)
+            aggregates.append(None)
+            unmatched.append(column.name)
+        else:
+            schema.add(column.name, plugin.sensorname,
+                getattr(plugin, "valunit", None),
+                column.symbol or getattr(plugin, "valsymbol", None),
+                getattr(plugin, "description", None),
+                getattr(plugin, "readingtype", None), column.gps)
+            aggregates.append(plugin.aggregate)
+    if unmatched:
+        msg = "These replayed readings don't match any sensor in "
+        msg += "sensors.cfg: " + ", ".join(unmatched)
+        msg = format_msg(msg, 'warning')
+        print(msg)
+        logthis("error", msg)
+    return schema, aggregates
+
+def replay_frames(recording, speed):
+    """Replay the samples in a recording.
+
+    Each sample's values are checked against their limits, as if they
+    had just been read.
+
+    Args:
+        recording: The replay.Recording to replay (see replay_schema()
+                   for the channels).
+        speed: The multiple of real time to replay at, or 0 for as fast
+               as possible.
+
+    Returns:
+        generator A (sampletime, SampleFrame) tuple for each sample.
+
+    """
+    limit = PLUGINSSUPPORTS["limits"]
+    start = None
+    for sampletime, readings in recording:
+        recorded = (time.mktime(sampletime.timetuple()) +
+                    sampletime.microsecond / 1e6)
+        if speed:
+            if start is None:
+                start = (clock.monotonic(), recorded)
+            else:
+                clock.sleep_until(start[0] + (recorded - start[1]) / speed)
+        frame = sampleframe.SampleFrame(SCHEMA)
+        for index, value in readings:
+            channel = SCHEMA.channels[index]
+            breach = False
+            if (limit and not channel.gps and channel.unit is not None and
+                    isinstance(value, (int, long, float))):
+                breach = limit.isbreach(channel.name, value, channel.unit)
+            frame.set(index, value, breach, False, recorded)
+        yield sampletime, frame
+
+def start_readings(tick):
+    """List the sensors' start() calls to make ahead of a sample.
+
+    Args:
+        tick: The number of the scheduler tick for the sample.
+
+    Returns:
+        list (lead time, start function) tuples, for the sensors due to be
+             read on the tick which have a lead time.
+
+    """
+    return [(sensor.leadtime, sensor.start) for sensor in PLUGINSSENSORS
+            if getattr(sensor, "leadtime", 0) > 0 and
+                tick % sensor.tickinterval == 0]
+
+def read_sensors_serially(frame, sensorplugins, limit):
+    """Read sensors one after another.
+
+    Read from each of the given sensors in turn, in the order in which
+    they are defined in sensors.cfg.
+
+    Args:
+        frame: The SampleFrame in which to record the readings.
+        sensorplugins: List of the sensor plugins to read.
+        limit: The limits support plugin, or None / False if limits
+               are not being checked.
+
+    """
+    for sensorplugin in sensorplugins:
+        value, breach = read_plugin(sensorplugin, limit)
+        frame.set(sensorplugin.channel, value, breach, False, time.time())
+
+class WorkerPool(object):
+    """A fixed-size pool of worker threads.
+
+    Jobs are functions placed on a shared queue; each worker takes the
+    next job from the queue and runs it. Jobs are responsible for
+    recording their own results, so submitting a job never blocks.
+
+    """
+
+    def __init__(self, size, name):
+        """Initialise.
+
+        Start the worker threads. They are daemon threads, so they will
+        not prevent the AirPi from stopping.
+
+        Args:
+            self: self.
+            size: The number of worker threads to start.
+            name: A name for the pool, used in thread names and logging.
+
+        """
+        self.name = name
+        self.jobs = Queue.Queue()
+        self.workers = []
+        for number in range(max(1, size)):
+            worker = threading.Thread(target=self.work,
+                name=name + "-" + str(number))
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def submit(self, func, *args):
+        """Add a job to the queue.
+
+        Args:
+            self: self.
+            func: The function to be run by a worker.
+            args: The arguments to pass to the function.
+
+        """
+        self.jobs.put((func, args))
+
+    def work(self):
+        """Run jobs from the queue, forever."""
+        while True:
+            func, args = self.jobs.get()
+            try:
+                func(*args)
+            except Exception as excep:
+                msg = "Job failed in " + self.name + " worker: " + str(excep)
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+
+class ConcurrentAcquisition(object):
+    """Read independent sensors at the same time.
+
+    Sensors which share hardware (i.e. instances of the same sensor
+    class, such as all of the Analogue sensors on the MCP3008) are put
+    in the same group and read one after another, because their
+    backends are not safe to use from several threads at once. The
+    groups are then read concurrently by a pool of workers.
+    Each sensor has a deadline (in seconds, from the start of the
+    cycle). A sensor which has not been read by its deadline is marked
+    as 'stale' and its last good reading is used instead, so one slow
+    sensor cannot hold up the whole sample.
+
+    """
+
+    def __init__(self, sensorplugins, workers):
+        """Initialise.
+
+        Group the sensors and start the worker pool.
+
+        Args:
+            self: self.
+            sensorplugins: List of enabled sensor plugins.
+            workers: Number of worker threads to use.
+
+        """
+        self.sensorplugins = sensorplugins
+        self.groups = []
+        bykey = {}
+        for sensorplugin in sensorplugins:
+            key = sensorplugin.getname()
+            if key not in bykey:
+                bykey[key] = []
+                self.groups.append(bykey[key])
+            bykey[key].append(sensorplugin)
+        self.pool = WorkerPool(min(workers, len(self.groups)), "acquisition")
+        self.inflight = set()
+        self.lastreadings = {}
+        self.lock = threading.Condition()
+
+    def read(self, frame, sensorplugins, limit):
+        """Read sensors for one cycle.
+
+        Submit every group with a sensor due to be read, unless it is
+        still busy with a read from an earlier cycle, then wait for each
+        sensor in turn until its deadline passes.
+
+        Args:
+            self: self.
+            frame: The SampleFrame in which to record the readings.
+            sensorplugins: List of the sensor plugins to read this cycle.
+            limit: The limits support plugin, or None / False if limits
+                   are not being checked.
+
+        """
+        results = {}
+        cyclestart = time.time()
+        with self.lock:
+            for index, group in enumerate(self.groups):
+                members = [plugin for plugin in group
+                           if plugin in sensorplugins]
+                if members and index not in self.inflight:
+                    self.inflight.add(index)
+                    self.pool.submit(self.read_group, index, members, limit,
+                        results)
+        for sensorplugin in sensorplugins:
+            deadline = cyclestart + sensorplugin.deadline
+            stale = False
+            with self.lock:
+                while sensorplugin not in results:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self.lock.wait(remaining)
+                reading = results.get(sensorplugin)
+                if reading is None:
+                    # Re-use the last good reading, if there is one; if
+                    # not, the sensor is reported as having failed.
+                    stale = True
+                    reading = self.lastreadings.get(sensorplugin,
+                        (None, False, time.time()))
+            value, breach, readtime = reading
+            frame.set(sensorplugin.channel, value, breach, stale, readtime)
+
+    def read_group(self, index, members, limit, results):
+        """Read sensors in a group, one after another.
+
+        This runs on a worker thread. Results are recorded as soon as
+        each sensor has been read, so that sensors early in the group
+        are not held up by slower ones later in it.
+
+        Args:
+            self: self.
+            index: The index of the group to be read.
+            members: The sensors in the group which are due to be read.
+            limit: The limits support plugin, or None / False.
+            results: Dict in which to record the readings for this
+                     cycle, as tuples of (value, breach, time read).
+
+        """
+        try:
+            for sensorplugin in members:
+                try:
+                    value, breach = read_plugin(sensorplugin, limit)
+                    reading = (value, breach, time.time())
+                except Exception as excep:
+                    msg = "Exception reading " + sensorplugin.sensorname
+                    msg += ": " + str(excep)
+                    msg = format_msg(msg, 'error')
+                    logthis("error", msg)
+                    reading = None
+                with self.lock:
+                    if reading is not None:
+                        results[sensorplugin] = reading
+                        # Keep late readings too, for use as stale values
+                        self.lastreadings[sensorplugin] = reading
+                    self.lock.notify_all()
+        finally:
+            with self.lock:
+                self.inflight.discard(index)
+                self.lock.notify_all()
+
+class OutputWorker(object):
+    """Pass queued samples to one output plugin.
+
+    Samples waiting for the output plugin are held in a bounded queue,
+    and a dedicated thread passes them to the plugin's output_data()
+    method one at a time. This means that a slow output plugin (e.g.
+    one which is waiting for a web service) only holds up itself, not
+    the sampling or the other output plugins.
+    When the queue is full, the 'overflow' policy determines what
+    happens to a new sample:
+    + dropoldest - the oldest waiting sample is discarded.
+    + block      - sampling waits for space in the queue, for up to the
+                   plugin's timeout; after that the oldest waiting
+                   sample is discarded.
+    + coalesce   - all waiting samples are discarded, so that the
+                   plugin catches up straight to the newest one.
+    An output which takes longer than its timeout to deal with a sample
+    is counted as having failed.
+
+    """
+
+    def __init__(self, plugin, queuesize, overflow):
+        """Initialise.
+
+        Args:
+            self: self.
+            plugin: The output plugin to pass samples to.
+            queuesize: Maximum number of waiting samples.
+            overflow: The overflow policy (see above).
+
+        """
+        self.plugin = plugin
+        self.queuesize = max(1, queuesize)
+        self.overflow = overflow
+        self.pending = collections.deque()
+        self.condition = threading.Condition()
+        self.outcomes = []
+        self.busysince = None
+        self.timedout = False
+        self.dropped = 0
+        self.maxdepth = 0
+        self.thread = threading.Thread(target=self.work,
+            name="output-" + plugin.getname())
+        self.thread.daemon = True
+        self.thread.start()
+
+    def put(self, data, sampletime):
+        """Queue a sample for the output plugin.
+
+        Args:
+            self: self.
+            data: The data to be output.
+            sampletime: datetime representing the time the sample was
+                        taken.
+
+        Returns:
+            int The number of waiting samples which were discarded to
+                make room for this one.
+
+        """
+        dropped = 0
+        with self.condition:
+            if len(self.pending) >= self.queuesize:
+                if self.overflow == "block":
+                    giveup = time.time() + self.plugin.timeout
+                    while (len(self.pending) >= self.queuesize and
+                            time.time() < giveup):
+                        self.condition.wait(giveup - time.time())
+                    if len(self.pending) >= self.queuesize:
+                        self.pending.popleft()
+                        dropped = 1
+                elif self.overflow == "coalesce":
+                    dropped = len(self.pending)
+                    self.pending.clear()
+                else:
+                    self.pending.popleft()
+                    dropped = 1
+            self.pending.append((data, sampletime))
+            self.dropped += dropped
+            self.maxdepth = max(self.maxdepth, len(self.pending))
+            self.condition.notify_all()
+        return dropped
+
+    def work(self):
+        """Pass waiting samples to the output plugin, forever."""
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                data, sampletime = self.pending.popleft()
+                self.busysince = time.time()
+                self.timedout = False
+                # Let anything blocked in put() know there is space
+                self.condition.notify_all()
+            LOGGER.debug(" Dataset to output to " + str(self.plugin) + ":")
+            LOGGER.debug(" " + str(data))
+            try:
+                if not self.plugin.online():
+                    LOGGER.debug(" No connectivity for " + str(self.plugin))
+                    success = False
+                else:
+                    success = self.plugin.output_data(data,
+                        sampletime) != False
+            except Exception as excep:
+                msg = "Exception during output to " + self.plugin.getname()
+                msg += ": " + str(excep)
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+                success = False
+            with self.condition:
+                # A late result has already been counted as a failure
+                if not self.timedout:
+                    self.outcomes.append(success)
+                self.busysince = None
+                self.condition.notify_all()
+
+    def collect(self):
+        """Get the outcomes of outputs completed since the last check.
+
+        If the plugin has been working on one sample for longer than its
+        timeout, that is counted as a failure now.
+
+        Args:
+            self: self.
+
+        Returns:
+            list Booleans; True for each successful output, False for
+                 each failed one.
+
+        """
+        with self.condition:
+            if (self.busysince is not None and not self.timedout and
+                    time.time() - self.busysince > self.plugin.timeout):
+                msg = "Output to " + self.plugin.getname() + " timed out."
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+                self.timedout = True
+                self.outcomes.append(False)
+            outcomes = self.outcomes
+            self.outcomes = []
+        return outcomes
+
+    def depth(self):
+        """Get the number of samples waiting for the output plugin.
+
+        Args:
+            self: self.
+
+        Returns:
+            int The number of waiting samples (including any which is
+                currently being output).
+
+        """
+        with self.condition:
+            return len(self.pending) + (self.busysince is not None)
+
+    def drain(self, timeout):
+        """Wait for waiting samples to be output.
+
+        Args:
+            self: self.
+            timeout: Maximum time to wait (seconds).
+
+        Returns:
+            boolean True if all waiting samples were output.
+
+        """
+        giveup = time.time() + timeout
+        with self.condition:
+            while ((self.pending or self.busysince is not None) and
+                    time.time() < giveup):
+                self.condition.wait(giveup - time.time())
+            return not (self.pending or self.busysince is not None)
+
+class OutputQueue(object):
+    """Fan samples out to output plugins via their own workers.
+
+    Holds one OutputWorker for each enabled output plugin, and reports
+    on how they are getting on.
+
+    """
+
+    def __init__(self, outputplugins, queuesize, overflow):
+        """Initialise.
+
+        Args:
+            self: self.
+            outputplugins: List of enabled output plugins.
+            queuesize: Maximum number of samples waiting for each plugin.
+            overflow: The overflow policy (see OutputWorker).
+
+        """
+        self.workers = []
+        for plugin in outputplugins:
+            self.workers.append(OutputWorker(plugin, queuesize, overflow))
+
+    def put(self, data, sampletime):
+        """Queue a sample for every output plugin.
+
+        Args:
+            self: self.
+            data: The data to be output.
+            sampletime: datetime representing the time the sample was
+                        taken.
+
+        """
+        for worker in self.workers:
+            dropped = worker.put(data, sampletime)
+            if dropped:
+                msg = "Output queue for " + worker.plugin.getname()
+                msg += " is full - discarded " + str(dropped) + " sample(s)."
+                msg = format_msg(msg, 'warning')
+                logthis("error", msg)
+                if SETTINGS['PRINTERRORS']:
+                    print(msg)
+        LOGGER.debug(" Output queue depths: " + self.report())
+
+    def collect(self):
+        """Get the overall outcome of outputs since the last check.
+
+        Returns:
+            boolean True if every output completed since the last check
+                    was successful; False if any failed.
+            None If no outputs have completed since the last check.
+
+        """
+        outcomes = []
+        for worker in self.workers:
+            outcomes.extend(worker.collect())
+        if not outcomes:
+            return None
+        return all(outcomes)
+
+    def report(self):
+        """Describe the current depth of each output queue.
+
+        Returns:
+            string The plugin names and queue depths.
+
+        """
+        depths = []
+        for worker in self.workers:
+            depths.append(worker.plugin.getname() + "=" + str(worker.depth()))
+        return ", ".join(depths)
+
+    def summary(self):
+        """Describe the maximum depth and losses for each output queue.
+
+        Returns:
+            string The plugin names, maximum queue depths and number of
+                   discarded samples.
+
+        """
+        lines = []
+        for worker in self.workers:
+            line = worker.plugin.getname() + ": max. queue depth "
+            line += str(worker.maxdepth) + ", " + str(worker.dropped)
+            line += " sample(s) discarded"
+            lines.append(line)
+        return "; ".join(lines)
+
+    def drain(self, timeout):
+        """Wait for all waiting samples to be output.
+
+        Args:
+            self: self.
+            timeout: Maximum time to wait for each plugin (seconds).
+
+        """
+        for worker in self.workers:
+            if not worker.drain(timeout):
+                msg = "Gave up waiting for output to "
+                msg += worker.plugin.getname() + "."
+                msg = format_msg(msg, 'warning')
+                print(msg)
+                logthis("error", msg)
+
+class Scheduler(object):
+    """Decide when each sample should be taken.
+
+    Samples are taken at absolute deadlines on the monotonic clock
+    (see sensors/clock.py), one sample period apart, so that they do not
+    drift over long runs however long each sample takes, and are not
+    affected if the wall clock is changed. If requested, the first
+    deadline is aligned to a wall-clock boundary (e.g. every 5 seconds
+    past the minute for a 5 second sample period).
+    The time recorded for each sample is its nominal time, i.e. the
+    wall-clock time of its deadline, so samples are always exactly one
+    period apart. If the wall clock is stepped (e.g. by NTP) by more
+    than half a period, nominal times are moved by a whole number of
+    periods to follow it.
+    If sampling falls more than a whole period behind, the 'missed'
+    policy applies:
+    + skip    - missed samples are skipped, and sampling resumes at the
+                next deadline.
+    + catchup - missed samples are taken straight away, one after
+                another, until sampling is back on schedule. If more
+                than MAXCATCHUP samples have been missed, only the
+                latest MAXCATCHUP are taken, and the rest are skipped.
+    The lateness of each wake-up, and the jitter in the period between
+    consecutive samples, are recorded.
+    With a period of 0 (e.g. when benchmarking) samples are taken one
+    after another as quickly as possible; each is given the real time it
+    was taken, and no timing is recorded.
+
+    """
+
+    MAXCATCHUP = 10
+
+    def __init__(self, period, align, missed):
+        """Initialise.
+
+        Args:
+            self: self.
+            period: The sample period (seconds).
+            align: Whether the first deadline should be aligned to a
+                   multiple of the period on the wall clock.
+            missed: The policy for missed deadlines ('skip' or
+                    'catchup').
+
+        """
+        self.period = period
+        self.missed = missed
+        nowwall = time.time()
+        nowmono = clock.monotonic()
+        startwall = nowwall
+        if align and period > 0:
+            startwall = (floor(nowwall / period) + 1) * period
+        self.startwall = startwall
+        self.startmono = nowmono + (startwall - nowwall)
+        self.tick = 0
+        self.current = None
+        self.lastwake = None
+        self.skipped = 0
+        self.count = 0
+        self.totallateness = 0.0
+        self.maxlateness = 0.0
+        self.totaljitter = 0.0
+        self.maxjitter = 0.0
+
+    def deadline(self, tick):
+        """Get the deadline for a given tick.
+
+        Args:
+            self: self.
+            tick: The tick number (0 is the first sample).
+
+        Returns:
+            float The deadline, on the monotonic clock.
+
+        """
+        return self.startmono + tick * self.period
+
+    def wait(self, prestart=None):
+        """Wait for the next sample to be due.
+
+        Sleep until the deadline for the next tick, applying the
+        'missed' policy if sampling has fallen behind. Functions which
+        need to be called ahead of the tick (e.g. sensors' start()) are
+        called at their lead time before it, but never earlier than a
+        whole period before it.
+
+        Args:
+            self: self.
+            prestart: Function which is given the number of the next tick,
+                      and returns a list of (lead time in seconds,
+                      function) tuples for it; or None.
+
+        Returns:
+            datetime The nominal time of the sample which is now due. Its
+                     tick number is then available as 'current'.
+
+        """
+        now = clock.monotonic()
+        if self.period > 0:
+            behind = int((now - self.deadline(self.tick)) // self.period)
+            skip = 0
+            if self.missed == "skip":
+                skip = behind
+            elif behind > self.MAXCATCHUP:
+                # Catch up on the latest MAXCATCHUP missed samples only
+                skip = behind - self.MAXCATCHUP
+            if skip > 0:
+                self.tick += skip
+                self.skipped += skip
+                msg = "Can't keep up - requested sample frequency is too fast!"
+                msg += " Skipped " + str(skip) + " sample(s)."
+                msg = format_msg(msg, 'warning')
+                print(msg)
+                logthis("error", msg)
+        if prestart is not None:
+            deadline = self.deadline(self.tick)
+            calls = [(deadline - min(lead, self.period), func)
+                     for lead, func in prestart(self.tick)]
+            for due, func in sorted(calls, key=lambda call: call[0]):
+                clock.sleep_until(due)
+                try:
+                    func()
+                except Exception as excep:
+                    msg = "Exception starting a reading: " + str(excep)
+                    msg = format_msg(msg, 'error')
+                    logthis("error", msg)
+        clock.sleep_until(self.deadline(self.tick))
+        if self.period <= 0:
+            # Not scheduled (e.g. benchmarking): samples are taken one
+            # after another, so use the real time, and there is no timing
+            # to record
+            self.current = self.tick
+            self.tick += 1
+            return datetime.datetime.now()
+        woke = clock.monotonic()
+        lateness = woke - self.deadline(self.tick)
+        self.count += 1
+        self.totallateness += lateness
+        self.maxlateness = max(self.maxlateness, lateness)
+        if self.lastwake is not None:
+            jitter = abs((woke - self.lastwake) - self.period)
+            self.totaljitter += jitter
+            self.maxjitter = max(self.maxjitter, jitter)
+            LOGGER.debug(" Tick " + str(self.tick) + ": lateness %.1f ms, jitter %.1f ms" % (lateness * 1000, jitter * 1000))
+        self.lastwake = woke
+        nominal = self.startwall + self.tick * self.period
+        offset = time.time() - lateness - nominal
+        if abs(offset) > self.period / 2.0:
+            # The wall clock has been changed
+            shift = round(offset / self.period) * self.period
+            self.startwall += shift
+            nominal += shift
+            msg = "Wall clock changed by " + str(int(offset)) + " seconds;"
+            msg += " sample times adjusted to match."
+            msg = format_msg(msg, 'warning')
+            logthis("error", msg)
+        self.current = self.tick
+        self.tick += 1
+        return datetime.datetime.fromtimestamp(nominal)
+
+    def summary(self):
+        """Describe the timing of the run so far.
+
+        Returns:
+            string Mean and maximum lateness and jitter, plus the number
+                   of skipped samples.
+
+        """
+        if self.period <= 0:
+            return "not scheduled (no sample period)"
+        if self.count == 0:
+            return "no samples taken"
+        meanlateness = self.totallateness / self.count
+        meanjitter = 0.0
+        if self.count > 1:
+            meanjitter = self.totaljitter / (self.count - 1)
+        msg = "lateness mean %.1f ms, max %.1f ms; " % (meanlateness * 1000,
+            self.maxlateness * 1000)
+        msg += "jitter mean %.1f ms, max %.1f ms; " % (meanjitter * 1000,
+            self.maxjitter * 1000)
+        msg += str(self.skipped) + " sample(s) skipped"
+        return msg
+
+class Benchmark(object):
+    """Measure the throughput of the sampling loop.
+
+    Used with the --benchmark option, when sample() runs a fixed number
+    of cycles against simulated hardware without waiting between them.
+    The time spent in each stage of every cycle is recorded:
+    + read      - reading the sensors.
+    + limits    - checking the readings against their limits.
+    + other     - recording the outcome of reading the sensors.
+    + output    - averaging and passing data to the outputs.
+    + calibrate - calibrating data, in the outputs which ask for it.
+    + cycle     - the whole cycle.
+    The stages don't overlap: time spent checking limits and calibrating
+    during the read and output stages is only counted in their own
+    stages, so the other stages add up to the cycle. This holds where
+    limits and calibration are called from the sampling thread; with
+    concurrent acquisition or queued outputs they are called from worker
+    threads, at the same time as other work, and aren't taken out of the
+    read and output stages.
+    At the end of the run a report is written as JSON, so that runs on
+    different commits can be compared.
+
+    """
+
+    STAGES = ["read", "limits", "other", "output", "calibrate", "cycle"]
+    # Stages timed by wrapping the functions called during other stages
+    NESTED = ["limits", "calibrate"]
+    PERCENTILES = [50, 90, 99]
+
+    def __init__(self, cycles, reportpath):
+        """Initialise.
+
+        Args:
+            self: self.
+            cycles: The number of cycles (samples) to run.
+            reportpath: File to write the report to, or None to print it.
+
+        """
+        self.cycles = cycles
+        self.reportpath = reportpath
+        self.timings = dict((stage, []) for stage in self.STAGES)
+        self.completed = 0
+        self.started = None
+        self.finished = None
+        self.startcpu = None
+        self.endcpu = None
+        self.cyclestart = None
+        self.lapstart = None
+        # The thread which marks the stages, i.e. the sampling thread
+        self.thread = None
+        self.lock = threading.Lock()
+        # Time in each nested stage during the current cycle, and during
+        # the current stage on the sampling thread
+        self.cyclenested = dict((stage, 0.0) for stage in self.NESTED)
+        self.lapnested = 0.0
+
+    def timed(self, stage, func):
+        """Wrap a function so that each call to it is timed.
+
+        Args:
+            self: self.
+            stage: The (nested) stage to record the time against.
+            func: The function to wrap.
+
+        Returns:
+            function The wrapped function.
+
+        """
+        def wrapper(*args, **kwargs):
+            begin = clock.monotonic()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = clock.monotonic() - begin
+                # This may be called from acquisition and output worker
+                # threads
+                with self.lock:
+                    self.cyclenested[stage] += elapsed
+                    if threading.current_thread() is self.thread:
+                        self.lapnested += elapsed
+        return wrapper
+
+    def instrument(self, supportplugins):
+        """Time the calibration and limits support plugins.
+
+        Args:
+            self: self.
+            supportplugins: The support plugins (see set_up_supports()).
+
+        """
+        limits = supportplugins.get("limits")
+        if limits:
+            limits.isbreach = self.timed("limits", limits.isbreach)
+        calibration = supportplugins.get("calibration")
+        if calibration:
+            # Output plugins share this instance
+            calibration.calibrate = self.timed("calibrate",
+                calibration.calibrate)
+
+    def start_cycle(self):
+        """Mark the start of a cycle.
+
+        Args:
+            self: self.
+
+        """
+        now = clock.monotonic()
+        if self.started is None:
+            self.started = now
+            self.startcpu = os.times()
+            self.thread = threading.current_thread()
+        self.cyclestart = now
+        self.lapstart = now
+        with self.lock:
+            self.lapnested = 0.0
+
+    def lap(self, stage):
+        """Mark the end of a stage of the current cycle.
+
+        Args:
+            self: self.
+            stage: The stage which has just finished.
+
+        """
+        now = clock.monotonic()
+        with self.lock:
+            nested = self.lapnested
+            self.lapnested = 0.0
+        self.timings[stage].append(now - self.lapstart - nested)
+        self.lapstart = now
+
+    def end_cycle(self):
+        """Mark the end of a cycle.
+
+        Args:
+            self: self.
+
+        """
+        now = clock.monotonic()
+        self.timings["cycle"].append(now - self.cyclestart)
+        with self.lock:
+            for stage in self.NESTED:
+                self.timings[stage].append(self.cyclenested[stage])
+                self.cyclenested[stage] = 0.0
+        self.completed += 1
+        self.finished = now
+        self.endcpu = os.times()
+
+    @staticmethod
+    def percentile(ordered, percent):
+        """Get a percentile of some values (nearest-rank method).
+
+        Args:
+            ordered: The values, sorted.
+            percent: The percentile (0 - 100).
+
+        Returns:
+            float The percentile.
+
+        """
+        rank = int(round(percent / 100.0 * len(ordered) + 0.5))
+        return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+    def report(self):
+        """Build the report.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict The report.
+
+        """
+        elapsed = 0.0
+        cpu = {"user": None, "system": None}
+        if self.completed:
+            elapsed = self.finished - self.started
+            cpu["user"] = self.endcpu[0] - self.startcpu[0]
+            cpu["system"] = self.endcpu[1] - self.startcpu[1]
+        stages = {}
+        for stage in self.STAGES:
+            ordered = sorted(self.timings[stage])
+            summary = {"count": len(ordered)}
+            if ordered:
+                summary["mean_ms"] = sum(ordered) / len(ordered) * 1000
+                for percent in self.PERCENTILES:
+                    summary["p" + str(percent) + "_ms"] = self.percentile(
+                        ordered, percent) * 1000
+                summary["max_ms"] = ordered[-1] * 1000
+            stages[stage] = summary
+        report = {
+            "commit": get_commit(),
+            "cycles": self.completed,
+            "elapsed_s": elapsed,
+            "cycles_per_s": self.completed / elapsed if elapsed > 0 else None,
+            "cpu_s": cpu,
+            # ru_maxrss is in kilobytes on Linux
+            "peak_rss_kb": resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss,
+            "stages": stages,
+            "sensors": [plugin.sensorname for plugin in PLUGINSSENSORS],
+            "outputs": [type(plugin).__name__ for plugin in PLUGINSOUTPUTS],
+            "acquisition": SETTINGS['ACQUISITION'],
+            "outputmode": SETTINGS['OUTPUTMODE'],
+            "python": sys.version.split()[0]
+        }
+        return report
+
+    def finish(self):
+        """Write the report.
+
+        Args:
+            self: self.
+
+        """
+        report = json.dumps(self.report(), indent=2, sort_keys=True)
+        if self.reportpath:
+            with open(self.reportpath, "w") as reportfile:
+                reportfile.write(report + "\n")
+            msg = "Benchmark report written to " + self.reportpath
+            msg = format_msg(msg, 'sys')
+            print(msg)
+            logthis("info", msg)
+        else:
+            print(report)
 
 def sample():
     """Sample from sensors and record the output.
@@ -1082,193 +2602,185 @@ def sample():
     print(msg)
     print("==========================================================")
     global samples
+    global SCHEDULER
     greenhaslit = False
     redhaslit = False
-    lastupdated = 0
     alreadysentsensornotifications = False
     alreadysentoutputnotifications = False
+    if REPLAY is not None:
+        # Samples come from the recording, at its own pace
+        SCHEDULER = None
+    elif BENCHMARK is not None:
+        # Take each sample as soon as the last one has finished
+        SCHEDULER = Scheduler(0, False, SETTINGS['MISSED'])
+    else:
+        SCHEDULER = Scheduler(SETTINGS['SAMPLEFREQ'], SETTINGS['ALIGN'],
+            SETTINGS['MISSED'])
+    # Most recent frame, for merged frames
+    latest = None
     if 'AVERAGEFREQ' in SETTINGS:
         countcurrent = 0
         counttarget = SETTINGS['AVERAGECOUNT']
-        dataset = {}
+        averager = aggregator.Aggregator(SCHEMA, AGGREGATES)
     while True:
         try:
-            curtime = time.time()
-            timesincelast = curtime - lastupdated
-            sampletime = None
-            if timesincelast > (SETTINGS['SAMPLEFREQ'] - 0.01):
-                if (timesincelast > (SETTINGS['SAMPLEFREQ'] + 0.02)) and (samples is not 0):
-                    print(format_msg("Can't keep up - requested sample frequency is too fast!", "warning"))
-                lastupdated = curtime
-                data = []
-                # Read the sensors
-                failedsensors = []
-                sampletime = datetime.datetime.now()
-                for sensor in PLUGINSSENSORS:
-                    datadict = {}
-                    if sensor == gpsplugininstance:
-                        datadict = read_gps(sensor)
-                    else:
-                        datadict = read_sensor(sensor, PLUGINSSUPPORTS["limits"])
-                        # TODO: Ensure this is robust
-                        if (datadict["value"] is None or
-                                isnan(float(datadict["value"])) or
-                                datadict["value"] == 0):
-                            failedsensors.append(sensor.sensorname)
-                    # Average the data if required
-                    if (('AVERAGEFREQ' in SETTINGS) and
-                            (sensor != gpsplugininstance)):
-                        identifier = datadict['sensor'] + "-"
-                        identifier += datadict['name']
-                        if identifier not in dataset:
-                            dataset[identifier] = {}
-                            temp = datadict.copy()
-                            temp.pop("value", None)
-                            for thekey, thevalue in temp.iteritems():
-                                if thekey not in dataset[identifier]:
-                                    dataset[identifier][thekey] = thevalue
-                            dataset[identifier]['values'] = []
-                        dataset[identifier]['values'].append(datadict["value"])
-                    # Always record raw values for every sensor
-                    data.append(datadict)
-                # Record the outcome of reading sensors
-                if 'AVERAGEFREQ' in SETTINGS:
-                    countcurrent += 1
-                if failedsensors:
-                    if not alreadysentsensornotifications:
-                        for j in PLUGINSNOTIFICATIONS:
-                            j.sendnotification("alertsensor")
-                        alreadysentsensornotifications = True
-                    msg = "Failed to obtain data from these sensors: " + ", ".join(failedsensors)
-                    msg = format_msg(msg, 'error')
-                    logthis("error", msg)
-                    if SETTINGS['PRINTERRORS']:
-                        print(msg)
-                else:
-                    msg = "Data successfully obtained from all sensors."
-                    msg = format_msg(msg, 'success')
+            if REPLAY is not None:
+                if BENCHMARK is not None:
+                    BENCHMARK.start_cycle()
+                # Take the next sample from the recording
+                try:
+                    sampletime, data = next(REPLAY)
+                except StopIteration:
+                    msg = "Reached end of replay file - stopping run."
+                    msg = format_msg(msg, 'sys')
+                    print(msg)
                     logthis("info", msg)
+                    stop_sampling(None, None)
+                due = []
+                channels = data.present()
+            else:
+                # Wait for the next tick; sampletime is the tick's
+                # nominal time
+                sampletime = SCHEDULER.wait(start_readings)
+                if BENCHMARK is not None:
+                    BENCHMARK.start_cycle()
+                # Read the sensors which are due on this tick
+                due = [sensor for sensor in PLUGINSSENSORS
+                       if SCHEDULER.current % sensor.tickinterval == 0]
+                if SETTINGS['FRAMES'] == "merged" and latest is not None:
+                    # Sensors not due on this tick keep their latest reading
+                    data = sampleframe.SampleFrame(SCHEMA, latest)
+                else:
+                    data = sampleframe.SampleFrame(SCHEMA)
+                if ACQUISITION is not None:
+                    ACQUISITION.read(data, due, PLUGINSSUPPORTS["limits"])
+                else:
+                    read_sensors_serially(data, due,
+                        PLUGINSSUPPORTS["limits"])
+                channels = [sensor.channel for sensor in due]
+            if BENCHMARK is not None:
+                BENCHMARK.lap("read")
+            latest = data
+            failedsensors = []
+            stalesensors = []
+            for sensor in due:
+                if data.stale[sensor.channel]:
+                    stalesensors.append(sensor.sensorname)
+                if sensor != gpsplugininstance:
+                    # TODO: Ensure this is robust
+                    value = data.value(sensor.channel)
+                    if (value is None or isnan(float(value)) or value == 0):
+                        failedsensors.append(sensor.sensorname)
+            # Average the data if required
+            if 'AVERAGEFREQ' in SETTINGS:
+                for channel in channels:
+                    averager.add(data, channel)
+                countcurrent += 1
+            # Record the outcome of reading sensors
+            if stalesensors:
+                msg = "These sensors missed their deadline: "
+                msg += ", ".join(stalesensors)
+                msg = format_msg(msg, 'warning')
+                logthis("error", msg)
+                if SETTINGS['PRINTERRORS']:
+                    print(msg)
+            if failedsensors:
+                if not alreadysentsensornotifications:
+                    for j in PLUGINSNOTIFICATIONS:
+                        j.sendnotification("alertsensor")
+                    alreadysentsensornotifications = True
+                msg = "Failed to obtain data from these sensors: " + ", ".join(failedsensors)
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+                if SETTINGS['PRINTERRORS']:
+                    print(msg)
+            else:
+                msg = "Data successfully obtained from all sensors."
+                msg = format_msg(msg, 'success')
+                logthis("info", msg)
 
-                # Output data
-                try:
-                    # Averaging
+            # Output data
+            if BENCHMARK is not None:
+                BENCHMARK.lap("other")
+            try:
+                # Averaging
+                if 'AVERAGEFREQ' in SETTINGS:
+                    if countcurrent == counttarget:
+                        data = averager.result()
+                if (('AVERAGEFREQ' in SETTINGS and
+                    countcurrent == counttarget) or
+                        ('AVERAGEFREQ' not in SETTINGS)):
                     if 'AVERAGEFREQ' in SETTINGS:
-                        if countcurrent == counttarget:
-                            data = average_dataset(identifier, dataset)
-                            dataset = {}
-                    if (('AVERAGEFREQ' in SETTINGS and
-                        countcurrent == counttarget) or
-                            ('AVERAGEFREQ' not in SETTINGS)):
-                        if 'AVERAGEFREQ' in SETTINGS:
-                            countcurrent = 0
-                        # Output the data
+                        countcurrent = 0
+                    # Output the data
+                    if not data:
+                        # Nothing was read on this tick (stream frames)
+                        outputsworking = None
+                    elif OUTPUTQUEUE is not None:
+                        OUTPUTQUEUE.put(data, sampletime)
+                        # Outcomes of outputs which have finished
+                        # since last time (if any)
+                        outputsworking = OUTPUTQUEUE.collect()
+                    else:
                         outputsworking = True
                         for i in PLUGINSOUTPUTS:
+                            if not i.online():
+                                LOGGER.debug(" No connectivity for " + str(i))
+                                outputsworking = False
+                                continue
                             LOGGER.debug(" Dataset to output to " + str(i) + ":")
                             LOGGER.debug(" " + str(data))
                             if i.output_data(data, sampletime) == False:
                                 outputsworking = False
-                        # Record the outcome of outputting data
-                        if outputsworking:
-                            msg = "Data output in all requested formats."
-                            msg = format_msg(msg, 'success')
-                            logthis("info", msg)
-                            if (SETTINGS['GREENPIN'] and
-                                    (SETTINGS['SUCCESSLED'] == "all" or
-                                    (SETTINGS['SUCCESSLED'] == "first" and
-                                        not greenhaslit))):
-                                led_on(SETTINGS['GREENPIN'])
-                                greenhaslit = True
-                        else:
-                            if not alreadysentoutputnotifications:
-                                for j in PLUGINSNOTIFICATIONS:
-                                    j.sendnotification("alertoutput")
-                                alreadysentoutputnotifications = True
-                            msg = "Failed to output in all requested formats."
-                            msg = format_msg(msg, 'error')
-                            logthis("error", msg)
-                            if SETTINGS['PRINTERRORS']:
-                                print(msg)
-                            if (SETTINGS['REDPIN'] and
-                                    (SETTINGS['FAILLED'] in ["all", "constant"] or
-                                    (SETTINGS['FAILLED'] == "first" and
-                                        not redhaslit))):
-                                led_on(SETTINGS['REDPIN'])
-                                redhaslit = True
-
-                except KeyboardInterrupt:
-                    raise
-                except Exception as excep:
-                    msg = "Exception during output: %s" % excep
-                    msg = format_msg(msg, 'error')
-                    logthis("error", msg)
-                else:
-                    # Delay before turning off LED
-                    time.sleep(1)
-                    if SETTINGS['GREENPIN']:
-                        led_off(SETTINGS['GREENPIN'])
-                    if (SETTINGS['REDPIN'] and
-                            SETTINGS['FAILLED'] != "constant"):
-                        led_off(SETTINGS['REDPIN'])
-                samples += 1
-                if samples == SETTINGS['STOPAFTER']:
-                    msg = "Reached requested number of samples - stopping run."
-                    msg = format_msg(msg, 'sys')
-                    print(msg)
-                    logthis("info", msg)
-                    stop_sampling(None, None)
-            try:
-                time.sleep(SETTINGS['SAMPLEFREQ'] - (time.time() - curtime))
+                    # Record the outcome of outputting data
+                    if outputsworking is None:
+                        pass
+                    elif outputsworking:
+                        msg = "Data output in all requested formats."
+                        msg = format_msg(msg, 'success')
+                        logthis("info", msg)
+                        if (SETTINGS['GREENPIN'] and
+                                (SETTINGS['SUCCESSLED'] == "all" or
+                                (SETTINGS['SUCCESSLED'] == "first" and
+                                    not greenhaslit))):
+                            LEDS.success()
+                            greenhaslit = True
+                    else:
+                        if not alreadysentoutputnotifications:
+                            for j in PLUGINSNOTIFICATIONS:
+                                j.sendnotification("alertoutput")
+                            alreadysentoutputnotifications = True
+                        msg = "Failed to output in all requested formats."
+                        msg = format_msg(msg, 'error')
+                        logthis("error", msg)
+                        if SETTINGS['PRINTERRORS']:
+                            print(msg)
+                        if (SETTINGS['REDPIN'] and
+                                (SETTINGS['FAILLED'] in ["all", "constant"] or
+                                (SETTINGS['FAILLED'] == "first" and
+                                    not redhaslit))):
+                            LEDS.fail(SETTINGS['FAILLED'] == "constant")
+                            redhaslit = True
+
             except KeyboardInterrupt:
                 raise
-            except Exception:
-                pass # fall back on old method...
+            except Exception as excep:
+                msg = "Exception during output: %s" % excep
+                msg = format_msg(msg, 'error')
+                logthis("error", msg)
+            if BENCHMARK is not None:
+                BENCHMARK.lap("output")
+                BENCHMARK.end_cycle()
+            samples += 1
+            if samples == SETTINGS['STOPAFTER']:
+                msg = "Reached requested number of samples - stopping run."
+                msg = format_msg(msg, 'sys')
+                print(msg)
+                logthis("info", msg)
+                stop_sampling(None, None)
         except KeyboardInterrupt:
             stop_sampling(None, None)
 
-def average_dataset(identifier, dataset):
-    """Average a dataset.
-
-    Take a dataset consisting of 'n' separate readings, and calculate
-    the mean across those readings. The dataset will be a dict of dicts;
-    each element in the first dict is a single time point in the set to
-    be averaged. Each of these single time points is a dict which
-    contains one reading for each of the enabled sensors.
-
-    Args:
-        identifier: The unique identifier for the sensor and property
-            being averaged.
-        dataset: The list of 'n' separate time points to be averaged.
-
-    Returns:
-        list The averaged data.
-
-    """
-    totals = {}
-    numberofsamples = {}
-    # For each identifier, sum the indidivual values in the
-    # dataset[identifier]['values'] list.
-    # Count the number of samples as we go along, in case one sensor has
-    # missed any readings.
-    for identifier, properties in dataset.iteritems():
-        totals[identifier] = 0
-        numberofsamples[identifier] = 0
-        for value in properties['values']:
-            if value != "-" and value is not None and not isnan(value):
-                totals[identifier] += value
-                numberofsamples[identifier] += 1
-    # For each identifier, divide the sum by the number of samples
-    for identifier, total in totals.iteritems():
-        dataset[identifier]['value'] = total / numberofsamples[identifier]
-        dataset[identifier]['readingtype'] = "average"
-    # Re-format to that expected by output_data() methods of the output
-    # plugins
-    formatted = []
-    for identifier in dataset:
-        dataset[identifier]['identifier'] = identifier
-        formatted.append(dataset[identifier])
-    return formatted
-
 def stop_sampling(dummy, _):
     """Stop a run.
 
@@ -1297,8 +2809,19 @@ def stop_sampling(dummy, _):
         # raises it's own error and quits before here, but quit again
         # just in case.
         sys.exit(1)
-    led_off(SETTINGS['GREENPIN'])
-    led_off(SETTINGS['REDPIN'])
+    if SCHEDULER is not None:
+        msg = "Sample timing - " + SCHEDULER.summary()
+        msg = format_msg(msg, 'sys')
+        print(msg)
+        logthis("info", msg)
+    if OUTPUTQUEUE is not None:
+        OUTPUTQUEUE.drain(10)
+        msg = "Output queues - " + OUTPUTQUEUE.summary()
+        msg = format_msg(msg, 'sys')
+        print(msg)
+        logthis("info", msg)
+    if LEDS is not None:
+        LEDS.stop()
     timedelta = datetime.datetime.utcnow() - STARTTIME
     hours, remainder = divmod(timedelta.seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
@@ -1311,11 +2834,26 @@ def stop_sampling(dummy, _):
     msg = format_msg(msg, 'sys')
     print(msg)
     logthis("info", msg)
+    if BENCHMARK is not None:
+        BENCHMARK.finish()
+        sys.exit(0)
     sys.exit(1)
 
 if __name__ == '__main__':
     # Set up and execute an AirPi sampling run.
 
+    STARTUP = StartupTimer()
+    ARGS = parse_args()
+    try:
+        if (ARGS.simulate or ARGS.benchmark is not None or
+                ARGS.replay is not None):
+            hal.use("sim")
+        else:
+            hal.use(os.environ.get("AIRPI_HAL", "real"))
+    except ValueError as excep:
+        print(format_msg(str(excep), 'error'))
+        sys.exit(1)
+
     CFGPATHS = set_cfg_paths()
 
     LOGGER = set_up_logger()
@@ -1327,47 +2865,108 @@ if __name__ == '__main__':
     #Set variables
     gpsplugininstance = None
     SETTINGS = set_settings()
+
+    # Start checking connectivity and the hostname while setting up
+    envprobe.configure(SETTINGS['CONNURL'], SETTINGS['CONNRECHECK'])
+    envprobe.probe().on_change(conn_changed)
+    STARTUP.mark("settings")
     notificationsMade = {}
     samples = 0
+    SCHEDULER = None
+    LEDS = None
     STARTTIME = datetime.datetime.utcnow()
 
     # Add Git commit ref to debug output
-    p1 = subprocess.Popen(["git", "log"], stdout=subprocess.PIPE)
-    p2 = subprocess.Popen(["head", "-1"], stdin=p1.stdout, stdout=subprocess.PIPE)
-    p1.stdout.close()  # Allow p1 to receive a SIGPIPE if p2 exits.
-    commit,err = p2.communicate()
-    logthis('debug', "Git " + commit)
-    for theprocess in [p1,p2]:
-        if theprocess.stdin:
-            theprocess.stdin.close()
-        if theprocess.stdout:
-            theprocess.stdout.close()
-        if theprocess.stderr:
-            theprocess.stderr.close()
+    if LOGGER.isEnabledFor(logging.DEBUG):
+        logthis('debug', "Git commit " + str(get_commit()))
+
+    # Benchmark runs take a fixed number of samples, without waiting
+    BENCHMARK = None
+    if ARGS.benchmark is not None:
+        BENCHMARK = Benchmark(ARGS.benchmark, ARGS.report)
+        SETTINGS['STOPAFTER'] = ARGS.benchmark
+        SETTINGS['WAITTOSTART'] = False
+        SETTINGS['DUMMYDURATION'] = 0
+        SETTINGS['HELP'] = False
+
+    # Replay runs take their samples from a file, not the sensors
+    RECORDING = None
+    if ARGS.replay is not None:
         try:
-            theprocess.kill()
-        except OSError:
-            # can't kill a dead proc
-            pass
+            RECORDING = replay.Recording(ARGS.replay)
+        except (IOError, ValueError) as excep:
+            msg = "Can't replay " + ARGS.replay + ": " + str(excep)
+            msg = format_msg(msg, 'error')
+            print(msg)
+            logthis("error", msg)
+            sys.exit(1)
+        msg = "Replaying " + str(len(RECORDING)) + " samples from "
+        msg += ARGS.replay
+        msg = format_msg(msg, 'info')
+        print(msg)
+        logthis("info", msg)
+        SETTINGS['WAITTOSTART'] = False
+        SETTINGS['DUMMYDURATION'] = 0
 
     #Set up plugins
     PLUGINSSUPPORTS = set_up_supports()
+    STARTUP.mark("supports")
     PLUGINSSENSORS = set_up_sensors()
+    STARTUP.mark("sensors")
     PLUGINSOUTPUTS = set_up_outputs()
+    STARTUP.mark("outputs")
     PLUGINSNOTIFICATIONS = set_up_notifications()
+    STARTUP.mark("notifications")
+
+    # Register the sensor channels for sample frames
+    REPLAY = None
+    if RECORDING is not None:
+        SCHEMA, AGGREGATES = replay_schema(RECORDING, PLUGINSSENSORS)
+        REPLAY = replay_frames(RECORDING, ARGS.speed)
+    else:
+        SCHEMA = sampleframe.Schema()
+        for sensorplugin in PLUGINSSENSORS:
+            sensorplugin.channel = SCHEMA.register(sensorplugin,
+                sensorplugin == gpsplugininstance)
+        AGGREGATES = [sensorplugin.aggregate
+                      for sensorplugin in PLUGINSSENSORS]
 
     # Set up metadata
     METADATA = set_metadata()
     if any_plugins_enabled(PLUGINSOUTPUTS, 'output'):
         output_metadata(PLUGINSOUTPUTS, METADATA)
+    STARTUP.mark("metadata")
 
     led_setup(SETTINGS['REDPIN'], SETTINGS['GREENPIN'])
+    LEDS = LedController(SETTINGS['REDPIN'], SETTINGS['GREENPIN'],
+        SETTINGS['FLASHTIME'], SETTINGS['HEARTBEAT'])
+
+    # Start the workers for concurrent acquisition, if requested
+    ACQUISITION = None
+    if SETTINGS['ACQUISITION'] == "concurrent":
+        ACQUISITION = ConcurrentAcquisition(PLUGINSSENSORS,
+            SETTINGS['WORKERS'])
+
+    # Start the output workers, if requested
+    OUTPUTQUEUE = None
+    if SETTINGS['OUTPUTMODE'] == "queued":
+        OUTPUTQUEUE = OutputQueue(PLUGINSOUTPUTS, SETTINGS['QUEUESIZE'],
+            SETTINGS['OVERFLOW'])
+
+    if BENCHMARK is not None:
+        BENCHMARK.instrument(PLUGINSSUPPORTS)
 
     # Register the Ctrl+C signal handler
     signal.signal(signal.SIGINT, stop_sampling)
 
+    STARTUP.mark("other")
+
     print("==========================================================")
     print(format_msg("Setup complete.", 'success'))
+    msg = "Setup took " + STARTUP.summary()
+    msg = format_msg(msg, 'info')
+    print(msg)
+    logthis("info", msg)
 
     # Do Help
     if SETTINGS["HELP"]:
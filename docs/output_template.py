@@ -55,7 +55,9 @@ class MyOutputClass(output.Output):
 
         Args:
             self: self.
-            datapoints: A dict containing the data to be output.
+            datapoints: The data to be output: a SampleFrame (see
+                        supports/sampleframe.py), which can be used as a
+                        list containing a dict for each reading.
             sampletime: datetime representing the time the sample was taken.
 
         Returns:
@@ -6,7 +6,7 @@ sub-classed for specific Notifications. This is an abstract base class
 
 """
 from abc import ABCMeta, abstractmethod
-import socket
+from supports import envprobe
 
 class Notification():
     """Generic Notification plugin description (abstract) for
@@ -56,13 +56,11 @@ class Notification():
     def gethostname(self):
         """Get current hostname.
 
-        Get the current hostname of the Raspberry Pi.
+        Get the current hostname of the Raspberry Pi. The lookup is
+        shared by all plugins (see supports/envprobe.py).
 
         Returns:
             string The hostname.
 
         """
-        if socket.gethostname().find('.') >= 0:
-            return socket.gethostname()
-        else:
-            return socket.gethostbyaddr(socket.gethostname())[0]
+        return envprobe.hostname()
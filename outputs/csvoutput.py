@@ -8,7 +8,7 @@ along with metadata (again, if present).
 
 import output
 import time
-import calibration
+from supports import calibration
 
 class CSVOutput(output.Output):
     """A module to output data to a CSV file.
@@ -111,7 +111,7 @@ class CSVOutput(output.Output):
             else:
                 if self.header == False:
                     header += ",\"Latitude (deg)\",\"Longitude (deg)\","
-                    header += "Altitude (m)\",\"Exposure\",\"Disposition\""
+                    header += "\"Altitude (m)\",\"Exposure\",\"Disposition\""
                 props = ["latitude",
                             "longitude",
                             "altitude",
@@ -120,8 +120,8 @@ class CSVOutput(output.Output):
                 for prop in props:
                     line += "," + str(point[prop])
         if self.params["limits"] and breach:
-            line += "," + breach
-        line = line[:-1]
+            # Drop the trailing ';'
+            line += "," + breach[:-1]
         # If it's the first write of this instance do a header so we
         # know what's what:
         if self.header == False:
@@ -6,7 +6,7 @@ accurately, stdout). This does not include GPS or metadata.
 """
 
 import output
-import calibration
+from supports import calibration
 
 class Dashboard(output.Output):
     """A module to print AirPi data to screen.
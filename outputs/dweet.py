@@ -11,7 +11,7 @@ parent class (Output), i.e. always returns True.
 """
 
 import output
-import calibration
+from supports import calibration
 import requests
 import datetime
 
@@ -58,7 +58,7 @@ class Dweet(output.Output):
                                                                 2)
         try:
             req = requests.get("https://dweet.io/dweet/for/" + self.params["thing"],
-                                params=data)
+                                params=data, timeout=self.timeout)
             print("[" + datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") + "] Successfully dweeted.")
         except Exception as e:
             print("ERROR: Did not dweet successfully.")
@@ -4,12 +4,22 @@ from datetime import datetime
 import time
 from threading import Thread
 from string import replace
-import numpy
 import re
 import csv
 import socket
 import output
-import calibration
+from supports import calibration
+
+# numpy is slow to import (several seconds on a Pi Zero), so it is only
+# imported when it is first needed; see load_numpy().
+numpy = None
+
+def load_numpy():
+    """Import numpy, if it hasn't been imported already."""
+    global numpy
+    if numpy is None:
+        import numpy as numpymodule
+        numpy = numpymodule
 
 # useful resources:
 # http://unixunique.blogspot.co.uk/2011/06/simple-python-http-web-server.html
@@ -138,6 +148,7 @@ class HTTP(output.Output):
             self.loadData()
 
     def createSensorIds(self,dataPoints):
+        load_numpy()
         for i in dataPoints:
             self.sensorIds.append(i["sensor"]+" "+i["name"])
             self.readingtypes[len(self.sensorIds)-1] = i["readingtype"]
@@ -145,6 +156,7 @@ class HTTP(output.Output):
         self.tempHistory = numpy.zeros([2, len(self.sensorIds)])
 
     def loadData(self):
+        load_numpy()
         with open(self.historyFile, "r") as csvfile:
             # get file length
             for flen, l in enumerate(csvfile):
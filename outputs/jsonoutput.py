@@ -18,7 +18,7 @@ https://github.com/river-io/AirPi/blob/master/outputs/log.py
 
 import output
 import time
-import calibration
+from supports import calibration
 
 class JSONOutput(output.Output):
     """A module to output AirPi data to a json file.
@@ -117,9 +117,9 @@ class JSONOutput(output.Output):
                             "exposure",
                             "disposition"]
                 for prop in props:
-                    line += "\"" + prop + "\":" + str(point[prop]) + "\","
+                    line += "\"" + prop + "\":\"" + str(point[prop]) + "\","
         if self.params["limits"] and breach:
-            line += "," + breach
+            line += '"BREACHES":"' + breach[:-1] + '",'
         line = line[:-1] + "}"
         self.file.write(line + "\n")
         # Flush the file in case of power failure:
@@ -6,10 +6,9 @@ be instantiated directly.
 
 """
 from abc import ABCMeta, abstractmethod
-import socket
 import ConfigParser
 import os
-import urllib2
+from supports import envprobe
 
 class Output(object):
     """Generic Output plugin description (abstract) for sub-classing.
@@ -22,7 +21,7 @@ class Output(object):
 
     __metaclass__ = ABCMeta
     requiredGenericParams = ["target"]
-    optionalGenericParams = ["calibration", "metadata", "limits"]
+    optionalGenericParams = ["calibration", "metadata", "limits", "timeout"]
     requiredSpecificParams = None
     optionalSpecificParams = None
     commonParams = None
@@ -34,16 +33,22 @@ class Output(object):
         self.params = {}
         if self.setallparams(config):
             if (self.params["target"] == "internet") and not self.check_conn():
-                msg = "Skipping output plugin " + self.name
-                msg += " because no internet connectivity."
-                #msg = format_msg(msg, 'error')
+                # Connectivity is checked again during the run (see
+                # online()), so the plugin is kept
+                msg = "No internet connectivity for output plugin "
+                msg += self.name + "; it will be used once there is."
+                #msg = format_msg(msg, 'warning')
                 print(msg)
                 #logthis("info", msg)
-                raise NoInternetConnection
         else:
             msg = "Failed to set parameters for output plugin " + self.name
             print(msg)
             #logthis("error", msg)
+        # Time allowed for each call to output_data(); if not set here
+        # then airpi.py applies the default from settings.cfg.
+        self.timeout = None
+        if self.params["timeout"]:
+            self.timeout = float(self.params["timeout"])
         if self.params["calibration"]:
             import sys
             sys.path.append(sys.path[0] + '/supports')
@@ -114,21 +119,29 @@ class Output(object):
     def check_conn():
         """Check internet connectivity.
 
-        Check for internet connectivity by trying to connect to a website.
+        Check for internet connectivity. The check is shared by all
+        plugins, and re-checked in the background (see
+        supports/envprobe.py).
 
         Returns:
-            boolean True if successfully connects to the site within five
-                    seconds.
-            boolean False if fails to connect to the site within five
-                    seconds.
+            boolean True if there was internet connectivity when last
+                    checked.
 
         """
-        try:
-            urllib2.urlopen("http://www.google.com", timeout=5)
-            return True
-        except urllib2.URLError:
-            pass
-        return False
+        return envprobe.connected()
+
+    def online(self):
+        """Check whether the plugin can output data at the moment.
+
+        Args:
+            self: self.
+
+        Returns:
+            boolean False if the plugin's target is the internet, but
+                    there is no internet connectivity; True otherwise.
+
+        """
+        return self.params["target"] != "internet" or self.check_conn()
 
     @abstractmethod
     def output_data(self):
@@ -193,17 +206,14 @@ class Output(object):
     def gethostname():
         """Get current hostname.
 
-        Get the current hostname of the Raspberry Pi.
+        Get the current hostname of the Raspberry Pi. The lookup is
+        shared by all plugins (see supports/envprobe.py).
 
         Returns:
             string The hostname.
 
         """
-        if socket.gethostname().find('.') >= 0:
-            host = socket.gethostname()
-        else:
-            host = socket.gethostbyaddr(socket.gethostname())[0]
-        return host
+        return envprobe.hostname()
 
     def getname(self):
         """Get Class name.
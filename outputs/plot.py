@@ -8,8 +8,7 @@ include GPS data.
 
 import os
 import output
-import calibration
-import ap
+from supports import calibration
 
 class Plot(output.Output):
     """A module to print AirPi data to screen as a graph.
@@ -60,6 +59,9 @@ class Plot(output.Output):
                 if self.unit is None:
                     self.unit = point["unit"]
 
+        # ap needs numpy, which is slow to import, so it is imported
+        # when it's first needed rather than when the plugin is loaded
+        import ap
         x = range(0, len(self.history))
         y = self.history
         xlimits = [min(x), max(x)]
@@ -72,7 +72,7 @@ This module is based on code by Francois Guillier, with permission
 import output
 import datetime
 import time
-import calibration
+from supports import calibration
 import rrdtool
 
 class RRDOutput(output.Output):
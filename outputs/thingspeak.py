@@ -1,6 +1,6 @@
 import output
 import requests
-import calibration
+from supports import calibration
 
 class Thingspeak(output.Output):
 
@@ -40,7 +40,7 @@ class Thingspeak(output.Output):
                 counter += 1
         url = "https://api.thingspeak.com/update?key=" + self.apikey
         try:
-            z = requests.post(url, params=arr)
+            z = requests.post(url, params=arr, timeout=self.timeout)
             if z.text == "0":
                 print("Error: ThingSpeak error - " + z.text)
                 print("Error: ThingSpeak URL  - " + z.url)
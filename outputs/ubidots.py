@@ -82,7 +82,8 @@ class Ubidots(output.Output):
         req = None
         cost = 0
         try:
-            req = requests.post(url, data=json.dumps(payload), headers=headers)
+            req = requests.post(url, data=json.dumps(payload), headers=headers,
+                                timeout=self.timeout)
         except Exception, e:
             print("ERROR: Failed to contact the Ubidots service.")
             print("ERROR: " + str(e))
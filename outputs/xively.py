@@ -1,7 +1,7 @@
 import output
 import requests
 import json
-import calibration
+from supports import calibration
 
 class Xively(output.Output):
     """
@@ -59,9 +59,9 @@ class Xively(output.Output):
         a = json.dumps({"version":"1.0.0", "datastreams":arr})
         try:
             if self.proxies is None:
-                z = requests.put("https://api.xively.com/v2/feeds/"+self.feedid+".json", headers={"X-apikey":self.apikey}, data=a)
+                z = requests.put("https://api.xively.com/v2/feeds/"+self.feedid+".json", headers={"X-apikey":self.apikey}, data=a, timeout=self.timeout)
             else:
-                z = requests.put("https://api.xively.com/v2/feeds/"+self.feedid+".json", headers={"X-apikey":self.apikey}, data=a, proxies=self.proxies)
+                z = requests.put("https://api.xively.com/v2/feeds/"+self.feedid+".json", headers={"X-apikey":self.apikey}, data=a, proxies=self.proxies, timeout=self.timeout)
             if z.text != "":
                 print("Error: Xively message - " + z.text)
                 print("Error: Xively URL - " + z.url)
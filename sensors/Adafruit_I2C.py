@@ -1,4 +1,4 @@
-import smbus
+import i2cbus
 
 # ===========================================================================
 # Adafruit_I2C Base Class
@@ -8,7 +8,8 @@ class Adafruit_I2C:
 
     def __init__(self, address, bus=0, debug=False):
         self.address = address
-        self.bus = smbus.SMBus(bus)
+        # Shared with the other devices on the bus
+        self.bus = i2cbus.get(bus)
         self.debug = debug
 
     def reversebyteorder(self, data):
@@ -41,6 +42,18 @@ class Adafruit_I2C:
             print("Error accessing 0x%02X: Check your I2C address" % self.address)
             return -1
 
+    def readlist(self, reg, length):
+        "Read a list of bytes from the I2C device, in one block read"
+        try:
+            results = self.bus.read_i2c_block_data(self.address, reg, length)
+            if self.debug:
+                print("I2C: Device 0x%02X returned the following from reg 0x%02X" % (self.address, reg))
+                print(results)
+            return results
+        except IOError:
+            print("Error accessing 0x%02X: Check your I2C address" % self.address)
+            return -1
+
     def readu8(self, reg):
         "Read an unsigned byte from the I2C device"
         try:
@@ -3,6 +3,14 @@ Generic class to support analogue sensors.
 
 The MCP3008 ADC is used by this class, and output can be in
 either Ohms or millivolts depending on the exact sensor in question.
+All of the Analogue sensors' channels are read together, once per sample
+(see MCP3008.readcached()). Alternatively, a channel can be sampled
+continuously (see MCP3008.stream()), and a statistic of the readings over
+a recent window reported instead.
+Each channel can be read several times per sample (oversampled) to reduce
+noise. Raw ADC values are converted using a table, worked out when the
+sensor is set up, of the value for each of the 1024 possible ADC values,
+so reading many times per sample costs little more than reading once.
 
 """
 import mcp3008
@@ -14,7 +22,11 @@ class Analogue(sensor.Sensor):
 
     """
     requiredData = ["adcpin", "measurement", "sensorname"]
-    optionalData = ["pullupResistance", "pulldownResistance", "sensorvoltage", "description"]
+    optionalData = ["pullupResistance", "pulldownResistance", "sensorvoltage", "description",
+                    "window", "statistic", "oversample", "oversampleMethod",
+                    "curve", "curveUnit"]
+    statistics = ["mean", "peak", "rms"]
+    oversamplemethods = ["median", "mean"]
 
     def __init__(self, data):
         """Initialise.
@@ -38,7 +50,7 @@ class Analogue(sensor.Sensor):
         if "pulldownResistance" in data:
             self.pulldown = int(data["pulldownResistance"])
         if "sensorvoltage" in data:
-            self.sensorvoltage = int(data["sensorvoltage"])
+            self.sensorvoltage = float(data["sensorvoltage"])
         else:
             self.sensorvoltage = 3.3
 
@@ -57,10 +69,120 @@ class Analogue(sensor.Sensor):
         if self.pullup == None and self.pulldown == None:
             self.valunit = "millvolts"
             self.valsymbol = "mV"
+        self.curve = None
+        if "curve" in data:
+            try:
+                self.curve = parse_curve(data["curve"])
+            except ValueError as excep:
+                msg = "The curve for the " + self.valname + " measurement"
+                msg += " is not valid: " + str(excep)
+                print(msg)
+                raise ConfigError
+            self.valunit = data.get("curveUnit", "ppm")
+            self.valsymbol = self.valunit
         if "description" in data:
             self.description = data["description"]
         else:
             self.description = "An analogue sensor."
+        self.oversample = int(data.get("oversample", 1))
+        self.oversamplemethod = data.get("oversampleMethod", "median").lower()
+        if (self.oversample < 1 or
+                self.oversamplemethod not in Analogue.oversamplemethods):
+            msg = "Please set 'oversample' to 1 or more, and"
+            msg += " 'oversampleMethod' to one of: "
+            msg += ", ".join(Analogue.oversamplemethods) + ", for the "
+            msg += self.valname + " measurement"
+            print(msg)
+            raise ConfigError
+        self.table = self.make_table()
+        self.window = None
+        self.statistic = None
+        if "window" in data:
+            self.statistic = data.get("statistic", "mean").lower()
+            if self.statistic not in Analogue.statistics:
+                msg = "The statistic for the " + self.valname + " measurement"
+                msg += " must be one of: " + ", ".join(Analogue.statistics)
+                print(msg)
+                raise ConfigError
+            if self.statistic == "rms" and self.valsymbol != "mV":
+                msg = "The 'rms' statistic can only be used for the "
+                msg += self.valname + " measurement if it is in millivolts"
+                print(msg)
+                raise ConfigError
+            try:
+                self.adc.stream(self.adcpin, float(data["window"]))
+                self.window = float(data["window"])
+            except ImportError:
+                msg = "numpy is needed to sample the " + self.valname
+                msg += " measurement continuously; reading it once per"
+                msg += " sample instead."
+                print(msg)
+        if self.window is None:
+            self.adc.register(self.adcpin, self.oversample)
+
+    def convert(self, result):
+        """Convert a raw ADC value to a sensor value.
+
+        Args:
+            self: self.
+            result: The raw ADC value (1 to 1023).
+
+        Returns:
+            float The sensor value.
+            None If there isn't one (e.g. no voltage across the
+                 pull-up resistor).
+
+        """
+        vout = float(result)/1023 * self.adc.vref
+        try:
+            if self.pulldown != None:
+                resout = (self.pulldown * self.sensorvoltage) / vout - self.pulldown
+            elif self.pullup != None:
+                resout = self.pullup / ((self.sensorvoltage / vout) - 1)
+            else:
+                resout = vout * 1000
+        except ZeroDivisionError:
+            return None
+        if self.curve is not None:
+            return interpolate(self.curve, resout)
+        return resout
+
+    def make_table(self):
+        """Work out the sensor value for every possible raw ADC value.
+
+        Args:
+            self: self.
+
+        Returns:
+            list The value for each raw ADC value (0 to 1023); None for 0.
+
+        """
+        return [None] + [self.convert(result) for result in range(1, 1024)]
+
+    def lookup(self, result):
+        """Get the sensor value for a raw ADC value from the table.
+
+        Args:
+            self: self.
+            result: The raw ADC value. This may be fractional (e.g. the mean
+                    of several readings), in which case the value is
+                    interpolated between the neighbouring table entries.
+
+        Returns:
+            float The sensor value, or None if there isn't one.
+
+        """
+        if result < 0:
+            # Not a valid ADC channel
+            return None
+        index = int(result)
+        fraction = result - index
+        if fraction == 0 or index >= 1023:
+            return self.table[index]
+        lower, upper = self.table[index], self.table[index + 1]
+        if lower is None or upper is None:
+            return self.table[int(round(result))]
+        return lower + (upper - lower) * fraction
 
     def getval(self):
         """Get the current sensor value.
@@ -68,6 +190,11 @@ class Analogue(sensor.Sensor):
         Get the current sensor value, in either Ohms or millivolts depending
         on the exact sensor. Includes a 'sense check' to identify
         potential errors with full or no voltage.
+        If the sensor is sampled continuously, the value is the chosen
+        statistic of the readings in the window: 'mean' (the average,
+        which also reduces noise), 'peak' (the highest voltage) or 'rms'
+        (the root mean square of the variation about the mean, in
+        millivolts, e.g. for the volume of sound).
 
         Args:
             self: self.
@@ -77,25 +204,89 @@ class Analogue(sensor.Sensor):
             None If there is potentially an error with the data.
 
         """
-        result = self.adc.readadc(self.adcpin)
-        if result == 0:
+        if self.window is not None:
+            readings = self.adc.window(self.adcpin, self.window)
+            if len(readings) == 0:
+                return None
+            lowest, highest = int(readings.min()), int(readings.max())
+        else:
+            readings = self.adc.readcached(self.adcpin)
+            lowest, highest = min(readings), max(readings)
+        if highest == 0:
             msg = "Error: Check wiring for the " + self.sensorname
             msg += " measurement, no voltage detected on ADC input "
             msg += str(self.adcpin)
             print(msg)
             return None
-        if result == 1023 and self.sensorname != "LDR":
+        if lowest == 1023 and self.sensorname != "LDR":
             msg = "Error: Check wiring for the " + self.sensorname
             msg += " measurement, full voltage detected on ADC input "
             msg += str(self.adcpin)
             print(msg)
             return None
-        vout = float(result)/1023 * 3.3
-
-        if self.pulldown != None:
-            resout = (self.pulldown * self.sensorvoltage) / vout - self.pulldown
-        elif self.pullup != None:
-            resout = self.pullup / ((self.sensorvoltage / vout) - 1)
+        if self.window is None:
+            if len(readings) == 1:
+                result = readings[0]
+            elif self.oversamplemethod == "mean":
+                result = float(sum(readings)) / len(readings)
+            else:
+                readings = sorted(readings)
+                middle = len(readings) // 2
+                if len(readings) % 2:
+                    result = readings[middle]
+                else:
+                    result = (readings[middle - 1] + readings[middle]) / 2.0
+        elif self.statistic == "peak":
+            result = highest
+        elif self.statistic == "rms":
+            return float(readings.std()) / 1023 * self.adc.vref * 1000
         else:
-            resout = vout * 1000
-        return resout
+            result = float(readings.mean())
+        return self.lookup(result)
+
+def parse_curve(text):
+    """Read a calibration curve from sensors.cfg.
+
+    Args:
+        text: Comma-separated 'value:calibrated value' points, e.g.
+              "1000:400, 5000:100, 20000:10".
+
+    Returns:
+        list The (value, calibrated value) points, in order of value.
+
+    Raises:
+        ValueError: The curve is not in the right format, or has fewer
+                    than two points.
+
+    """
+    points = []
+    for point in text.split(","):
+        parts = point.split(":")
+        if len(parts) != 2:
+            raise ValueError("'" + point.strip() + "' is not 'value:value'")
+        points.append((float(parts[0]), float(parts[1])))
+    points.sort()
+    if len(points) < 2:
+        raise ValueError("at least two points are needed")
+    return points
+
+def interpolate(curve, value):
+    """Look up a value on a calibration curve.
+
+    Values between two points of the curve are interpolated linearly;
+    values outside the curve are given the value of its nearest end.
+
+    Args:
+        curve: The curve, from parse_curve().
+        value: The value to look up.
+
+    Returns:
+        float The calibrated value.
+
+    """
+    if value <= curve[0][0]:
+        return curve[0][1]
+    for (x0, y0), (x1, y1) in zip(curve, curve[1:]):
+        if value <= x1:
+            return y0 + (y1 - y0) * (value - x0) / (x1 - x0)
+    return curve[-1][1]
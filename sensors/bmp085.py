@@ -18,6 +18,8 @@ class BMP085(sensor.Sensor):
     """
 
     bmpClass = None
+    # Enough for the conversions of the BMP085 and an HTU21D on the same bus
+    leadtime = 0.1
     requiredData = ["measurement", "i2cbus"]
     optionalData = ["altitude", "mslp", "unit", "description"]
 
@@ -93,7 +95,7 @@ class BMP085(sensor.Sensor):
 
         """
         if self.valname == "Temperature-BMP":
-            temp = BMP085.bmpClass.readtemperature()
+            temp = BMP085.bmpClass.readcached("temperature")
             if self.valunit == "Fahrenheit":
                 try:
                     temp = temp * 1.8 + 32
@@ -108,7 +110,20 @@ class BMP085(sensor.Sensor):
             return temp
         elif self.valname == "Pressure":
             # Multiply by 0.01 to convert to Hectopascals
+            pressure = BMP085.bmpClass.readcached("pressure")
+            if pressure is None:
+                return None
             if self.mslp:
-                return BMP085.bmpClass.readmslpressure(self.altitude) * 0.01
+                return BMP085.bmpClass.readmslpressure(self.altitude,
+                                                       pressure) * 0.01
             else:
-                return BMP085.bmpClass.readpressure() * 0.01
+                return pressure * 0.01
+
+    def start(self):
+        """Start the conversion for the next sample (see sensor.Sensor).
+
+        Args:
+            self: self.
+
+        """
+        BMP085.bmpClass.start()
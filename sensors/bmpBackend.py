@@ -2,6 +2,10 @@
 
 A low-level Class to read data directly from the Bosch BMP085 sensor,
 which provides barometric (air pressure) and temperature readings.
+A pressure reading needs a temperature conversion as well, so the
+temperature and pressure sensor plugins share one of each per sample
+(see readcached()). These are done alongside the conversions of the
+other devices on the I2C bus (see i2cbus.py).
 
 """
 
@@ -9,6 +13,7 @@ import time
 import math
 
 from Adafruit_I2C import Adafruit_I2C
+import i2cbus
 
 # ===========================================================================
 # BMP085 Class
@@ -75,20 +80,38 @@ class BMP085:
             self.mode = mode
         # Read the calibration data
         self.readcalibrationdata()
+        self.key = self.i2c.bus.register(self.measure)
 
     def readcalibrationdata(self):
-        "Reads the calibration data from the IC"
-        self._cal_AC1 = self.i2c.reads16(self.__BMP085_CAL_AC1)   # INT16
-        self._cal_AC2 = self.i2c.reads16(self.__BMP085_CAL_AC2)   # INT16
-        self._cal_AC3 = self.i2c.reads16(self.__BMP085_CAL_AC3)   # INT16
-        self._cal_AC4 = self.i2c.readu16(self.__BMP085_CAL_AC4)   # UINT16
-        self._cal_AC5 = self.i2c.readu16(self.__BMP085_CAL_AC5)   # UINT16
-        self._cal_AC6 = self.i2c.readu16(self.__BMP085_CAL_AC6)   # UINT16
-        self._cal_B1 = self.i2c.reads16(self.__BMP085_CAL_B1)     # INT16
-        self._cal_B2 = self.i2c.reads16(self.__BMP085_CAL_B2)     # INT16
-        self._cal_MB = self.i2c.reads16(self.__BMP085_CAL_MB)     # INT16
-        self._cal_MC = self.i2c.reads16(self.__BMP085_CAL_MC)     # INT16
-        self._cal_MD = self.i2c.reads16(self.__BMP085_CAL_MD)     # INT16
+        "Reads the calibration data from the IC, in one block read"
+        data = self.i2c.readlist(self.__BMP085_CAL_AC1, 22)
+        if data == -1:
+            data = [0] * 22
+        values = []
+        for index in range(0, 22, 2):
+            values.append((data[index] << 8) + data[index + 1])
+        (self._cal_AC1, self._cal_AC2, self._cal_AC3, self._cal_AC4,
+         self._cal_AC5, self._cal_AC6, self._cal_B1, self._cal_B2,
+         self._cal_MB, self._cal_MC, self._cal_MD) = values
+        # AC4-AC6 are unsigned, the rest are signed
+        for name in ["_cal_AC1", "_cal_AC2", "_cal_AC3", "_cal_B1",
+                     "_cal_B2", "_cal_MB", "_cal_MC", "_cal_MD"]:
+            if getattr(self, name) > 32767:
+                setattr(self, name, getattr(self, name) - 65536)
+        # Parts of the compensation which only depend on the calibration
+        # data and the mode
+        self._mc = self._cal_MC << 11
+        self._ac1 = self._cal_AC1 * 4
+        self._b7scale = 50000 >> self.mode
+        self._shift = 8 - self.mode
+        if self.mode == self.__BMP085_ULTRALOWPOWER:
+            self._pressuredelay = 0.005
+        elif self.mode == self.__BMP085_HIGHRES:
+            self._pressuredelay = 0.014
+        elif self.mode == self.__BMP085_ULTRAHIGHRES:
+            self._pressuredelay = 0.026
+        else:
+            self._pressuredelay = 0.008
         if self.debug:
             self.showcalibrationdata()
 
@@ -110,7 +133,10 @@ class BMP085:
         "Reads the raw (uncompensated) temperature from the sensor"
         self.i2c.write8(self.__BMP085_CONTROL, self.__BMP085_READTEMPCMD)
         time.sleep(0.005)  # Wait 5ms
-        raw = self.i2c.readu16(self.__BMP085_TEMPDATA)
+        data = self.i2c.readlist(self.__BMP085_TEMPDATA, 2)
+        if data == -1:
+            return None
+        raw = (data[0] << 8) + data[1]
         if self.debug:
             print("DBG: Raw Temp: 0x%04X (%d)" % (raw & 0xFFFF, raw))
         return raw
@@ -118,111 +144,40 @@ class BMP085:
     def readrawpressure(self):
         "Reads the raw (uncompensated) pressure level from the sensor"
         self.i2c.write8(self.__BMP085_CONTROL, self.__BMP085_readpressureCMD + (self.mode << 6))
-        if self.mode == self.__BMP085_ULTRALOWPOWER:
-            time.sleep(0.005)
-        elif self.mode == self.__BMP085_HIGHRES:
-            time.sleep(0.014)
-        elif self.mode == self.__BMP085_ULTRAHIGHRES:
-            time.sleep(0.026)
-        else:
-            time.sleep(0.008)
-        msb = self.i2c.readu8(self.__BMP085_PRESSUREDATA)
-        lsb = self.i2c.readu8(self.__BMP085_PRESSUREDATA+1)
-        xlsb = self.i2c.readu8(self.__BMP085_PRESSUREDATA+2)
-        raw = ((msb << 16) + (lsb << 8) + xlsb) >> (8 - self.mode)
+        time.sleep(self._pressuredelay)
+        data = self.i2c.readlist(self.__BMP085_PRESSUREDATA, 3)
+        if data == -1:
+            return None
+        raw = ((data[0] << 16) + (data[1] << 8) + data[2]) >> self._shift
         if self.debug:
             print("DBG: Raw Pressure: 0x%04X (%d)" % (raw & 0xFFFF, raw))
         return raw
 
-    def readtemperature(self):
-        "Gets the compensated temperature in degrees celcius"
-        UT = 0
-        X1 = 0
-        X2 = 0
-        B5 = 0
-        temp = 0.0
-
-        # Read raw temp before aligning it with the calibration values
-        UT = self.readrawtemp()
+    def compensatetemperature(self, UT):
+        "Gets B5 (used for the pressure) and the temperature in degrees celcius"
         X1 = ((UT - self._cal_AC6) * self._cal_AC5) >> 15
-        X2 = (self._cal_MC << 11) / (X1 + self._cal_MD)
+        X2 = self._mc / (X1 + self._cal_MD)
         B5 = X1 + X2
         temp = ((B5 + 8) >> 4) / 10.0
         if self.debug:
+            print("DBG: B5 = %d" % (B5))
             print("DBG: Calibrated temperature = %f C" % temp)
-        return temp
+        return B5, temp
 
-    def readpressure(self):
+    def compensatepressure(self, UP, B5):
         "Gets the compensated pressure in pascal"
-        UT = 0
-        UP = 0
-        B3 = 0
-        B5 = 0
-        B6 = 0
-        X1 = 0
-        X2 = 0
-        X3 = 0
-        p = 0
-        B4 = 0
-        B7 = 0
-
-        UT = self.readrawtemp()
-        UP = self.readrawpressure()
-
-        # You can use the datasheet values to test the conversion results
-        # dsvalues = True
-        dsvalues = False
-
-        if dsvalues:
-            UT = 27898
-            UP = 23843
-            self._cal_AC1 = 408
-            self._cal_AC2 = -72
-            self._cal_AC3 = -14383
-            self._cal_AC4 = 32741
-            self._cal_AC5 = 32757
-            self._cal_AC6 = 23153
-            self._cal_B1 = 6190
-            self._cal_B2 = 4
-            self._cal_MB = -32767
-            self._cal_MC = -8711
-            self._cal_MD = 2868
-            self.mode = self.__BMP085_ULTRALOWPOWER
-            if self.debug:
-                self.showcalibrationdata()
-
-        # True Temperature Calculations
-        X1 = ((UT - self._cal_AC6) * self._cal_AC5) >> 15
-        X2 = (self._cal_MC << 11) / (X1 + self._cal_MD)
-        B5 = X1 + X2
-        if self.debug:
-            print("DBG: X1 = %d" % (X1))
-            print("DBG: X2 = %d" % (X2))
-            print("DBG: B5 = %d" % (B5))
-            print("DBG: True Temperature = %.2f C" % (((B5 + 8) >> 4) / 10.0))
-
-        # Pressure Calculations
         B6 = B5 - 4000
-        X1 = (self._cal_B2 * ((B6 * B6) >> 12)) >> 11
+        B6sq = (B6 * B6) >> 12
+        X1 = (self._cal_B2 * B6sq) >> 11
         X2 = (self._cal_AC2 * B6) >> 11
         X3 = X1 + X2
-        B3 = (((self._cal_AC1 * 4 + X3) << self.mode) + 2) / 4
-        if self.debug:
-            print("DBG: B6 = %d" % (B6))
-            print("DBG: X1 = %d" % (X1))
-            print("DBG: X2 = %d" % (X2))
-            print("DBG: B3 = %d" % (B3))
+        B3 = (((self._ac1 + X3) << self.mode) + 2) / 4
 
         X1 = (self._cal_AC3 * B6) >> 13
-        X2 = (self._cal_B1 * ((B6 * B6) >> 12)) >> 16
+        X2 = (self._cal_B1 * B6sq) >> 16
         X3 = ((X1 + X2) + 2) >> 2
         B4 = (self._cal_AC4 * (X3 + 32768)) >> 15
-        B7 = (UP - B3) * (50000 >> self.mode)
-        if self.debug:
-            print("DBG: X1 = %d" % (X1))
-            print("DBG: X2 = %d" % (X2))
-            print("DBG: B4 = %d" % (B4))
-            print("DBG: B7 = %d" % (B7))
+        B7 = (UP - B3) * self._b7scale
 
         if B7 < 0x80000000:
             p = (B7 * 2) / B4
@@ -232,17 +187,88 @@ class BMP085:
         X1 = (p >> 8) * (p >> 8)
         X1 = (X1 * 3038) >> 16
         X2 = (-7357 * p) >> 16
-        if self.debug:
-            print("DBG: p  = %d" % (p))
-            print("DBG: X1 = %d" % (X1))
-            print("DBG: X2 = %d" % (X2))
-
         p = p + ((X1 + X2 + 3791) >> 4)
         if self.debug:
             print("DBG: Pressure = %d Pa" % (p))
-
         return p
 
+    def readtemperature(self):
+        "Gets the compensated temperature in degrees celcius"
+        UT = self.readrawtemp()
+        if UT is None:
+            return None
+        return self.compensatetemperature(UT)[1]
+
+    def readpressure(self):
+        "Gets the compensated pressure in pascal"
+        return self.readboth()[1]
+
+    def readboth(self):
+        "Gets the compensated temperature (celcius) and pressure (pascal) together"
+        results = []
+        i2cbus.pipeline([self.measure(results.append)])
+        if results[0] is None:
+            return None, None
+        return results[0]["temperature"], results[0]["pressure"]
+
+    def measure(self, store):
+        """Converts the temperature and then the pressure.
+
+        This is a conversion for i2cbus.pipeline(): it yields how long to
+        wait for each conversion on the sensor to finish.
+
+        Args:
+            self: self.
+            store: Function to call with a dict of the compensated
+                   temperature (celcius) and pressure (pascal), or None if
+                   the sensor could not be read.
+
+        """
+        self.i2c.write8(self.__BMP085_CONTROL, self.__BMP085_READTEMPCMD)
+        yield 0.005
+        temp = self.i2c.readlist(self.__BMP085_TEMPDATA, 2)
+        self.i2c.write8(self.__BMP085_CONTROL, self.__BMP085_readpressureCMD + (self.mode << 6))
+        yield self._pressuredelay
+        pressure = self.i2c.readlist(self.__BMP085_PRESSUREDATA, 3)
+        if temp == -1 or pressure == -1:
+            store(None)
+            return
+        UT = (temp[0] << 8) + temp[1]
+        UP = ((pressure[0] << 16) + (pressure[1] << 8) + pressure[2]) >> self._shift
+        B5, temp = self.compensatetemperature(UT)
+        store({"temperature": temp,
+               "pressure": self.compensatepressure(UP, B5)})
+
+    def readcached(self, quantity):
+        """Gets the temperature or pressure from the conversion for this sample.
+
+        Both the temperature and the pressure plugins are read each sample,
+        but one temperature and one pressure conversion give both values,
+        so they share the bus's conversions for the sample (see
+        i2cbus.I2CBus.results()).
+
+        Args:
+            self: self.
+            quantity: 'temperature' (in celcius) or 'pressure' (in pascal).
+
+        Returns:
+            The value, or None if the sensor could not be read.
+
+        """
+        results = self.i2c.bus.results(self.key, (self.key, quantity))
+        if results is None:
+            return None
+        return results[quantity]
+
+    def start(self):
+        """Starts the conversion for the next sample in the background.
+
+        Args:
+            self: self.
+
+        """
+        self.i2c.bus.start()
+
     def readaltitude(self, sealevelpressure=101325):
         "Calculates the altitude in meters"
         altitude = 0.0
@@ -252,9 +278,11 @@ class BMP085:
             print("DBG: Altitude = %d" % (altitude))
         return altitude
 
-    def readmslpressure(self, altitude):
-        "Calculates the mean sea level pressure"
-        pressure = float(self.readpressure())
+    def readmslpressure(self, altitude, pressure=None):
+        "Calculates the mean sea level pressure (from 'pressure', if given)"
+        if pressure is None:
+            pressure = self.readpressure()
+        pressure = float(pressure)
         T0 = float(altitude) / 44330
         T1 = math.pow(1 - T0, 5.255)
         mslpressure = pressure / T1
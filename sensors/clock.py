@@ -0,0 +1,81 @@
+""" Monotonic clock.
+
+A clock which only ever moves forwards at a steady rate, regardless of
+any changes made to the system (wall) clock by NTP or by the user. This
+is what should be used to measure intervals and to schedule readings;
+the wall clock should only be used for timestamps.
+Python 2 has no time.monotonic(), so on Linux clock_gettime() is called
+directly via ctypes. If that is not available, time.time() is used
+instead (guarded so that it can never go backwards).
+
+"""
+import ctypes
+import ctypes.util
+import threading
+import time
+
+CLOCK_MONOTONIC = 1
+
+class Timespec(ctypes.Structure):
+    """ The 'struct timespec' used by clock_gettime(). """
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_nsec", ctypes.c_long)]
+
+def load_clock_gettime():
+    """Find clock_gettime() in the C libraries.
+
+    Returns:
+        The clock_gettime() function, or None if it could not be found.
+
+    """
+    for libname in [ctypes.util.find_library("rt"),
+                    ctypes.util.find_library("c"),
+                    "librt.so.1",
+                    "libc.so.6"]:
+        if not libname:
+            continue
+        try:
+            lib = ctypes.CDLL(libname, use_errno=True)
+            func = lib.clock_gettime
+        except (OSError, AttributeError):
+            continue
+        func.argtypes = [ctypes.c_int, ctypes.POINTER(Timespec)]
+        return func
+    return None
+
+CLOCK_GETTIME = load_clock_gettime()
+LOCK = threading.Lock()
+LAST = [0.0]
+
+def monotonic():
+    """Get the current monotonic time.
+
+    Get the current time from a clock which never goes backwards. The
+    value has no meaning on its own (it is not a date), only the
+    difference between two values is meaningful.
+
+    Returns:
+        float The current monotonic time, in seconds.
+
+    """
+    if hasattr(time, "monotonic"):
+        return time.monotonic()
+    if CLOCK_GETTIME is not None:
+        now = Timespec()
+        if CLOCK_GETTIME(CLOCK_MONOTONIC, ctypes.byref(now)) == 0:
+            return now.tv_sec + now.tv_nsec * 1e-9
+    with LOCK:
+        LAST[0] = max(LAST[0], time.time())
+        return LAST[0]
+
+def sleep_until(deadline):
+    """Sleep until a given monotonic time.
+
+    Args:
+        deadline: The monotonic time (see monotonic()) to sleep until.
+                  If this is in the past, return straight away.
+
+    """
+    remaining = deadline - monotonic()
+    while remaining > 0:
+        time.sleep(remaining)
+        remaining = deadline - monotonic()
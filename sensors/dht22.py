@@ -4,13 +4,38 @@ A high-level Class to read data from the DHT22 sensor. An instance of
 the Class can read *either* temperature *or* pressure; see __init__()
 for more detail. Requires the low-level dhtreader.so (shared object) to
 read the raw data from the sensor.
+Reading a DHT22 takes a while, and it can't be read more often than once
+every two seconds, so each pin with a DHT22 on it is read continuously by
+a background thread (see DHTPoller); the sensor plugins are given its
+latest reading straight away.
 
 """
 import sensor
-import dhtreader
-import time
+import hal
+import clock
 import threading
 
+dhtreader = None # the DHT reader, from the hardware abstraction layer
+
+POLLERS = {}
+POLLERSLOCK = threading.Lock()
+
+def poller(pin):
+    """Get the (running) poller for a pin, starting it if need be.
+
+    Args:
+        pin: The GPIO pin the DHT22 is connected to.
+
+    Returns:
+        DHTPoller The poller.
+
+    """
+    with POLLERSLOCK:
+        if pin not in POLLERS:
+            POLLERS[pin] = DHTPoller(pin)
+            POLLERS[pin].start()
+        return POLLERS[pin]
+
 # https://github.com/adafruit/Adafruit-Raspberry-Pi-Python-Code/blob/master/Adafruit_DHT_Driver_Python/dhtreader.c
 
 class DHT22(sensor.Sensor):
@@ -23,7 +48,7 @@ class DHT22(sensor.Sensor):
 
     """
     requiredData = ["measurement", "pinnumber"]
-    optionalData = ["unit", "description"]
+    optionalData = ["unit", "description", "maxAge"]
 
     def __init__(self, data):
         """Initialise.
@@ -46,11 +71,14 @@ class DHT22(sensor.Sensor):
         Return:
 
         """
+        global dhtreader
+        dhtreader = hal.dhtreader()
         dhtreader.init()
-        dhtreader.lastDataTime = 0
-        dhtreader.lastData = (None, None)
         self.readingtype = "sample"
         self.pinnum = int(data["pinnumber"])
+        # How old (seconds) a reading can be and still be used
+        self.maxage = float(data.get("maxAge", 10))
+        self.poller = poller(self.pinnum)
         if "temp" in data["measurement"].lower():
             self.sensorname = "DHT22-temp"
             self.valname = "Temperature-DHT"
@@ -75,54 +103,91 @@ class DHT22(sensor.Sensor):
         """Get the current sensor value.
 
         Get the current sensor value, for either temperature or humidity
-        (whichever is appropriate to this instance of the class). Don't
-        read more often than every two seconds (manufacturer says this
-        is the average sensing time).
+        (whichever is appropriate to this instance of the class), from
+        the latest reading of the sensor's pin. This doesn't wait for the
+        sensor, except (once) for the first reading of the run.
 
         Args:
             self: self.
 
         Returns:
             float The current value for the sensor.
+            None If there isn't a reading from the last 'maxAge' seconds.
 
         """
-        if (time.time() - dhtreader.lastDataTime) > 2: # ok to do another reading
-            # launch & wait for thread
-            thread = DHTReadThread(self)
-            thread.start()
-            thread.join(2)
-            if thread.isAlive():
-                raise Exception('Timeout reading ' + self.sensorname)
-            dhtreader.lastDataTime = time.time()
-
-        temp, humid = dhtreader.lastData
+        latest = self.poller.latest(DHTPoller.FIRSTWAIT)
+        if latest is None or clock.monotonic() - latest[0] > self.maxage:
+            return None
+        readtime, temp, humid = latest
         if self.valname == "Temperature-DHT":
-            temp = temp
             if self.valunit == "Fahrenheit":
-                try:
-                    temp = temp * 1.8 + 32
-                except TypeError:
-                    # This will be thrown if the sensor fails to read,
-                    # and so 'temp' has type 'None'. That usually
-                    # happens at the start of the run, and is dealt with
-                    # either by the fact that it's a dummy run and we're
-                    # ignoring readings anyway, or by sample() in the
-                    # main airpi.py script (~ line 908).
-                    pass
+                temp = temp * 1.8 + 32
             return temp
         elif self.valname == "Relative_Humidity":
             return humid
 
-# http://softwareramblings.com/2008/06/running-functions-as-threads-in-python.html
-# https://docs.python.org/2/library/threading.html
-class DHTReadThread(threading.Thread):
-    def __init__(self, parent):
-        self.parent = parent
-        threading.Thread.__init__(self)
+class DHTPoller(threading.Thread):
+    """ Read a DHT22 in the background, as often as it allows.
+
+    A DHT22 mustn't be read more often than once every two seconds (the
+    manufacturer says this is the average sensing time), so the poller
+    waits INTERVAL seconds after each reading before starting the next.
+    Failed readings are ignored; the previous reading is kept.
+
+    """
+
+    INTERVAL = 2.0
+    # How long (seconds) to wait for the first reading, the first time
+    # one is asked for
+    FIRSTWAIT = 2.5
+
+    def __init__(self, pin):
+        """Initialise.
+
+        Args:
+            self: self.
+            pin: The GPIO pin the DHT22 is connected to.
+
+        """
+        threading.Thread.__init__(self, name="DHT22-pin" + str(pin))
+        self.daemon = True
+        self.pin = pin
+        self.lock = threading.Lock()
+        self.reading = None
+        self.first = threading.Event()
+        self.waited = False
 
     def run(self):
-        try:
-            temp, humid = dhtreader.read(22, self.parent.pinnum)
-        except Exception:
-            temp, humid = dhtreader.lastData
-        dhtreader.lastData = (temp, humid)
+        """Read the sensor, forever."""
+        while True:
+            try:
+                result = dhtreader.read(22, self.pin)
+            except Exception:
+                result = None
+            if result is not None and None not in result:
+                with self.lock:
+                    self.reading = (clock.monotonic(), result[0], result[1])
+                self.first.set()
+            clock.sleep_until(clock.monotonic() + self.INTERVAL)
+
+    def latest(self, timeout=None):
+        """Get the latest reading.
+
+        Args:
+            self: self.
+            timeout: How long (seconds) to wait if there hasn't been a
+                     reading yet. This only applies until the first time
+                     it has been waited for, so that a sensor which never
+                     reads doesn't hold up every sample.
+
+        Returns:
+            tuple The time (see clock.monotonic()) of the reading, the
+                  temperature (Celsius) and the relative humidity (%).
+            None If there hasn't been a reading yet.
+
+        """
+        if timeout is not None and not self.waited:
+            self.first.wait(timeout)
+            self.waited = True
+        with self.lock:
+            return self.reading
@@ -21,31 +21,162 @@ IDX = 10
 mslp = on
 altitude = 20
 
+All of the sensors using the same Domoticz server share one request to
+it per sample (see DomoticzServer), made over a kept-alive connection, so
+reading the temperature and pressure of a device doesn't cost two
+requests. Several servers are fetched from at the same time.
+
 """
 
 import sensor
 import requests
 import math
+import threading
+import samplecache
+
+SERVERS = {}
+SERVERSLOCK = threading.Lock()
+
+def server(url):
+    """Get the shared object for a Domoticz server.
+
+    Args:
+        url: The base URL of the server.
+
+    Returns:
+        DomoticzServer The server.
+
+    """
+    url = url.rstrip("/")
+    with SERVERSLOCK:
+        if url not in SERVERS:
+            SERVERS[url] = DomoticzServer(url)
+        return SERVERS[url]
+
+class DomoticzServer(object):
+    """ Fetch the devices read from one Domoticz server.
+
+    The first sensor to be read in a sample fetches every device in use
+    on the server; the rest are given the results (see samplecache.py).
+
+    """
+
+    MAXAGE = 2.0
+    TIMEOUT = 1.0
+
+    def __init__(self, url):
+        """Initialise.
+
+        Args:
+            self: self.
+            url: The base URL of the server.
+
+        """
+        self.url = url
+        self.session = requests.Session()
+        self.idxs = set()
+        self.lock = threading.Lock()
+        self.fetches = samplecache.SampleCache(self.fetch, self.MAXAGE,
+                                               "Domoticz-" + url)
+
+    def register(self, idx):
+        """Add a device to those fetched.
+
+        Args:
+            self: self.
+            idx: The Domoticz IDX of the device.
+
+        """
+        with self.lock:
+            self.idxs.add(str(idx))
+
+    def fetch(self):
+        """Ask the server for every registered device.
+
+        One device is asked for by its IDX; for more than one, the server
+        is asked for all of its devices in use, which it returns in one
+        response.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict The JSON for each device, by IDX; None for a device which
+                 could not be fetched.
+
+        """
+        with self.lock:
+            idxs = set(self.idxs)
+        results = dict.fromkeys(idxs)
+        if len(idxs) == 1:
+            params = {"type": "devices", "rid": list(idxs)[0]}
+        else:
+            params = {"type": "devices", "filter": "all", "used": "true"}
+        req = self.url + "/json.htm"
+        try:
+            r = self.session.get(req, params=params, timeout=self.TIMEOUT)
+        except requests.exceptions.RequestException:
+            print("Error: Domoticz server not found")
+            return results
+        if r.status_code != 200:
+            print("Error: Domoticz message", r.text)
+            print("Error: Domoticz URL", r.url)
+            return results
+        try:
+            devices = r.json().get("result") or []
+        except ValueError:
+            print("Error: Domoticz response is not JSON", r.url)
+            return results
+        for device in devices:
+            if str(device.get("idx")) in idxs:
+                results[str(device.get("idx"))] = device
+        return results
+
+    def start(self):
+        """Start fetching the devices in the background.
+
+        Args:
+            self: self.
+
+        """
+        self.fetches.start()
+
+    def readcached(self, reader, idx):
+        """Get a device from the fetch for this sample.
+
+        Args:
+            self: self.
+            reader: The sensor reading the device.
+            idx: The Domoticz IDX of the device.
+
+        Returns:
+            dict The JSON for the device, or None if it could not be
+                 fetched.
+
+        """
+        return self.fetches.get(str(idx), reader)
 
 class domoticzs(sensor.Sensor):
+    # A fetch takes up to the one second timeout
+    leadtime = 1.0
     requiredData = ["measurement","URL","IDX"]
     optionalData = ["altitude","mslp","unit","description"]
-    
+
     def __init__(self, data):
         """Initialise the Domoticz sensors class using parameters passed in 'data'.
         Instances of this class can be set to monitor either temperature
         ('temp') or pressure ('pres'). This is determined by the contents of
         'data' passed to this __init__ function. If you want to read both
         properties, you'll need two instances of the class.
-        When set to read temperature, self.valName is 'Temperature-Domo' to
+        When set to read temperature, self.valname is 'Temperature-Domo' to
         differentiate it from other temperature sensors on the AirPi (such as
         the DHT22). By default temperatures are read in Celsius; data["unit"]
         can be set to "F" to return readings in Fahrenheit instead if required.
         Pressures are returned in Hectopascals. If data["altitude"] is provided,
         and data["mslp"] is true, then Mean Sea Level Pressure will be returned
-        by getVal() instead of absolute local pressure.
+        by getval() instead of absolute local pressure.
         URL is IP adress of the domoticz system. IDX is the ID of the BMP085/BMP180
-        sensor or another sensor of your Domoticz. Depending of the king of sensor 
+        sensor or another sensor of your Domoticz. Depending of the king of sensor
         you must set to True or to set to False data["mslp"], in case it take in
         consideration the Mean Sea Level Pressure
 
@@ -56,23 +187,25 @@ class domoticzs(sensor.Sensor):
         Return:
 
         """
-        self.readingType = "sample"
+        self.readingtype = "sample"
         self.URL = data["URL"]
         self.IDX = data["IDX"]
         if "temp" in data["measurement"].lower():
-            self.sensorName = "Domo-temp"
-            self.valName = "Temperature-Domo"
-            self.valUnit = "Celsius"
-            self.valSymbol = "C"
+            self.sensorname = "Domo-temp"
+            self.valname = "Temperature-Domo"
+            self.valunit = "Celsius"
+            self.valsymbol = "C"
+            self.field = "Temp"
             if "unit" in data:
                 if data["unit"] == "F":
-                    self.valUnit = "Fahrenheit"
-                    self.valSymbol = "F"
+                    self.valunit = "Fahrenheit"
+                    self.valsymbol = "F"
         elif "pres" in data["measurement"].lower():
-            self.sensorName = "Domo-pres"
-            self.valName = "Pressure-Domo"
-            self.valUnit = "Hectopascal"
-            self.valSymbol = "hPa"
+            self.sensorname = "Domo-pres"
+            self.valname = "Pressure-Domo"
+            self.valunit = "Hectopascal"
+            self.valsymbol = "hPa"
+            self.field = "Barometer"
             self.altitude = 0
             self.mslp = False
             if "mslp" in data:
@@ -84,58 +217,49 @@ class domoticzs(sensor.Sensor):
                         msg = "To calculate MSLP, please provide an 'altitude' (in m)"
                         print(msg)
                         self.mslp = False
+        else:
+            raise ValueError("Domoticz measurement must be 'temp' or 'pres'")
         if "description" in data:
             self.description = data["description"]
         else:
             self.description = "Domoticz combined temperature and pressure sensor."
+        self.server = server(self.URL)
+        self.server.register(self.IDX)
         return
 
-    def getVal(self):
+    def start(self):
+        """Start fetching from the server (see sensor.Sensor).
+
+        Args:
+            self: self.
+
+        """
+        self.server.start()
+
+    def getval(self):
         """Get the current sensor value.
 
         Get the current sensor value, for either temperature or pressure
-        (whichever is appropriate to this instance of the class).
+        (whichever is appropriate to this instance of the class), from the
+        server's devices fetched for this sample.
 
         Args:
             self: self.
 
         Returns:
             float The current value for the sensor.
+            None If the device could not be read.
 
         """
-        req = self.URL + '/json.htm?type=devices&rid='+ self.IDX
-        try:
-            r = requests.get(req, timeout=1)     # timeout 1 sec.
-        except requests.exceptions.RequestException:
-            print ("Error: Domoticz server not found")
-            return False
-        if r.status_code != 200:
-            print ("Error: Domoticz message",r.text)
-            print ("Error: Domoticz URL", req)
-            return False
-        else:
-            domojson = r.json()
-            result = domojson.get('result')
-            if self.valName == "Temperature-Domo":
-                for i,v in enumerate(result):
-                    temp = domojson['result'][i]['Temp']
-                if self.valUnit == "Fahrenheit":
-                    try:
-                        temp = temp * 1.8 + 32
-                    except TypeError as terr:
-                        # This will be thrown if the sensor fails to read,
-                        # and so 'temp' has type 'None'. That usually
-                        # happens at the start of the run, and is dealt with
-                        # either by the fact that it's a dummy run and we're
-                        # ignoring readings anyway, or by sample() in the
-                        # main airpi.py script (~ line 908).
-                        pass
-                return temp
-            elif self.valName == "Pressure-Domo":
-                for i,v in enumerate(result):
-                    pres = domojson['result'][i]['Barometer']
-                if self.mslp:
-                    T0 = float(self.altitude) / 44330
-                    T1 = math.pow(1 - T0, 5.255)
-                    pres = pres / T1
-                return pres
+        device = self.server.readcached(self, self.IDX)
+        if device is None or device.get(self.field) is None:
+            return None
+        val = float(device[self.field])
+        if self.field == "Temp":
+            if self.valunit == "Fahrenheit":
+                val = val * 1.8 + 32
+        elif self.mslp:
+            T0 = float(self.altitude) / 44330
+            T1 = math.pow(1 - T0, 5.255)
+            val = val / T1
+        return val
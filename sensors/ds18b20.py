@@ -19,16 +19,19 @@ id = 28-00047620aabb    #see the sensors id in /sys/bus/w1/devices
 name = Temperature-DS   #if several DS18B20 sensors, the name must be unique
 measurement = temp
 
+All of the probes are converted at the same time (see dsBackend.py), so
+adding more probes doesn't make reading them take any longer.
+
 """
 
 import sensor
 import dsBackend
-import os
 
 class DS18B20(sensor.Sensor):
-    dsClass = None
+    # A conversion takes up to 750 ms
+    leadtime = 0.8
     requiredData = ["measurement","id"]
-    optionalData = ["name","unit","description"]
+    optionalData = ["name","sensorname","unit","description"]
     
     def __init__(self, data):
         """Initialise DS18B20 sensor class.
@@ -36,7 +39,7 @@ class DS18B20(sensor.Sensor):
         Initialise the DS18B20 sensor class using parameters passed in 'data'.
         Instances of this class can be set to monitor either temperature
         ('temp')
-        When set to read temperature, self.valName is 'Temperature-DS' to
+        When set to read temperature, self.valname is 'Temperature-DS' to
         differentiate it from other temperature sensors on the AirPi (such as
         the DHT22). By default temperatures are read in Celsius; data["unit"]
         can be set to "F" to return readings in Fahrenheit instead if required.
@@ -52,50 +55,52 @@ class DS18B20(sensor.Sensor):
         Return:
 
         """
-        self.readingType = "sample"
-        self.sensorName = "DS18B20-temp"
+        self.readingtype = "sample"
+        self.id = data["id"]
+        self.sensorname = data.get("sensorname", "DS18B20-" + self.id)
         if "name" in data:
-            self.valName = data["name"]
+            self.valname = data["name"]
         else:
-            self.valName = "Temperature-DS"
-        self.valUnit = "Celsius"
-        self.valSymbol = "C"
+            self.valname = "Temperature-DS"
+        self.valunit = "Celsius"
+        self.valsymbol = "C"
         if "unit" in data:
             if data["unit"] == "F":
-                self.valUnit = "Fahrenheit"
-                self.valSymbol = "F"
+                self.valunit = "Fahrenheit"
+                self.valsymbol = "F"
         if "description" in data:
             self.description = data["description"]
         else:
             self.description = "A 1-Wire temperature sensor."
-        if (DS18B20.dsClass == None):
-            DS18B20.dsClass = dsBackend.DS18B20(id = data["id"])
+        dsBackend.BUS.probe(self.id)
         return
 
-    def getVal(self):
+    def start(self):
+        """Start converting all of the probes (see sensor.Sensor).
+
+        Args:
+            self: self.
+
+        """
+        dsBackend.BUS.start()
+
+    def getval(self):
         """Get the current sensor value.
 
-        Get the current sensor value, for either temperature or pressure
-        (whichever is appropriate to this instance of the class).
+        Get the current temperature of this probe, from the conversion
+        of all of the probes for this sample.
 
         Args:
             self: self.
 
         Returns:
             float The current value for the sensor.
+            None If the probe could not be read.
 
         """
-       
-        temp = DS18B20.dsClass.readTemperature()
-        if self.valUnit == "Fahrenheit":
-            try:
-                temp = temp * 1.8 + 32
-            except TypeError as terr:
-                # This will be thrown if the sensor fails to read,
-                # and so 'temp' has type 'None'. That usually
-                # happens at the start of the run, and is dealt with
-                # either by the fact that it's a dummy run and we're
-                # ignoring readings anyway, or by sample() in the
-                # main airpi.py script (~ line 908).
-                pass
+        temp = dsBackend.BUS.readcached(self.id)
+        if temp is False:
+            return None
+        if self.valunit == "Fahrenheit":
+            temp = temp * 1.8 + 32
         return temp
@@ -4,6 +4,10 @@
 
 A low-level Class to read data directly from the DS18B20 sensor,
 which provides temperature.
+Each read of a DS18B20 takes a 750 ms temperature conversion, so rather
+than reading several probes one after another, all of them are converted
+at the same time (see OneWireBus): with a single 'bulk' conversion if the
+kernel supports it, or otherwise by reading every probe at once.
 
 You must add these lines in /etc/modules
 w1-gpio
@@ -14,19 +18,21 @@ dtoverlay=w1-gpio
 
 """
 
-import os, glob, time
+import threading
+import time
+import hal
+import clock
+import samplecache
 
 class DS18B20(object):
     def __init__(self, id='28-00047620aabb', debug=False):
+        self.id = id
         self.debug = debug
-        self.device_file = glob.glob('/sys/bus/w1/devices/' + str(id))[0] + '/w1_slave'
-    
+        self.device = hal.onewire(id)
+
     def readrawtemp(self):
-        f = open(self.device_file, 'r')
-        line = f.readlines()
-        f.close()
-        return line
-        
+        return self.device.readlines()
+
     def crccheck(self, lines):
         return lines[0].strip()[-3:] == "YES"
 
@@ -48,9 +54,114 @@ class DS18B20(object):
                 print("Error: Data temperature sensor DS18B20 error")
                 return False
         else:
-	    print("Error: Temperature sensor DS18B20 not found")
+            print("Error: Temperature sensor DS18B20 not found")
             return False
 
+class OneWireBus(object):
+    """ Convert all of the DS18B20 probes at once.
+
+    The first probe to be read in a sample converts every probe; the rest
+    are given the results (see samplecache.py).
+
+    """
+
+    # Maximum time (seconds) for a 12-bit conversion
+    CONVERSIONTIME = 0.75
+    MAXAGE = 2.0
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.probes = {}
+        self.lock = threading.Lock()
+        self.conversions = samplecache.SampleCache(self.convert, self.MAXAGE,
+                                                   "DS18B20-convert")
+
+    def probe(self, deviceid):
+        """Get the backend for a probe, setting it up if need be.
+
+        Args:
+            self: self.
+            deviceid: The 1-Wire ID of the probe.
+
+        Returns:
+            DS18B20 The probe's backend.
+
+        """
+        with self.lock:
+            if deviceid not in self.probes:
+                self.probes[deviceid] = DS18B20(id=deviceid)
+            return self.probes[deviceid]
+
+    def convert(self):
+        """Convert and read every probe.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict The temperature (Celsius) of each probe, by ID; False for
+                 a probe which could not be read.
+
+        """
+        with self.lock:
+            probes = list(self.probes.values())
+        # Every probe gets a result, so that one which can't be read isn't
+        # converted again for each of its readers
+        results = dict.fromkeys([probe.id for probe in probes], False)
+        def read(probe):
+            try:
+                results[probe.id] = probe.readTemperature()
+            except IOError:
+                print("Error: Temperature sensor DS18B20 " + probe.id +
+                      " could not be read")
+        if hal.onewire_bulk_trigger():
+            deadline = clock.monotonic() + self.CONVERSIONTIME
+            time.sleep(0.05)
+            while hal.onewire_bulk_pending() and clock.monotonic() < deadline:
+                time.sleep(0.05)
+            for probe in probes:
+                read(probe)
+        else:
+            # Each read does its own conversion, so do them all at once
+            threads = [threading.Thread(target=read, args=(probe,),
+                                        name="DS18B20-" + probe.id)
+                       for probe in probes]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return results
+
+    def start(self):
+        """Start converting the probes in the background.
+
+        Args:
+            self: self.
+
+        """
+        self.conversions.start()
+
+    def readcached(self, deviceid):
+        """Get a probe's temperature from the conversion for this sample.
+
+        Args:
+            self: self.
+            deviceid: The 1-Wire ID of the probe.
+
+        Returns:
+            float The temperature (Celsius), or False if it could not be
+                  read.
+
+        """
+        return self.conversions.get(deviceid, default=False)
+
+BUS = OneWireBus()
+
 if __name__ == "__main__":
     obj = DS18B20()
     print("Temp: %s C" % obj.readTemperature())
@@ -0,0 +1,287 @@
+""" Hardware abstraction layer.
+
+Sensor plugins (and airpi.py) reach the Raspberry Pi hardware - GPIO
+pins, SPI, I2C, 1-Wire, the DHT reader and gpsd - through this module, rather
+than importing the hardware libraries themselves. use() chooses the
+backend:
++ real - the actual hardware libraries (RPi.GPIO, spidev, smbus,
+         dhtreader, gps). This is the default.
++ sim  - simulated devices (see simhw.py), so that the AirPi can be run,
+         tested and profiled on an ordinary Linux box.
+If use() has not been called, the backend is taken from the AIRPI_HAL
+environment variable. It must be chosen before any sensor plugins are
+set up.
+
+"""
+import fcntl
+import glob
+import os
+
+BACKENDS = ["real", "sim"]
+BACKEND = None
+
+I2C_SLAVE = 0x0703
+W1DEVICES = "/sys/bus/w1/devices/"
+
+def use(backend):
+    """Choose the backend.
+
+    Args:
+        backend: 'real' or 'sim'.
+
+    Raises:
+        ValueError: The backend is not recognised.
+
+    """
+    global BACKEND
+    backend = backend.lower()
+    if backend not in BACKENDS:
+        raise ValueError("Unknown hardware backend '" + backend + "'")
+    BACKEND = backend
+
+def backend():
+    """Get the name of the backend in use.
+
+    Returns:
+        string 'real' or 'sim'.
+
+    """
+    if BACKEND is None:
+        use(os.environ.get("AIRPI_HAL", "real"))
+    return BACKEND
+
+def simulated():
+    """Check whether the simulated backend is in use.
+
+    Returns:
+        boolean True if the hardware is simulated.
+
+    """
+    return backend() == "sim"
+
+def gpio():
+    """Get the GPIO library.
+
+    Returns:
+        The RPi.GPIO module, or an object with the same interface.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.gpio()
+    import RPi.GPIO
+    return RPi.GPIO
+
+def spidev(bus, device):
+    """Open a kernel SPI device (/dev/spidev<bus>.<device>).
+
+    Args:
+        bus: The SPI bus number.
+        device: The chip select (device) number on the bus.
+
+    Returns:
+        An open spidev.SpiDev object, or an object with the same
+        interface.
+
+    Raises:
+        ImportError: The spidev library is not installed.
+        IOError: The device can't be opened (e.g. SPI is not enabled).
+
+    """
+    if simulated():
+        import simhw
+        spi = simhw.SpiDev()
+    else:
+        import spidev as spidevlib
+        spi = spidevlib.SpiDev()
+    spi.open(bus, device)
+    return spi
+
+def smbus(bus):
+    """Open an I2C bus using the SMBus interface.
+
+    Args:
+        bus: The I2C bus number.
+
+    Returns:
+        An smbus.SMBus object, or an object with the same interface.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.SMBus(bus)
+    import smbus as smbuslib
+    return smbuslib.SMBus(bus)
+
+def i2c_open(bus, address):
+    """Open an I2C device for raw reads and writes.
+
+    Args:
+        bus: The I2C bus number.
+        address: The address of the device on the bus.
+
+    Returns:
+        An object with write(bytes), read(count) and close() methods.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.I2CDevice(bus, address)
+    return I2CDevice(bus, address)
+
+def dhtreader():
+    """Get the DHT reader.
+
+    Returns:
+        The dhtreader module, or an object with the same interface.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.dhtreader()
+    import dhtreader as dhtreaderlib
+    return dhtreaderlib
+
+def onewire(deviceid):
+    """Open a 1-Wire temperature sensor.
+
+    Args:
+        deviceid: The 1-Wire ID of the device (e.g. '28-00047620aabb').
+
+    Returns:
+        An object whose readlines() method returns the contents of the
+        device's w1_slave file.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.OneWireDevice(deviceid)
+    return OneWireDevice(deviceid)
+
+def onewire_devices():
+    """List the 1-Wire temperature sensors which are connected.
+
+    Returns:
+        list The 1-Wire IDs of the devices.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.onewire_devices()
+    return sorted(os.path.basename(path)
+                  for path in glob.glob(W1DEVICES + "28-*"))
+
+def onewire_bulk_trigger():
+    """Start a temperature conversion on every 1-Wire sensor at once.
+
+    Uses the w1-therm driver's therm_bulk_read file (only in recent
+    kernels). Afterwards, reading a sensor's w1_slave file gives the
+    result of the bulk conversion, rather than starting another one.
+
+    Returns:
+        boolean True if the conversion was started; False if bulk
+                conversions are not supported.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.onewire_bulk_trigger()
+    paths = glob.glob(W1DEVICES + "w1_bus_master*/therm_bulk_read")
+    if not paths:
+        return False
+    try:
+        for path in paths:
+            with open(path, "w") as bulkfile:
+                bulkfile.write("trigger\n")
+    except IOError:
+        return False
+    return True
+
+def onewire_bulk_pending():
+    """Check whether a bulk conversion is still in progress.
+
+    Returns:
+        boolean True if it is.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.onewire_bulk_pending()
+    for path in glob.glob(W1DEVICES + "w1_bus_master*/therm_bulk_read"):
+        try:
+            with open(path, "r") as bulkfile:
+                if bulkfile.read().strip() == "-1":
+                    return True
+        except IOError:
+            pass
+    return False
+
+def gps():
+    """Create a GPS controller.
+
+    Returns:
+        A GpsController (a thread which keeps the latest GPS fix), or an
+        object with the same interface. It has not been started.
+
+    """
+    if simulated():
+        import simhw
+        return simhw.GpsController()
+    import GpsController
+    return GpsController.GpsController()
+
+class I2CDevice(object):
+    """ Raw access to an I2C device via /dev/i2c-N. """
+
+    def __init__(self, bus, address):
+        """Initialise.
+
+        Args:
+            self: self.
+            bus: The I2C bus number.
+            address: The address of the device on the bus.
+
+        """
+        # One file descriptor, for both reads and writes
+        self.fd = os.open("/dev/i2c-" + str(bus), os.O_RDWR)
+        fcntl.ioctl(self.fd, I2C_SLAVE, address)
+
+    def write(self, data):
+        """Write bytes to the device."""
+        return os.write(self.fd, data)
+
+    def read(self, count):
+        """Read bytes from the device."""
+        return os.read(self.fd, count)
+
+    def close(self):
+        """Close the device."""
+        os.close(self.fd)
+
+class OneWireDevice(object):
+    """ A 1-Wire sensor, read via the w1-therm kernel driver. """
+
+    def __init__(self, deviceid):
+        """Initialise.
+
+        Args:
+            self: self.
+            deviceid: The 1-Wire ID of the device.
+
+        Raises:
+            IndexError: The device is not connected.
+
+        """
+        self.path = glob.glob(W1DEVICES + str(deviceid))[0] + "/w1_slave"
+
+    def readlines(self):
+        """Read the device's w1_slave file.
+
+        This starts a temperature conversion, so takes up to 750 ms.
+
+        Returns:
+            list The lines of the file.
+
+        """
+        with open(self.path, "r") as w1file:
+            return w1file.readlines()
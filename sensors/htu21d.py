@@ -13,10 +13,13 @@ enabled = yes
 measurement = temp
 
 [HTU21D-hum]
-filename = htu21dÒ
+filename = htu21d
 enabled = yes
 measurement = humidity
 
+The temperature and humidity instances share one measurement of both per
+sample (see htuBackend.readcached()).
+
 """
 
 import sensor
@@ -25,8 +28,10 @@ import os
 
 class HTU21D(sensor.Sensor):
     htuClass = None
+    # A temperature and a humidity measurement take 66 ms
+    leadtime = 0.1
     requiredData = ["measurement"]
-    optionalData = ["unit", "description"]
+    optionalData = ["unit", "description", "i2cbus"]
     
     def __init__(self, data):
         """Initialise HTU21D sensor class.
@@ -36,12 +41,13 @@ class HTU21D(sensor.Sensor):
         ('temp') or humidity ('hum'). This is determined by the contents of
         'data' passed to this __init__ function. If you want to read both
         properties, you'll need two instances of the class.
-        When set to read temperature, self.valName is 'Temperature-HTU' to
+        When set to read temperature, self.valname is 'Temperature-HTU' to
         differentiate it from other temperature sensors on the AirPi (such as
         the DHT22). By default temperatures are read in Celsius; data["unit"]
         can be set to "F" to return readings in Fahrenheit instead if required.
         Humidity is returned as percentage relative humidity.
-        The I2C bus number depending of the version of the PCB is auto detected.
+        The I2C bus number depending of the version of the PCB is auto detected,
+        unless data["i2cbus"] is given.
         The access to I2C doesn't need smbus library and so no need of the Adafruit
         library.
 
@@ -52,37 +58,48 @@ class HTU21D(sensor.Sensor):
         Return:
 
         """
-        self.readingType = "sample"
+        self.readingtype = "sample"
         if "temp" in data["measurement"].lower():
-            self.sensorName = "HTU21D-temp"
-            self.valName = "Temperature-HTU"
-            self.valUnit = "Celsius"
-            self.valSymbol = "C"
+            self.sensorname = "HTU21D-temp"
+            self.valname = "Temperature-HTU"
+            self.valunit = "Celsius"
+            self.valsymbol = "C"
             if "unit" in data:
                 if data["unit"] == "F":
-                    self.valUnit = "Fahrenheit"
-                    self.valSymbol = "F"
+                    self.valunit = "Fahrenheit"
+                    self.valsymbol = "F"
         elif "h" in data["measurement"].lower():
-            self.sensorName = "HTU21D-hum"
-            self.valName = "Humidity-HTU"
-            self.valUnit = "% Relative Humidity"
-            self.valSymbol = "%"
+            self.sensorname = "HTU21D-hum"
+            self.valname = "Humidity-HTU"
+            self.valunit = "% Relative Humidity"
+            self.valsymbol = "%"
         if "description" in data:
             self.description = data["description"]
         else:
             self.description = "A I2C combined temperature and humidity sensor."
         if (HTU21D.htuClass == None):
-            #HTU21D.htuClass = htuBackend.HTU21D(bus = int(data["i2cbus"]))
-            i2cbus = 0
-           if os.path.exists("/dev/i2c-1"): #test which i2c bus ID is present
-              i2cbus = 1
+            if "i2cbus" in data:
+                i2cbus = int(data["i2cbus"])
+            elif os.path.exists("/dev/i2c-1"): #test which i2c bus ID is present
+                i2cbus = 1
+            else:
+                i2cbus = 0
             HTU21D.htuClass = htuBackend.HTU21D(bus = i2cbus)
         return
 
-    def getVal(self):
+    def start(self):
+        """Start the measurement for the next sample (see sensor.Sensor).
+
+        Args:
+            self: self.
+
+        """
+        HTU21D.htuClass.start()
+
+    def getval(self):
         """Get the current sensor value.
 
-        Get the current sensor value, for either temperature or pressure
+        Get the current sensor value, for either temperature or humidity
         (whichever is appropriate to this instance of the class).
 
         Args:
@@ -90,21 +107,18 @@ class HTU21D(sensor.Sensor):
 
         Returns:
             float The current value for the sensor.
+            None If the sensor could not be read.
 
         """
-        if self.valName == "Temperature-HTU":
-            temp = HTU21D.htuClass.readTemperature()
-            if self.valUnit == "Fahrenheit":
-                try:
-                    temp = temp * 1.8 + 32
-                except TypeError as terr:
-                    # This will be thrown if the sensor fails to read,
-                    # and so 'temp' has type 'None'. That usually
-                    # happens at the start of the run, and is dealt with
-                    # either by the fact that it's a dummy run and we're
-                    # ignoring readings anyway, or by sample() in the
-                    # main airpi.py script (~ line 908).
-                    pass
+        if self.valname == "Temperature-HTU":
+            temp = HTU21D.htuClass.readcached("temperature")
+            if temp is False:
+                return None
+            if self.valunit == "Fahrenheit":
+                temp = temp * 1.8 + 32
             return temp
-        elif self.valName == "Humidity-HTU":
-            return HTU21D.htuClass.readHumidity()
+        elif self.valname == "Humidity-HTU":
+            humid = HTU21D.htuClass.readcached("humidity")
+            if humid is False:
+                return None
+            return humid
@@ -3,11 +3,14 @@
 """ Read low-level data from HTU21D sensor.
 
 A low-level Class to read data directly from the HTU21D sensor,
-which provides temperature and humidity readings.
+which provides temperature and humidity readings. Its conversions are
+done alongside those of the other devices on the I2C bus (see
+i2cbus.py).
 
 """
 
-import struct, array, time, io, fcntl
+import struct, array, time
+import i2cbus
 
 CMD_READ_TEMP_HOLD = b"\xE3"
 CMD_READ_HUM_HOLD = b"\xE5"
@@ -16,31 +19,31 @@ CMD_READ_HUM_NOHOLD = b"\xF5"
 CMD_WRITE_USER_REG = b"\xE6"
 CMD_READ_USER_REG = b"\xE7"
 CMD_SOFT_RESET= b"\xFE"
-I2C_SLAVE=0x0703
 
-class i2c(object):
-    def __init__(self, device, bus):
-        self.fr = io.open("/dev/i2c-"+str(bus), "rb", buffering=0)
-        self.fw = io.open("/dev/i2c-"+str(bus), "wb", buffering=0)
-        fcntl.ioctl(self.fr, I2C_SLAVE, device)
-        fcntl.ioctl(self.fw, I2C_SLAVE, device)
+def make_crc_table(polynomial=0x31):
+    "Works out the CRC-8 of every byte, for crccheck()"
+    table = []
+    for byte in range(256):
+        crc = byte
+        for i in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ polynomial) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table.append(crc)
+    return table
 
-    def write(self, bytes):
-        return self.fw.write(bytes)
-
-    def read(self, bytes):
-        return self.fr.read(bytes)
-
-    def close(self):
-        self.fw.close()
-        self.fr.close()
+# CRC-8 with polynomial x^8 + x^5 + x^4 + 1, as in the datasheet
+CRCTABLE = make_crc_table()
 
 class HTU21D:
     def __init__(self, HTU21D_ADDR=0x40, bus=1, debug=False): #HTU21D 0x40, bus 1
         self.debug = debug
-        self.dev = i2c(HTU21D_ADDR, bus)
+        self.bus = i2cbus.get(bus)
+        self.dev = self.bus.device(HTU21D_ADDR)
         self.dev.write(CMD_SOFT_RESET)
         time.sleep(.015)
+        self.key = self.bus.register(self.measure)
 
     def ctemp(self, sensorTemp):
         tSensorTemp = sensorTemp / 65536.0
@@ -51,16 +54,10 @@ class HTU21D:
         return -6.0 + (125.0 * tSensorHumi)
 
     def crccheck(self, value):
-        remainder = (((value[0] << 8) + value[1]) << 8) | value[2]
-        divisor = 0x988000
-        for i in range(0, 16):
-            if (remainder & 1 << (23 - i)):
-                remainder ^= divisor
-            divisor = divisor >> 1
-        if remainder == 0:
-            return True
-        else:
-            return False
+        "Checks the CRC (third byte) of a measurement"
+        crc = CRCTABLE[value[0]]
+        crc = CRCTABLE[crc ^ value[1]]
+        return crc == value[2]
     
     def readTemperature(self):
         self.dev.write(CMD_READ_TEMP_NOHOLD)
@@ -84,6 +81,68 @@ class HTU21D:
         else:
             return False
             
+    def result(self, convert):
+        "Reads and checks a finished measurement; False if it is corrupt"
+        buf = array.array('B', self.dev.read(3))
+        if self.crccheck(buf):
+            return convert((buf[0] << 8 | buf [1]) & 0xFFFC)
+        return False
+
+    def measure(self, store):
+        """Measures the temperature and then the humidity.
+
+        This is a conversion for i2cbus.pipeline(): it yields how long to
+        wait for each measurement to finish.
+
+        Args:
+            self: self.
+            store: Function to call with a dict of the temperature
+                   (celcius) and humidity (% relative humidity); either is
+                   False if it could not be read.
+
+        """
+        try:
+            self.dev.write(CMD_READ_TEMP_NOHOLD)
+            yield .05
+            temp = self.result(self.ctemp)
+            self.dev.write(CMD_READ_HUM_NOHOLD)
+            yield .016
+            humidity = self.result(self.chumid)
+        except (IOError, OSError) as excep:
+            print("Error: HTU21D could not be read (" + str(excep) + ")")
+            temp, humidity = False, False
+        store({"temperature": temp, "humidity": humidity})
+
+    def readcached(self, quantity):
+        """Gets the temperature or humidity from the measurement for this sample.
+
+        The measurement is shared with the other quantity, and done along
+        with the other devices on the I2C bus (see
+        i2cbus.I2CBus.results()).
+
+        Args:
+            self: self.
+            quantity: 'temperature' (in celcius) or 'humidity' (in % relative
+                      humidity).
+
+        Returns:
+            The value, or False if the sensor could not be read.
+
+        """
+        results = self.bus.results(self.key, (self.key, quantity))
+        if results is None:
+            return False
+        return results[quantity]
+
+    def start(self):
+        """Starts the measurement for the next sample in the background.
+
+        Args:
+            self: self.
+
+        """
+        self.bus.start()
+
 if __name__ == "__main__":
     obj = HTU21D()
     print("Temp: %s C" % round(obj.readTemperature(),2))
@@ -0,0 +1,246 @@
+""" Shared access to the I2C buses.
+
+Every I2C device on a bus is reached through one I2CBus object for that
+bus, which owns the open files and makes sure that only one transaction
+is on the bus at a time, whichever thread the sensors are read from.
+It also lets the devices' conversions overlap: most I2C sensors are told
+to start a conversion, and then have to be left alone for several
+milliseconds before the result can be read. Rather than each device
+waiting for its own conversions in turn, a device backend registers a
+'conversion' - a generator which does the I2C transactions and yields the
+number of seconds to wait before it can carry on - and convert() runs all
+of the conversions registered on the bus at the same time, so the whole
+bus takes about as long as the slowest device.
+
+"""
+import heapq
+import threading
+
+import clock
+import hal
+import samplecache
+
+BUSES = {}
+BUSESLOCK = threading.Lock()
+
+def get(number):
+    """Get the shared object for an I2C bus.
+
+    Args:
+        number: The I2C bus number.
+
+    Returns:
+        I2CBus The bus.
+
+    """
+    with BUSESLOCK:
+        if number not in BUSES:
+            BUSES[number] = I2CBus(number)
+        return BUSES[number]
+
+def pipeline(conversions):
+    """Run several conversions at the same time.
+
+    Each conversion is a generator which does some I2C transactions and
+    then yields how long (in seconds) to wait before it is resumed, until
+    it finishes. Whenever one is waiting, the others are given the chance
+    to run. If a conversion fails (raises an exception), it is dropped
+    and the others carry on; its device is expected to deal with storing
+    a failed result itself.
+
+    Args:
+        conversions: The conversions (generators) to run.
+
+    """
+    queue = []
+    for order, conversion in enumerate(conversions):
+        heapq.heappush(queue, (clock.monotonic(), order, conversion))
+    while queue:
+        due, order, conversion = heapq.heappop(queue)
+        clock.sleep_until(due)
+        try:
+            wait = next(conversion)
+        except StopIteration:
+            continue
+        except Exception as excep:
+            print("Error: I2C conversion failed (" + str(excep) + ")")
+            continue
+        heapq.heappush(queue, (clock.monotonic() + wait, order, conversion))
+
+class I2CBus(object):
+    """ One I2C bus, shared by all of the devices on it.
+
+    The SMBus-style methods (read_byte_data() etc.) are the same as those
+    of smbus.SMBus, so an I2CBus can be used wherever one of those is.
+    The results of the conversions are kept for the sample (see
+    samplecache.py), so every device on the bus is converted once per
+    sample, whichever is read first.
+
+    """
+
+    # How old (seconds) the conversions can be before they are run again
+    MAXAGE = 1.0
+
+    def __init__(self, number):
+        """Initialise.
+
+        Args:
+            self: self.
+            number: The I2C bus number.
+
+        """
+        self.number = number
+        self.lock = threading.RLock()
+        self.smbus = None
+        self.devices = {}
+        self.conversions = []
+        self.cache = samplecache.SampleCache(self.convert, self.MAXAGE,
+                                             "i2c-" + str(number))
+
+    def get_smbus(self):
+        """Open the bus using the SMBus interface, if not already open."""
+        with self.lock:
+            if self.smbus is None:
+                self.smbus = hal.smbus(self.number)
+            return self.smbus
+
+    def write_byte_data(self, address, register, value):
+        """Write a byte to a register of a device."""
+        with self.lock:
+            return self.get_smbus().write_byte_data(address, register, value)
+
+    def read_byte_data(self, address, register):
+        """Read a byte from a register of a device."""
+        with self.lock:
+            return self.get_smbus().read_byte_data(address, register)
+
+    def read_word_data(self, address, register):
+        """Read a 16-bit word from a register of a device."""
+        with self.lock:
+            return self.get_smbus().read_word_data(address, register)
+
+    def write_i2c_block_data(self, address, register, values):
+        """Write a block of bytes, starting at a register of a device."""
+        with self.lock:
+            return self.get_smbus().write_i2c_block_data(address, register,
+                                                         values)
+
+    def read_i2c_block_data(self, address, register, length=32):
+        """Read a block of bytes, starting at a register of a device."""
+        with self.lock:
+            return self.get_smbus().read_i2c_block_data(address, register,
+                                                        length)
+
+    def device(self, address):
+        """Get raw (plain read and write) access to a device on the bus.
+
+        Args:
+            self: self.
+            address: The address of the device.
+
+        Returns:
+            I2CDevice The device. Devices are opened once, and shared.
+
+        """
+        with self.lock:
+            if address not in self.devices:
+                self.devices[address] = I2CDevice(self, address)
+            return self.devices[address]
+
+    def register(self, conversion):
+        """Add a device's conversion to those run by convert().
+
+        Args:
+            self: self.
+            conversion: A function which returns a new conversion (see
+                        pipeline()) each time it is called. It is passed a
+                        function to call with the device's results.
+
+        Returns:
+            int The key of the device's results (see results()).
+
+        """
+        with self.lock:
+            self.conversions.append(conversion)
+            return len(self.conversions) - 1
+
+    def convert(self):
+        """Run every registered conversion on the bus, at the same time.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict The results of each device, by key (see register());
+                 None for a device whose conversion failed without storing
+                 any.
+
+        """
+        with self.lock:
+            conversions = list(self.conversions)
+        results = dict.fromkeys(range(len(conversions)))
+        def storer(key):
+            def store(result):
+                results[key] = result
+            return store
+        pipeline([conversion(storer(key))
+                  for key, conversion in enumerate(conversions)])
+        return results
+
+    def start(self):
+        """Start running the conversions in the background.
+
+        Does nothing if they are already running, or their results haven't
+        been read yet (see samplecache.SampleCache.start()).
+
+        Args:
+            self: self.
+
+        """
+        self.cache.start()
+
+    def results(self, key, reader):
+        """Get a device's results from the conversions for this sample.
+
+        Args:
+            self: self.
+            key: The key of the device's results (see register()).
+            reader: Who is reading them, e.g. (key, quantity).
+
+        Returns:
+            The results, or None if the conversion failed.
+
+        """
+        return self.cache.get(key, reader)
+
+class I2CDevice(object):
+    """ Raw access to a device on a shared I2C bus. """
+
+    def __init__(self, bus, address):
+        """Initialise.
+
+        Args:
+            self: self.
+            bus: The I2CBus the device is on.
+            address: The address of the device.
+
+        """
+        self.bus = bus
+        self.address = address
+        self.dev = hal.i2c_open(bus.number, address)
+
+    def write(self, data):
+        """Write bytes to the device."""
+        with self.bus.lock:
+            return self.dev.write(data)
+
+    def read(self, count):
+        """Read bytes from the device."""
+        with self.bus.lock:
+            return self.dev.read(count)
+
+    def close(self):
+        """Close the device."""
+        with self.bus.lock:
+            self.dev.close()
+            del self.bus.devices[self.address]
@@ -1,11 +1,42 @@
 """ Read data from MCP3008 inputs.
 
 A low-level Class to read data from inputs to the MCP3008
-analogue-to-digital converter (ADC) chip. This communicates using SPI.
+analogue-to-digital converter (ADC) chip. This communicates using SPI,
+either by 'bit-banging' it over GPIO pins, or through the kernel SPI
+driver (/dev/spidev*), which is much faster.
+The Analogue sensors don't read their channels one at a time; instead,
+the first one to be read in a sample scans every channel in use in one
+pass, and the rest are given the results of that scan. This keeps the
+readings in each sample to within a short window of each other.
+Channels can also be sampled continuously, at a few hundred to a few
+thousand times per second, in a background thread; the readings are kept
+in a ring buffer so that statistics (e.g. the mean or peak) over a recent
+window can be reported instead of a single instantaneous value. This
+needs numpy.
 
 """
-import RPi.GPIO as GPIO
+import threading
 import sensor
+import hal
+import clock
+import samplecache
+
+# numpy is slow to import (several seconds on a Pi Zero), so it is only
+# imported when continuous sampling is used; see load_numpy().
+numpy = None
+
+def load_numpy():
+    """Import numpy, if it hasn't been imported already.
+
+    Returns:
+        module numpy.
+
+    """
+    global numpy
+    if numpy is None:
+        import numpy as numpymodule
+        numpy = numpymodule
+    return numpy
 
 class MCP3008(sensor.Sensor):
     """ Read data from MCP3008 inputs.
@@ -15,11 +46,75 @@ class MCP3008(sensor.Sensor):
 
     """
     requiredData = []
-    optionalData = ["mosiPin", "misoPin", "csPin", "clkPin"]
+    optionalData = ["mosiPin", "misoPin", "csPin", "clkPin", "backend",
+                    "spiBus", "spiDevice", "spiSpeed", "scanMaxAge",
+                    "continuousRate", "vref"]
 
     sharedClass = None
 
     def __init__(self, data):
+        """Initialise.
+
+        Use the kernel SPI device if 'backend' is 'spidev'. If it can't
+        be opened (e.g. SPI is not enabled, or the spidev library is not
+        installed), fall back to bit-banging over the GPIO pins.
+
+        Args:
+            self: self.
+            data: Parameters from sensors.cfg.
+
+        """
+        self.spi = None
+        # Analogue sensors may be read from several threads at once (with
+        # 'acquisition = concurrent'), but only one conversion can be
+        # clocked out of the chip at a time
+        self.lock = threading.Lock()
+        # Reference voltage, i.e. the input voltage which reads as 1023
+        self.vref = float(data.get("vref", 3.3))
+        # Channels in use (channel -> number of reads per scan), and the
+        # results of the latest scan of them
+        self.channels = {}
+        self.scanlock = threading.Lock()
+        self.scans = samplecache.SampleCache(self.scanchannels,
+                                             float(data.get("scanMaxAge", 1.0)))
+        # Channels sampled continuously: channel -> [ring buffer, count]
+        self.rate = float(data.get("continuousRate", 500))
+        if self.rate <= 0:
+            raise ValueError("MCP3008 continuousRate must be more than 0")
+        self.streams = {}
+        self.streamlock = threading.Lock()
+        self.streamthread = None
+        backend = data.get("backend", "bitbang").lower()
+        if backend not in ["bitbang", "spidev"]:
+            raise ValueError("MCP3008 backend must be 'bitbang' or 'spidev'")
+        if backend == "spidev":
+            bus = int(data.get("spiBus", 0))
+            device = int(data.get("spiDevice", 0))
+            try:
+                self.spi = hal.spidev(bus, device)
+                # The MCP3008 supports SPI modes 0 and 3, and up to
+                # 1.35 MHz at 2.7 V (3.6 MHz at 5 V)
+                self.spi.mode = 0
+                self.spi.max_speed_hz = int(data.get("spiSpeed", 1000000))
+            except (ImportError, IOError) as excep:
+                print("MCP3008: can't use /dev/spidev" + str(bus) + "." +
+                      str(device) + " (" + str(excep) + "); using GPIO pins")
+                self.spi = None
+        if self.spi is None:
+            self.setup_bitbang(data)
+        if MCP3008.sharedClass == None:
+            MCP3008.sharedClass = self
+
+    def setup_bitbang(self, data):
+        """Set up the GPIO pins for bit-banged SPI.
+
+        Args:
+            self: self.
+            data: Parameters from sensors.cfg.
+
+        """
+        self.gpio = hal.gpio()
+        GPIO = self.gpio
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
         # Default pins
@@ -29,19 +124,220 @@ class MCP3008(sensor.Sensor):
         self.SPICS = 25
         # Optional custom pins
         if "mosiPin" in data:
-            self.SPIMOSI = data["mosiPin"]
+            self.SPIMOSI = int(data["mosiPin"])
         if "misoPin" in data:
-            self.SPIMISO = data["misoPin"]
+            self.SPIMISO = int(data["misoPin"])
         if "clkPin" in data:
-            self.SPICLK = data["clkPin"]
+            self.SPICLK = int(data["clkPin"])
         if "csPin" in data:
-            self.SPICS = data["csPin"]
+            self.SPICS = int(data["csPin"])
         GPIO.setup(self.SPIMOSI, GPIO.OUT)
         GPIO.setup(self.SPIMISO, GPIO.IN)
         GPIO.setup(self.SPICLK, GPIO.OUT)
         GPIO.setup(self.SPICS, GPIO.OUT)
-        if MCP3008.sharedClass == None:
-            MCP3008.sharedClass = self
+
+    def register(self, adcnum, reads=1):
+        """Add a channel to those read by readcached().
+
+        Args:
+            self: self.
+            adcnum: The channel (0 to 7).
+            reads: How many times to read the channel in each scan.
+
+        """
+        with self.scanlock:
+            self.channels[adcnum] = max(reads, self.channels.get(adcnum, 1))
+
+    def scan(self, channels=None):
+        """Read several channels in one pass.
+
+        The channels are read back-to-back, without letting anything else
+        use the chip in between.
+
+        Args:
+            self: self.
+            channels: The channels to read; defaults to every channel
+                      added with register().
+
+        Returns:
+            dict The raw (0 to 1023) value of each channel.
+
+        """
+        if channels is None:
+            channels = self.channels
+        with self.lock:
+            if self.spi is not None:
+                read = self.readadc_spidev
+            else:
+                read = self.readadc_bitbang
+            return dict((adcnum, read(adcnum)) for adcnum in sorted(channels)
+                        if 0 <= adcnum <= 7)
+
+    def oversample(self, channels):
+        """Read several channels, several times each, in one pass.
+
+        The reads go round the channels in turn, so the reads of each
+        channel are spread over the whole pass.
+
+        Args:
+            self: self.
+            channels: dict How many times to read each channel.
+
+        Returns:
+            dict A list of the raw (0 to 1023) values of each channel.
+
+        """
+        results = dict((adcnum, []) for adcnum in channels
+                       if 0 <= adcnum <= 7)
+        with self.lock:
+            if self.spi is not None:
+                read = self.readadc_spidev
+            else:
+                read = self.readadc_bitbang
+            for turn in range(max(channels.values() or [0])):
+                for adcnum in sorted(results):
+                    if turn < channels[adcnum]:
+                        results[adcnum].append(read(adcnum))
+        return results
+
+    def scanchannels(self):
+        """Read every registered channel, as many times as it needs.
+
+        Args:
+            self: self.
+
+        Returns:
+            dict A list of the raw (0 to 1023) values of each channel.
+
+        """
+        with self.scanlock:
+            channels = dict(self.channels)
+        return self.oversample(channels)
+
+    def readcached(self, adcnum):
+        """Read a channel, from the scan for the current sample.
+
+        Every registered channel is scanned in one pass, the first time one
+        of them is read in each sample (see samplecache.py); the scans are
+        kept for up to 'scanMaxAge' seconds.
+
+        Args:
+            self: self.
+            adcnum: The channel (0 to 7).
+
+        Returns:
+            list The raw (0 to 1023) values of the channel, from each time
+                 it was read in the scan (see register()); [-1] if the
+                 channel doesn't exist.
+
+        """
+        if adcnum not in self.channels:
+            self.register(adcnum)
+        return self.scans.get(adcnum, default=[-1])
+
+    def stream(self, adcnum, window):
+        """Start sampling a channel continuously.
+
+        The channel is read 'continuousRate' times per second by a
+        background thread (which is started with the first channel), into
+        a ring buffer big enough to hold 'window' seconds of readings. If
+        the channel is already being sampled, its buffer is made bigger if
+        need be, keeping the readings already in it.
+
+        Args:
+            self: self.
+            adcnum: The channel (0 to 7).
+            window: How many seconds of readings to keep.
+
+        Raises:
+            ImportError: numpy is not installed.
+
+        """
+        load_numpy()
+        size = max(1, int(round(self.rate * window)))
+        with self.streamlock:
+            if adcnum not in self.streams:
+                self.streams[adcnum] = [numpy.zeros(size, numpy.uint16), 0]
+            elif size > len(self.streams[adcnum][0]):
+                readings = self.readings(adcnum)
+                buf = numpy.zeros(size, numpy.uint16)
+                buf[:len(readings)] = readings
+                self.streams[adcnum] = [buf, len(readings)]
+            if self.streamthread is None:
+                self.streamthread = threading.Thread(target=self.run_streams,
+                                                     name="MCP3008-stream")
+                self.streamthread.daemon = True
+                self.streamthread.start()
+
+    def run_streams(self):
+        """Sample the continuous channels (in a background thread).
+
+        If the readings can't keep up with 'continuousRate' (e.g. too many
+        channels for the bit-banged backend), they are taken as quickly as
+        possible instead; missed readings are not made up.
+
+        Args:
+            self: self.
+
+        """
+        period = 1.0 / self.rate
+        due = clock.monotonic()
+        while True:
+            with self.streamlock:
+                channels = sorted(self.streams)
+            values = self.scan(channels)
+            with self.streamlock:
+                for adcnum, value in values.items():
+                    stream = self.streams[adcnum]
+                    buf = stream[0]
+                    buf[stream[1] % len(buf)] = value
+                    stream[1] += 1
+            due += period
+            now = clock.monotonic()
+            if due < now:
+                due = now
+            else:
+                clock.sleep_until(due)
+
+    def readings(self, adcnum):
+        """Get all of the readings in a channel's ring buffer.
+
+        The caller must hold self.streamlock.
+
+        Args:
+            self: self.
+            adcnum: The channel (0 to 7), which must have been passed to
+                    stream().
+
+        Returns:
+            numpy.ndarray A copy of the raw (0 to 1023) readings, oldest
+                          first.
+
+        """
+        buf, count = self.streams[adcnum]
+        if count < len(buf):
+            return buf[:count].copy()
+        # Oldest reading is the one which will be overwritten next
+        return numpy.roll(buf, -(count % len(buf)))
+
+    def window(self, adcnum, seconds):
+        """Get the readings of a continuous channel in a recent window.
+
+        Args:
+            self: self.
+            adcnum: The channel (0 to 7), which must have been passed to
+                    stream().
+            seconds: How far back to go; no further than the 'window'
+                     passed to stream().
+
+        Returns:
+            numpy.ndarray A copy of the raw (0 to 1023) readings, oldest
+                          first. Empty if none have been taken yet.
+
+        """
+        size = max(1, int(round(self.rate * seconds)))
+        with self.streamlock:
+            return self.readings(adcnum)[-size:]
 
     def readadc(self, adcnum):
         """ Read SPI data from MCP3008.
@@ -51,6 +347,14 @@ class MCP3008(sensor.Sensor):
         if (adcnum > 7) or (adcnum < 0):
             # Invalid pin number
             return -1
+        with self.lock:
+            if self.spi is not None:
+                return self.readadc_spidev(adcnum)
+            return self.readadc_bitbang(adcnum)
+
+    def readadc_bitbang(self, adcnum):
+        """ Read from the MCP3008 by bit-banging SPI over the GPIO pins."""
+        GPIO = self.gpio
         GPIO.output(self.SPICS, True)
 
         GPIO.output(self.SPICLK, False)  # start clock low
@@ -79,3 +383,13 @@ class MCP3008(sensor.Sensor):
 
         GPIO.output(self.SPICS, True)
         return adcout
+
+    def readadc_spidev(self, adcnum):
+        """ Read from the MCP3008 using the kernel SPI driver.
+
+        One 3-byte full-duplex transfer: the start bit, then the
+        single-ended bit and channel number; the 10-bit result comes back
+        in the last 10 bits.
+        """
+        reply = self.spi.xfer2([0x01, (0x08 | adcnum) << 4, 0x00])
+        return ((reply[1] & 0x03) << 8) | reply[2]
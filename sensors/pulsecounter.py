@@ -0,0 +1,274 @@
+""" Count pulses on a GPIO pin.
+
+A generic sensor for anything which gives out a pulse for each unit of
+something: anemometers, flow meters, Geiger counters, energy meters etc.
+It can report the number of pulses since the last reading, the pulse
+frequency over a recent window, or the gust - the highest frequency over
+any short interval in that window.
+Pulses are seen by GPIO edge detection rather than by polling the pin
+(the Raingauge counts its bucket tips the same way). The time of each
+edge is stored in a ring buffer (see EdgeCounter), which is written only
+by the GPIO callback thread and read without a lock, so the callback does
+as little as possible and can keep up with pulse rates of a few hundred
+per second (and more, in bursts which fit in the buffer). Everything else
+is worked out from the buffer when the sensor is read.
+
+"""
+import bisect
+import threading
+import sensor
+import hal
+import clock
+
+COUNTERS = {}
+COUNTERSLOCK = threading.Lock()
+
+def counter(pin, size=16384, edge="falling", pull="up", bouncetime=0):
+    """Get the edge counter for a pin, setting it up if need be.
+
+    The settings of a pin are those given when it is first set up.
+
+    Args:
+        pin: The GPIO pin the pulses are on.
+        size: How many edge times to keep.
+        edge: The edges to count: 'falling', 'rising' or 'both'.
+        pull: The pin's pull resistor: 'up', 'down' or 'off'.
+        bouncetime: Ignore edges this soon (ms) after the last one.
+
+    Returns:
+        EdgeCounter The counter.
+
+    """
+    with COUNTERSLOCK:
+        if pin not in COUNTERS:
+            COUNTERS[pin] = EdgeCounter(pin, size, edge, pull, bouncetime)
+        return COUNTERS[pin]
+
+class EdgeCounter(object):
+    """ Count the edges on a pin, and record when they happened.
+
+    The edge times go into a ring buffer which is allocated up front.
+    RPi.GPIO calls every edge callback from the same thread, so there is
+    only ever one writer: it stores the time in the next slot and then
+    increments the count. Readers copy the buffer (one atomic operation),
+    and use the count before and after the copy to tell which of the times
+    they copied are complete and haven't been overwritten.
+
+    """
+
+    def __init__(self, pin, size=16384, edge="falling", pull="up", bouncetime=0):
+        """Initialise, and start detecting edges.
+
+        Args:
+            self: self.
+            pin: The GPIO pin the pulses are on.
+            size: How many edge times to keep.
+            edge: The edges to count: 'falling', 'rising' or 'both'.
+            pull: The pin's pull resistor: 'up', 'down' or 'off'.
+            bouncetime: Ignore edges this soon (ms) after the last one.
+
+        Raises:
+            ValueError: One of the settings is not recognised.
+
+        """
+        if size < 1:
+            raise ValueError("Pulse counter buffer size must be at least 1")
+        self.size = size
+        self.times = [0.0] * size
+        self.count = 0
+        self.started = clock.monotonic()
+        GPIO = hal.gpio()
+        edges = {"falling": GPIO.FALLING, "rising": GPIO.RISING,
+                 "both": GPIO.BOTH}
+        pulls = {"up": GPIO.PUD_UP, "down": GPIO.PUD_DOWN, "off": GPIO.PUD_OFF}
+        if edge not in edges:
+            raise ValueError("Pulse counter edge must be 'falling', 'rising' or 'both'")
+        if pull not in pulls:
+            raise ValueError("Pulse counter pull must be 'up', 'down' or 'off'")
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        GPIO.setup(pin, GPIO.IN, pull_up_down=pulls[pull])
+        if bouncetime > 0:
+            GPIO.add_event_detect(pin, edges[edge], callback=self.edge,
+                                  bouncetime=bouncetime)
+        else:
+            GPIO.add_event_detect(pin, edges[edge], callback=self.edge)
+
+    def edge(self, channel=None):
+        """Record an edge.
+
+        This is called by GPIO edge detection, which passes the number of
+        the pin which changed.
+
+        Args:
+            self: self.
+            channel: The GPIO pin number.
+
+        """
+        self.times[self.count % self.size] = clock.monotonic()
+        self.count += 1
+
+    def read(self):
+        """Get the number of edges so far, and the times of the latest.
+
+        Returns:
+            tuple The total number of edges, and a list of the times (see
+                  clock.monotonic()) of as many of the latest ones as are
+                  in the buffer, oldest first.
+
+        """
+        before = self.count
+        times = self.times[:]
+        after = self.count
+        # The slots of edges counted while copying, and of one more which
+        # may have been stored but not yet counted, may hold times newer
+        # than 'before'
+        number = max(0, min(before, self.size - 1 - (after - before)))
+        end = before % self.size
+        if number <= end:
+            return before, times[end - number:end]
+        return before, times[end - number:] + times[:end]
+
+def frequency(times, since, until):
+    """Work out the mean frequency of some edges over an interval.
+
+    Args:
+        times: Edge times, oldest first.
+        since: The start of the interval.
+        until: The end of the interval.
+
+    Returns:
+        float Edges per second.
+
+    """
+    if until <= since:
+        return 0.0
+    return (len(times) - bisect.bisect_left(times, since)) / (until - since)
+
+def gust(times, since, until, gustwindow):
+    """Work out the highest frequency of some edges over a short interval.
+
+    If the interval from 'since' to 'until' is shorter than 'gustwindow',
+    the edges in it are divided by its length instead.
+
+    Args:
+        times: Edge times, oldest first.
+        since: The start of the interval edges are counted over.
+        until: The end of the interval.
+        gustwindow: The length (seconds) of the short interval.
+
+    Returns:
+        float The most edges in any 'gustwindow' seconds, per second.
+
+    """
+    if until <= since:
+        return 0.0
+    first = bisect.bisect_left(times, since)
+    most = 0
+    start = first
+    for end in range(first, len(times)):
+        while times[end] - times[start] > gustwindow:
+            start += 1
+        most = max(most, end - start + 1)
+    return most / min(gustwindow, until - since)
+
+class PulseCounter(sensor.Sensor):
+    """ Count pulses on a GPIO pin.
+
+    A generic sensor for anything which gives out a pulse for each unit of
+    something: anemometers, flow meters, Geiger counters etc. See
+    __init__() for more detail.
+
+    """
+    requiredData = ["pinnumber"]
+    optionalData = ["description", "output", "window", "gustWindow",
+                    "scale", "name", "sensorname", "unit", "symbol", "edge",
+                    "pull", "bouncetime", "bufferSize"]
+
+    def __init__(self, data):
+        """Initialise.
+
+        Initialise the pulse counter sensor Class using parameters passed in
+        'data'. data["output"] sets what is reported: "count" (the default)
+        for the number of pulses since the last reading, "frequency" for the
+        mean pulses per second over the last data["window"] seconds (default
+        60), or "gust" for the most pulses per second over any
+        data["gustWindow"] seconds (default 3) in that window. The value is
+        multiplied by data["scale"] (default 1), e.g. to turn an
+        anemometer's frequency into a wind speed.
+        How the pin is set up (data["edge"], data["pull"],
+        data["bouncetime"] and data["bufferSize"]) is taken from the first
+        section using the pin.
+
+        Args:
+            self: self.
+            data: A dict containing the parameters to be used during setup.
+
+        Return:
+
+        """
+        self.pinnum = int(data["pinnumber"])
+        self.output = data.get("output", "count").lower()
+        if self.output not in ["count", "frequency", "gust"]:
+            raise ValueError("Pulse counter output must be 'count', 'frequency' or 'gust'")
+        self.window = float(data.get("window", 60))
+        self.gustwindow = float(data.get("gustWindow", 3))
+        if self.window <= 0 or self.gustwindow <= 0:
+            raise ValueError("Pulse counter windows must be more than 0")
+        self.scale = float(data.get("scale", 1))
+        self.counter = counter(self.pinnum,
+                               int(data.get("bufferSize", 16384)),
+                               data.get("edge", "falling").lower(),
+                               data.get("pull", "up").lower(),
+                               int(data.get("bouncetime", 0)))
+        self.lastcount = self.counter.read()[0]
+        self.sensorname = data.get("sensorname",
+                                   "Pulses-" + str(self.pinnum))
+        if self.output == "count":
+            self.readingtype = "pulseCount"
+            self.valname = "Pulses"
+            self.valunit = "Pulses"
+            self.valsymbol = ""
+        else:
+            self.readingtype = "sample"
+            if self.output == "frequency":
+                self.valname = "Pulse_frequency"
+            else:
+                self.valname = "Pulse_gust"
+            self.valunit = "Hertz"
+            self.valsymbol = "Hz"
+        if "name" in data:
+            self.valname = data["name"]
+        if "unit" in data:
+            self.valunit = data["unit"]
+        if "symbol" in data:
+            self.valsymbol = data["symbol"]
+        if "description" in data:
+            self.description = data["description"]
+        else:
+            self.description = "A pulse counter."
+
+    def getval(self):
+        """Get the current sensor value.
+
+        Get the current sensor value: the number of pulses since the last
+        reading, the pulse frequency, or the gust, depending on 'output'.
+
+        Args:
+            self: self.
+
+        Returns:
+            float The current value for the sensor.
+
+        """
+        count, times = self.counter.read()
+        if self.output == "count":
+            pulses = count - self.lastcount
+            self.lastcount = count
+            return pulses * self.scale
+        now = clock.monotonic()
+        # Don't count time before the counter was started
+        since = max(now - self.window, self.counter.started)
+        if self.output == "frequency":
+            return frequency(times, since, now) * self.scale
+        return gust(times, since, now, self.gustwindow) * self.scale
@@ -2,6 +2,13 @@
 
 Work with a (Maplin) raingauge, i.e. read data and record bucket tips.
 The gauge is connected directly to a GPIO pin (and ground).
+Each tip is counted, and its time recorded, by the GPIO edge detection
+callback (see pulsecounter.EdgeCounter); nothing has to poll the pin. A
+Raingauge sensor can report the number of tips since its last reading, the
+rain rate (mm/h) over a recent window, or the total rain since the start
+of the run. Several of these can be read from the same gauge by adding a
+section to sensors.cfg for each, with the same 'pinnumber'; the pin is
+set up by the first of them.
 
 Originally written by Fred Sonnenwald <f.sonnenwald@sheffield.ac.uk>
 https://pi.gate.ac.uk/posts/2014/04/21/airpisoftware/
@@ -9,8 +16,9 @@ https://pi.gate.ac.uk/posts/2014/01/25/raingauge/
 http://www.maplin.co.uk/p/maplin-replacement-rain-gauge-for-n25frn96fyn96gy-n77nf
 
 """
-import RPi.GPIO as GPIO
 import sensor
+import clock
+import pulsecounter
 
 class Raingauge(sensor.Sensor):
     """ Work with a raingauge.
@@ -25,12 +33,24 @@ class Raingauge(sensor.Sensor):
 
     """
     requiredData = ["pinnumber"]
-    optionalData = ["description"]
+    optionalData = ["description", "output", "mmPerTip", "rateWindow",
+                    "name", "bouncetime"]
+
+    # The most tips per second the ring buffer of tip times is sized for
+    MAXTIPRATE = 1.0
 
     def __init__(self, data):
         """Initialise.
 
         Initialise the raingauge sensor Class using parameters passed in 'data'.
+        data["output"] sets what is reported: "tips" (the default) for the
+        number of bucket tips since the last reading, "rate" for the rain
+        rate in mm/h over the last data["rateWindow"] seconds (default
+        3600), or "total" for the rain in mm since the start of the run.
+        Each tip is data["mmPerTip"] mm of rain (default 0.2794).
+        Edges within data["bouncetime"] ms (default 300) of a tip are
+        ignored. The times of the tips in the last data["rateWindow"]
+        seconds are kept, for up to MAXTIPRATE tips per second.
 
         Args:
             self: self.
@@ -39,29 +59,53 @@ class Raingauge(sensor.Sensor):
         Return:
 
         """
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
         self.pinnum = int(data["pinnumber"])
-        GPIO.setup(self.pinnum, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-        GPIO.add_event_detect(self.pinnum, GPIO.FALLING, callback=self.buckettip, bouncetime=300)
-        self.rain = 0
+        self.output = data.get("output", "tips").lower()
+        if self.output not in ["tips", "rate", "total"]:
+            raise ValueError("Raingauge output must be 'tips', 'rate' or 'total'")
+        self.mmpertip = float(data.get("mmPerTip", 0.2794))
+        self.window = float(data.get("rateWindow", 3600))
+        if self.window <= 0:
+            raise ValueError("Raingauge rateWindow must be more than 0")
+        # The bucket takes a while to tip, and its switch bounces
+        bouncetime = int(data.get("bouncetime", 300))
+        # A read of the counter gives at most all but one of its slots
+        size = int(self.window * self.MAXTIPRATE) + 2
+        self.counter = pulsecounter.counter(self.pinnum, size,
+                                            bouncetime=bouncetime)
+        if self.output == "rate" and self.counter.size < size:
+            print("Warning: Raingauge on pin %d keeps too few tip times for a rateWindow of %gs" % (self.pinnum, self.window))
+            print("         Put the section with the longest rateWindow first.")
+        self.lastcount = self.counter.read()[0]
         self.sensorname = "Maplin_N77NF"
-        self.readingtype = "pulseCount"
-        self.valname = "Bucket_tips"
-        self.valsymbol = ""
-        self.valunit = ""
+        if self.output == "tips":
+            self.readingtype = "pulseCount"
+            self.valname = "Bucket_tips"
+            self.valsymbol = ""
+            self.valunit = ""
+        elif self.output == "rate":
+            self.readingtype = "sample"
+            self.valname = "Rain_rate"
+            self.valsymbol = "mm/h"
+            self.valunit = "Millimetres per hour"
+        else:
+            self.readingtype = "sample"
+            self.valname = "Rain_total"
+            self.valsymbol = "mm"
+            self.valunit = "Millimetres"
+        if "name" in data:
+            self.valname = data["name"]
         if "description" in data:
             self.description = data["description"]
         else:
             self.description = "A rain gauge."
 
     def getval(self):
-        """Get no. of tips *since last reading*.
+        """Get the current sensor value.
 
-        Get the current sensor value, which is the number of bucket tips
-        since the last reading. Note that it is NOT the total number of
-        bucket tips since the start of the run. Once this is done, reset
-        the count.
+        Get the current sensor value: the number of bucket tips since the
+        last reading (NOT the total number of bucket tips since the start of
+        the run), the rain rate, or the total rain, depending on 'output'.
 
         Args:
             self: self.
@@ -70,15 +114,15 @@ class Raingauge(sensor.Sensor):
             float The current value for the sensor.
 
         """
-        rain = self.rain
-        self.rain = 0
+        count, times = self.counter.read()
+        if self.output == "rate":
+            now = clock.monotonic()
+            # Don't count time before the counter was started
+            since = max(now - self.window, self.counter.started)
+            tips = pulsecounter.frequency(times, since, now)
+            return tips * self.mmpertip * 3600.0
+        if self.output == "total":
+            return count * self.mmpertip
+        rain = count - self.lastcount
+        self.lastcount = count
         return rain
-
-    def buckettip(self):
-        """Record a bucket tip.
-
-        Record a bucket tip.
-
-        """
-        self.rain += 1
-
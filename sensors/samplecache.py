@@ -0,0 +1,134 @@
+""" Share one reading of a group of sensors between the plugins of a sample.
+
+Many sensors give several values from one (slow) reading: a BMP085 gives
+temperature and pressure from one pair of conversions, all the DS18B20
+probes on a 1-Wire bus can be converted at once, one request to a
+Domoticz server gets every device on it, and so on. Each value is read
+by its own sensor plugin, so a SampleCache keeps the results of the
+latest reading for all of them: the first plugin to be read in a sample
+makes the reading, and the rest are given its results.
+Each plugin is expected to read (at most) once per sample, so a new
+sample is taken to have started - and the reading is made again - when a
+plugin asks for a result it has already had since the latest reading, or
+that reading is older than 'maxage' seconds. The reading can also be
+started ahead of the sample, in the background, with start() (see
+sensor.Sensor.start()).
+
+"""
+import threading
+import clock
+
+class SampleCache(object):
+    """ The results of the latest reading of a group of sensors. """
+
+    def __init__(self, fetch, maxage, name="SampleCache"):
+        """Initialise.
+
+        Args:
+            self: self.
+            fetch: Function which makes a new reading, and returns a dict
+                   of its results (e.g. by quantity, or by device).
+            maxage: How old (seconds) a reading can be and still be used.
+            name: Name for the thread used by start().
+
+        """
+        self.fetch = fetch
+        self.maxage = maxage
+        self.name = name
+        self.lock = threading.Lock()
+        self.fetchlock = threading.Lock()
+        # Counts readings, so that threads which all find that a new one
+        # is needed at the same time only make one between them
+        self.generation = 0
+        self.results = None
+        self.resultstime = None
+        self.taken = set()
+        self.started = None
+
+    def unread(self):
+        """Check whether the latest results haven't been read at all yet.
+
+        The caller must hold self.lock.
+
+        """
+        return (self.results is not None and not self.taken and
+                clock.monotonic() - self.resultstime <= self.maxage)
+
+    def refresh(self, generation=None):
+        """Make a new reading, and keep its results.
+
+        Args:
+            self: self.
+            generation: Only make the reading if no other reading has been
+                        made since self.generation had this value.
+
+        """
+        with self.fetchlock:
+            if generation is not None and generation != self.generation:
+                return
+            results = self.fetch()
+            with self.lock:
+                self.results = results
+                self.resultstime = clock.monotonic()
+                self.taken = set()
+                self.generation += 1
+
+    def start(self):
+        """Start a new reading in the background.
+
+        Does nothing if a reading started this way is under way, or the
+        results of the latest one haven't been read yet.
+
+        Args:
+            self: self.
+
+        """
+        with self.lock:
+            if self.unread() or (self.started is not None and
+                                 self.started.is_alive()):
+                return
+            self.started = threading.Thread(target=self.refresh,
+                                            args=(self.generation,),
+                                            name=self.name)
+            self.started.daemon = True
+            self.started.start()
+
+    def wait(self):
+        """Wait for a reading started by start() to finish.
+
+        Args:
+            self: self.
+
+        """
+        with self.lock:
+            started = self.started
+        if started is not None:
+            started.join()
+
+    def get(self, key, reader=None, default=None):
+        """Get one of the results of the reading for this sample.
+
+        Args:
+            self: self.
+            key: Which result to get.
+            reader: Who is reading it (e.g. the sensor plugin); defaults to
+                    'key'.
+            default: What to return if the reading has no such result.
+
+        Returns:
+            The result.
+
+        """
+        if reader is None:
+            reader = key
+        self.wait()
+        with self.lock:
+            generation = self.generation
+            current = (reader not in self.taken and self.results is not None
+                       and key in self.results and
+                       clock.monotonic() - self.resultstime <= self.maxage)
+        if not current:
+            self.refresh(generation)
+        with self.lock:
+            self.taken.add(reader)
+            return self.results.get(key, default)
@@ -21,6 +21,10 @@ class Sensor(object):
 
     __metaclass__ = ABCMeta
 
+    # How long (seconds) before each sample start() should be called; see
+    # start(). Can be overridden with 'leadtime' in sensors.cfg.
+    leadtime = 0.0
+
     @abstractmethod
     def __init__(self, data):
         """Error if sub-class doesn't init itself.
@@ -60,3 +64,30 @@ class Sensor(object):
 
         """
         return self.valname
+
+    def start(self):
+        """Start a reading, ahead of the sample.
+
+        Sensors which take a while to make a reading (e.g. waiting for a
+        conversion) can override this and collect() so that the waiting
+        happens before the sample is due, alongside everything else,
+        rather than when the sensor is read. start() is called 'leadtime'
+        seconds before each sample in which the sensor is read, and must
+        return straight away. The default does nothing.
+
+        """
+        pass
+
+    def collect(self):
+        """Get the reading started by start().
+
+        This is what is called to read the sensor each sample. It must
+        still work if start() was not called (e.g. when sampling has
+        fallen behind, or on the first sample), by making a reading
+        there and then. The default simply calls getval().
+
+        Returns:
+            The current value for the sensor (see getval()).
+
+        """
+        return self.getval()
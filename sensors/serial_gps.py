@@ -1,5 +1,5 @@
 import sensor
-import GpsController
+import hal
 
 gpsc = None # define gps data structure
 
@@ -19,10 +19,10 @@ class serial_gps(sensor.Sensor):
 
         """
         self.sensorname = "MTK3339"
-        self.valName = "Location"
+        self.valname = "Location"
         global gpsc
         try:
-            gpsc = GpsController.GpsController()
+            gpsc = hal.gps()
             gpsc.start()
         except Exception as e:
             print("Exception:", e)
@@ -51,7 +51,7 @@ class serial_gps(sensor.Sensor):
         else:
             return (gpsc.fix.latitude, gpsc.fix.longitude, gpsc.fix.altitude, "fixed", "indoor")
 
-    def stopController(self):
+    def stopcontroller(self):
         """Stop the GPS controller.
 
         Stop the GPS controller we created for this sensor. Informing the user
@@ -0,0 +1,857 @@
+""" Simulated Raspberry Pi hardware.
+
+Simulated versions of the hardware used by the AirPi sensor plugins,
+used when the 'sim' backend is chosen in hal.py. The devices behave like
+the real ones at the level the plugins see them: the MCP3008 is driven
+bit by bit over the GPIO pins, the BMP085 and HTU21D have register maps
+and commands, and every device takes as long to do a conversion as the
+real one does. Readings follow slow, deterministic waveforms (based on
+how many conversions a device has done), so runs can be repeated.
++ GPIO    - pins, levels, edge detection with bounce filtering. External
+            signals can be applied to input pins with drive() / pulse().
++ Pulses  - a stream of pulses, at a rate which rises and falls, on each
+            pin in PULSES (e.g. a rain gauge or an anemometer), from when
+            edge detection is turned on for it.
++ MCP3008 - ADC on pins CLK 18, MOSI 23, MISO 24, CS 25 (BCM), and
+            another on each SPI device (e.g. /dev/spidev0.0).
++ BMP085  - I2C address 0x77 on every bus; datasheet calibration data.
++ HTU21D  - I2C address 0x40 on every bus; CRC-checked measurements.
++ DHT22   - dhtreader.read() on any pin; no more than once per 2 seconds.
++ DS18B20 - 1-Wire devices listed in ONEWIRE; bulk conversions.
++ GPS     - a fixed position.
+
+"""
+from abc import ABCMeta, abstractmethod
+import math
+import threading
+import time
+
+import clock
+
+LOCK = threading.RLock()
+
+def wave(count, period, phase=0.0):
+    """A deterministic, slowly changing value between -1 and 1.
+
+    Args:
+        count: How many conversions the device has done.
+        period: The number of conversions in one cycle.
+        phase: Offset, as a fraction of a cycle.
+
+    Returns:
+        float The value.
+
+    """
+    return math.sin(2 * math.pi * (float(count) / period + phase))
+
+class SimGPIO(object):
+    """ Simulated RPi.GPIO. """
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.lock = threading.RLock()
+        self.mode = None
+        self.directions = {}
+        self.levels = {}
+        self.devices = []
+        self.events = {}
+        self.pulsetrains = {}
+
+    def attach(self, device):
+        """Connect a simulated device to the pins.
+
+        The device's pin_changed(pin, level) method is called whenever an
+        output pin changes, and its pin_level(pin) method is asked for the
+        level of input pins (returning None if it does not drive the pin).
+
+        Args:
+            self: self.
+            device: The device.
+
+        """
+        self.devices.append(device)
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channel, direction, pull_up_down=PUD_OFF, initial=None):
+        with self.lock:
+            self.directions[channel] = direction
+            if direction == self.OUT:
+                self.levels[channel] = 1 if initial else 0
+            elif pull_up_down == self.PUD_UP:
+                self.levels[channel] = 1
+            else:
+                self.levels[channel] = 0
+
+    def output(self, channel, value):
+        level = 1 if value else 0
+        self.levels[channel] = level
+        for device in self.devices:
+            device.pin_changed(channel, level)
+
+    def input(self, channel):
+        for device in self.devices:
+            level = device.pin_level(channel)
+            if level is not None:
+                return level
+        return self.levels.get(channel, 0)
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        with self.lock:
+            if channel in self.events:
+                raise RuntimeError("Conflicting edge detection already "
+                                   "enabled for this GPIO channel")
+            self.events[channel] = {"edge": edge,
+                                    "callbacks": [],
+                                    "bouncetime": (bouncetime or 0) / 1000.0,
+                                    "last": None,
+                                    "detected": False}
+            if callback is not None:
+                self.events[channel]["callbacks"].append(callback)
+            if channel in PULSES and channel not in self.pulsetrains:
+                self.pulsetrains[channel] = PulseTrain(self, channel,
+                                                       PULSES[channel])
+                self.pulsetrains[channel].start()
+
+    def add_event_callback(self, channel, callback):
+        with self.lock:
+            self.events[channel]["callbacks"].append(callback)
+
+    def remove_event_detect(self, channel):
+        with self.lock:
+            self.events.pop(channel, None)
+            self.pulsetrains.pop(channel, None)
+
+    def event_detected(self, channel):
+        with self.lock:
+            event = self.events.get(channel)
+            if event is None or not event["detected"]:
+                return False
+            event["detected"] = False
+            return True
+
+    def cleanup(self, channel=None):
+        with self.lock:
+            if channel is None:
+                self.directions.clear()
+                self.events.clear()
+                self.pulsetrains.clear()
+            else:
+                self.directions.pop(channel, None)
+                self.events.pop(channel, None)
+                self.pulsetrains.pop(channel, None)
+
+    def drive(self, channel, level):
+        """Apply an external signal to an input pin.
+
+        Edge detection (and its bounce filtering) is applied, and any
+        callbacks are run, in the calling thread.
+
+        Args:
+            self: self.
+            channel: The pin.
+            level: The new level (0 or 1).
+
+        """
+        level = 1 if level else 0
+        with self.lock:
+            previous = self.levels.get(channel, 0)
+            self.levels[channel] = level
+            event = self.events.get(channel)
+            if event is None or previous == level:
+                return
+            rising = level == 1
+            if ((event["edge"] == self.RISING and not rising) or
+                    (event["edge"] == self.FALLING and rising)):
+                return
+            now = clock.monotonic()
+            if (event["last"] is not None and
+                    now - event["last"] < event["bouncetime"]):
+                return
+            event["last"] = now
+            event["detected"] = True
+            callbacks = list(event["callbacks"])
+        for callback in callbacks:
+            callback(channel)
+
+    def pulse(self, channel):
+        """Apply one pulse (away from the idle level and back) to a pin.
+
+        Args:
+            self: self.
+            channel: The pin.
+
+        """
+        idle = self.levels.get(channel, 0)
+        self.drive(channel, 1 - idle)
+        self.drive(channel, idle)
+
+# Pins with pulses on them, and the mean number of pulses per second
+PULSES = {17: 0.05, 27: 20.0}
+
+class PulseTrain(threading.Thread):
+    """ A stream of pulses applied to a pin, at a rate which rises and falls.
+
+    It stops when edge detection is turned off for the pin.
+
+    """
+
+    def __init__(self, gpio, channel, rate, period=500):
+        """Initialise.
+
+        Args:
+            self: self.
+            gpio: The SimGPIO.
+            channel: The pin.
+            rate: The mean number of pulses per second.
+            period: The number of pulses in one cycle of the rate.
+
+        """
+        threading.Thread.__init__(self, name="SimPulses-" + str(channel))
+        self.daemon = True
+        self.gpio = gpio
+        self.channel = channel
+        self.rate = rate
+        self.period = period
+
+    def run(self):
+        count = 0
+        due = clock.monotonic()
+        while self.channel in self.gpio.events:
+            count += 1
+            due += 1.0 / (self.rate * (1.0 + 0.5 * wave(count, self.period)))
+            clock.sleep_until(due)
+            self.gpio.pulse(self.channel)
+
+class SimMCP3008(object):
+    """ Simulated MCP3008 ADC, driven by bit-banged SPI. """
+
+    def __init__(self, gpio, clk=18, mosi=23, miso=24, cs=25):
+        """Initialise.
+
+        Args:
+            self: self.
+            gpio: The SimGPIO the chip is connected to.
+            clk: The SPI clock pin.
+            mosi: The SPI MOSI pin.
+            miso: The SPI MISO pin.
+            cs: The SPI chip select pin.
+
+        """
+        self.gpio = gpio
+        self.clk = clk
+        self.mosi = mosi
+        self.miso = miso
+        self.cs = cs
+        self.selected = False
+        self.clocks = 0
+        self.command = 0
+        self.result = 0
+        self.out = 0
+        # Fixed values for channels; None follows the default waveform
+        self.values = [None] * 8
+        self.conversions = [0] * 8
+
+    def convert(self, channel):
+        """Do a conversion on a channel.
+
+        Args:
+            self: self.
+            channel: The channel (0-7).
+
+        Returns:
+            int The 10-bit result.
+
+        """
+        self.conversions[channel] += 1
+        if self.values[channel] is not None:
+            return int(self.values[channel]) & 0x3FF
+        return int(512 + 250 * wave(self.conversions[channel], 600,
+                                    channel / 8.0))
+
+    def pin_changed(self, pin, level):
+        if pin == self.cs:
+            self.selected = not level
+            self.clocks = 0
+            self.command = 0
+            self.out = 0
+        elif pin == self.clk and self.selected:
+            if level:
+                # Rising edge: clock in the start bit, SGL/DIFF and D2-D0
+                self.clocks += 1
+                if self.clocks <= 5:
+                    self.command = ((self.command << 1) |
+                                    self.gpio.levels.get(self.mosi, 0))
+                if self.clocks == 5:
+                    if self.command & 0x10:
+                        self.result = self.convert(self.command & 0x07)
+                    else:
+                        self.result = 0
+            elif self.clocks >= 6:
+                # Falling edge: clock out the null bit, then B9-B0
+                bit = 16 - self.clocks
+                if 0 <= bit <= 9:
+                    self.out = (self.result >> bit) & 1
+                else:
+                    self.out = 0
+
+    def pin_level(self, pin):
+        if pin == self.miso:
+            if self.selected:
+                return self.out
+            return 0
+        return None
+
+    def transfer(self, data):
+        """Do a full-duplex SPI transfer (see SpiDev).
+
+        Args:
+            self: self.
+            data: list The bytes sent on MOSI.
+
+        Returns:
+            list The bytes received on MISO.
+
+        """
+        bits = []
+        for byte in data:
+            bits.extend((byte >> shift) & 1 for shift in range(7, -1, -1))
+        out = [0] * len(bits)
+        if 1 in bits:
+            start = bits.index(1)
+            command = bits[start + 1:start + 5]
+            if len(command) == 4:
+                result = 0
+                if command[0]:
+                    channel = (command[1] << 2) | (command[2] << 1) | command[3]
+                    result = self.convert(channel)
+                # Sample, null bit, then B9-B0
+                for bit in range(10):
+                    position = start + 7 + bit
+                    if position < len(out):
+                        out[position] = (result >> (9 - bit)) & 1
+        received = []
+        for index in range(0, len(out), 8):
+            byte = 0
+            for bit in out[index:index + 8]:
+                byte = (byte << 1) | bit
+            received.append(byte)
+        return received
+
+class SimI2CDevice(object):
+    """ A simulated I2C device: writes and reads of raw bytes.
+
+    This is an abstract base class (ABC) and so cannot be instantiated
+    directly.
+
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def write(self, data):
+        """Write bytes to the device."""
+        pass
+
+    @abstractmethod
+    def read(self, count):
+        """Read bytes from the device."""
+        pass
+
+class SimBMP085(SimI2CDevice):
+    """ Simulated Bosch BMP085 pressure/temperature sensor. """
+
+    # Example calibration data from the datasheet
+    CALIBRATION = [408, -72, -14383, 32741, 32757, 23153, 6190, 4, -32768,
+                   -8711, 2868]
+    # Conversion times (seconds) for temperature, and pressure at each
+    # oversampling setting
+    TEMPTIME = 0.0045
+    PRESSURETIMES = [0.0045, 0.0075, 0.0135, 0.0255]
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.registers = bytearray(256)
+        for number, value in enumerate(self.CALIBRATION):
+            value &= 0xFFFF
+            self.registers[0xAA + 2 * number] = value >> 8
+            self.registers[0xAB + 2 * number] = value & 0xFF
+        self.registers[0xD0] = 0x55  # Chip ID
+        self.pointer = 0
+        self.pending = None
+        self.conversions = 0
+
+    def start(self, command):
+        """Start a conversion.
+
+        Args:
+            self: self.
+            command: The value written to the control register.
+
+        """
+        self.conversions += 1
+        count = self.conversions
+        if command == 0x2E:
+            raw = int(27898 + 150 * wave(count, 900)) << 8
+            ready = clock.monotonic() + self.TEMPTIME
+        elif command & 0x3F == 0x34:
+            oss = command >> 6
+            # About 1013 hPa with the datasheet calibration data
+            raw = int(34330 + 60 * wave(count, 1300, 0.25)) << 8
+            ready = clock.monotonic() + self.PRESSURETIMES[oss]
+        else:
+            return
+        self.pending = (ready, raw)
+
+    def update(self):
+        """Store the result of a finished conversion."""
+        if self.pending is not None and clock.monotonic() >= self.pending[0]:
+            raw = self.pending[1]
+            self.registers[0xF6] = (raw >> 16) & 0xFF
+            self.registers[0xF7] = (raw >> 8) & 0xFF
+            self.registers[0xF8] = raw & 0xFF
+            self.pending = None
+
+    def write(self, data):
+        data = bytearray(data)
+        if not data:
+            return 0
+        self.pointer = data[0]
+        for value in data[1:]:
+            self.registers[self.pointer] = value
+            if self.pointer == 0xF4:
+                self.start(value)
+            self.pointer = (self.pointer + 1) & 0xFF
+        return len(data)
+
+    def read(self, count):
+        # Until a conversion finishes, the old result is read
+        self.update()
+        result = []
+        for dummy in range(count):
+            result.append(self.registers[self.pointer])
+            self.pointer = (self.pointer + 1) & 0xFF
+        return result
+
+def crc8(data, polynomial):
+    """Calculate a CRC-8 checksum (MSB first, initial value 0).
+
+    Args:
+        data: The bytes to check.
+        polynomial: The generator polynomial, without the top bit.
+
+    Returns:
+        int The checksum.
+
+    """
+    crc = 0
+    for byte in bytearray(data):
+        crc ^= byte
+        for dummy in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ polynomial) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+    return crc
+
+class SimHTU21D(SimI2CDevice):
+    """ Simulated HTU21D humidity/temperature sensor. """
+
+    RESETTIME = 0.015
+    TEMPTIME = 0.050
+    HUMIDITYTIME = 0.016
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.busy = 0.0
+        self.hold = False
+        self.result = None
+        self.userregister = 0x02
+        self.conversions = 0
+
+    def write(self, data):
+        data = bytearray(data)
+        if not data:
+            return 0
+        command = data[0]
+        now = clock.monotonic()
+        if now < self.busy and command != 0xFE:
+            # Still measuring: the device does not acknowledge
+            raise IOError(121, "Remote I/O error")
+        if command == 0xFE:
+            self.busy = now + self.RESETTIME
+            self.result = None
+            self.userregister = 0x02
+        elif command in [0xE3, 0xF3]:
+            self.conversions += 1
+            temp = 21.5 + 1.5 * wave(self.conversions, 700)
+            raw = int((temp + 46.85) / 175.72 * 65536) & 0xFFFC
+            self.measure(raw, self.TEMPTIME, command == 0xE3)
+        elif command in [0xE5, 0xF5]:
+            self.conversions += 1
+            humidity = 45.0 + 10.0 * wave(self.conversions, 500, 0.5)
+            raw = (int((humidity + 6.0) / 125.0 * 65536) & 0xFFFC) | 0x02
+            self.measure(raw, self.HUMIDITYTIME, command == 0xE5)
+        elif command == 0xE7:
+            self.result = [self.userregister]
+        elif command == 0xE6 and len(data) > 1:
+            self.userregister = data[1]
+        return len(data)
+
+    def measure(self, raw, duration, hold):
+        """Start a measurement.
+
+        Args:
+            self: self.
+            raw: The 16-bit result (including status bits).
+            duration: How long the measurement takes (seconds).
+            hold: Whether the master is held (clock stretched) until the
+                  result is ready.
+
+        """
+        self.busy = clock.monotonic() + duration
+        self.hold = hold
+        word = [raw >> 8, raw & 0xFF]
+        self.result = word + [crc8(word, 0x31)]
+
+    def read(self, count):
+        remaining = self.busy - clock.monotonic()
+        if remaining > 0:
+            if not self.hold:
+                raise IOError(121, "Remote I/O error")
+            time.sleep(remaining)
+        if self.result is None:
+            raise IOError(121, "Remote I/O error")
+        return self.result[:count]
+
+SPIDEVICES = {}
+
+class SpiDev(object):
+    """ Simulated spidev.SpiDev, with an MCP3008 on each device. """
+
+    def __init__(self):
+        self.chip = None
+        self.max_speed_hz = 500000
+        self.mode = 0
+
+    def open(self, bus, device):
+        """Open /dev/spidev<bus>.<device>."""
+        with LOCK:
+            if (bus, device) not in SPIDEVICES:
+                SPIDEVICES[(bus, device)] = SimMCP3008(None)
+            self.chip = SPIDEVICES[(bus, device)]
+
+    def xfer2(self, data):
+        """Send and receive bytes, keeping CS low throughout."""
+        if self.chip is None:
+            raise IOError(9, "Bad file descriptor")
+        # Each byte takes 8 clocks
+        time.sleep(8.0 * len(data) / self.max_speed_hz)
+        return self.chip.transfer(data)
+
+    def close(self):
+        self.chip = None
+
+I2CBUSES = {}
+
+def i2c_device(bus, address):
+    """Find the simulated device at an address on a bus.
+
+    Args:
+        bus: The I2C bus number.
+        address: The device address.
+
+    Returns:
+        SimI2CDevice The device.
+
+    Raises:
+        IOError: There is no device at the address.
+
+    """
+    with LOCK:
+        if bus not in I2CBUSES:
+            I2CBUSES[bus] = {0x77: SimBMP085(), 0x40: SimHTU21D()}
+        if address not in I2CBUSES[bus]:
+            raise IOError(121, "Remote I/O error")
+        return I2CBUSES[bus][address]
+
+class SMBus(object):
+    """ Simulated smbus.SMBus. """
+
+    def __init__(self, bus):
+        self.bus = bus
+
+    def write_byte(self, address, value):
+        i2c_device(self.bus, address).write([value])
+
+    def read_byte(self, address):
+        return i2c_device(self.bus, address).read(1)[0]
+
+    def write_byte_data(self, address, register, value):
+        i2c_device(self.bus, address).write([register, value])
+
+    def read_byte_data(self, address, register):
+        device = i2c_device(self.bus, address)
+        device.write([register])
+        return device.read(1)[0]
+
+    def read_word_data(self, address, register):
+        device = i2c_device(self.bus, address)
+        device.write([register])
+        low, high = device.read(2)
+        return (high << 8) | low
+
+    def write_i2c_block_data(self, address, register, values):
+        i2c_device(self.bus, address).write([register] + list(values))
+
+    def read_i2c_block_data(self, address, register, length=32):
+        device = i2c_device(self.bus, address)
+        device.write([register])
+        return device.read(length)
+
+class I2CDevice(object):
+    """ Simulated raw access to an I2C device (see hal.I2CDevice). """
+
+    def __init__(self, bus, address):
+        self.device = i2c_device(bus, address)
+
+    def write(self, data):
+        return self.device.write(data)
+
+    def read(self, count):
+        return bytes(bytearray(self.device.read(count)))
+
+    def close(self):
+        pass
+
+class SimDHTReader(object):
+    """ Simulated dhtreader module, with a DHT22 on any pin. """
+
+    # dhtreader holds the pin low for 500 ms + 20 ms to start a reading
+    READTIME = 0.53
+    MININTERVAL = 2.0
+
+    def __init__(self):
+        self.lastread = {}
+        self.conversions = 0
+
+    def init(self):
+        pass
+
+    def read(self, sensortype, pin):
+        """Read the sensor.
+
+        Args:
+            self: self.
+            sensortype: The type of sensor (22 for the DHT22).
+            pin: The GPIO pin the sensor is connected to.
+
+        Returns:
+            tuple Temperature (Celsius) and relative humidity (%).
+
+        Raises:
+            Exception: The sensor was read less than 2 seconds ago, so
+                       does not respond.
+
+        """
+        time.sleep(self.READTIME)
+        with LOCK:
+            now = clock.monotonic()
+            last = self.lastread.get(pin)
+            if last is not None and now - last < self.MININTERVAL:
+                raise Exception("Failed to read from DHT sensor")
+            self.lastread[pin] = now
+            self.conversions += 1
+            count = self.conversions
+        temp = round(22.0 + 2.0 * wave(count, 400), 1)
+        humidity = round(50.0 + 8.0 * wave(count, 300, 0.3), 1)
+        return temp, humidity
+
+# 1-Wire devices and their base temperatures (Celsius)
+ONEWIRE = {"28-00047620aabb": 20.0, "28-000005e2fdc3": 18.5}
+
+# When the latest bulk conversion (see onewire_bulk_trigger()) was started
+BULKTRIGGER = [None]
+
+def onewire_devices():
+    """List the simulated 1-Wire devices.
+
+    Returns:
+        list The 1-Wire IDs.
+
+    """
+    return sorted(ONEWIRE)
+
+def dallas_crc8(data):
+    """Calculate the Dallas/Maxim 1-Wire CRC-8.
+
+    Args:
+        data: The bytes to check.
+
+    Returns:
+        int The checksum.
+
+    """
+    crc = 0
+    for byte in bytearray(data):
+        for dummy in range(8):
+            mix = (crc ^ byte) & 0x01
+            crc >>= 1
+            if mix:
+                crc ^= 0x8C
+            byte >>= 1
+    return crc
+
+def onewire_bulk_trigger():
+    """Start a conversion on every simulated 1-Wire device at once.
+
+    Returns:
+        boolean True (bulk conversions are supported).
+
+    """
+    with LOCK:
+        BULKTRIGGER[0] = clock.monotonic()
+    return True
+
+def onewire_bulk_pending():
+    """Check whether a bulk conversion is still in progress.
+
+    Returns:
+        boolean True if it is.
+
+    """
+    with LOCK:
+        trigger = BULKTRIGGER[0]
+    return (trigger is not None and
+            clock.monotonic() < trigger + OneWireDevice.CONVERSIONTIME)
+
+class OneWireDevice(object):
+    """ Simulated DS18B20, read via the w1-therm w1_slave file. """
+
+    # 12-bit conversion time
+    CONVERSIONTIME = 0.75
+
+    def __init__(self, deviceid):
+        """Initialise.
+
+        Args:
+            self: self.
+            deviceid: The 1-Wire ID of the device.
+
+        Raises:
+            IndexError: The device is not connected.
+
+        """
+        if deviceid not in ONEWIRE:
+            raise IndexError("No 1-Wire device " + str(deviceid))
+        self.deviceid = deviceid
+        self.conversions = 0
+        self.bulkread = None
+
+    def readlines(self):
+        # The result of a bulk conversion is read without converting
+        # again, but only once
+        with LOCK:
+            trigger = BULKTRIGGER[0]
+            usebulk = trigger is not None and trigger != self.bulkread
+            if usebulk:
+                self.bulkread = trigger
+        if usebulk:
+            clock.sleep_until(trigger + self.CONVERSIONTIME)
+        else:
+            time.sleep(self.CONVERSIONTIME)
+        self.conversions += 1
+        temp = ONEWIRE[self.deviceid] + 0.5 * wave(self.conversions, 200)
+        raw = int(round(temp * 16)) & 0xFFFF
+        scratchpad = [raw & 0xFF, raw >> 8, 0x4B, 0x46, 0x7F, 0xFF, 0x0C, 0x10]
+        scratchpad.append(dallas_crc8(scratchpad))
+        hexbytes = " ".join("%02x" % byte for byte in scratchpad)
+        millicelsius = int(round(raw / 16.0 * 1000))
+        return [hexbytes + " : crc=%02x YES\n" % scratchpad[-1],
+                hexbytes + " t=" + str(millicelsius) + "\n"]
+
+class GpsFix(object):
+    """ A GPS fix. """
+
+    def __init__(self):
+        self.latitude = 53.3811
+        self.longitude = -1.4701
+        self.altitude = 75.0
+        self.speed = 0.0
+
+class GpsController(object):
+    """ Simulated GpsController, with a fixed position. """
+
+    def __init__(self):
+        self.fix = GpsFix()
+
+    def start(self):
+        pass
+
+    def stopController(self):
+        pass
+
+    def join(self, timeout=None):
+        pass
+
+GPIO = None
+DHTREADER = None
+
+def gpio():
+    """Get the simulated GPIO, with the simulated MCP3008 attached.
+
+    Returns:
+        SimGPIO The simulated GPIO.
+
+    """
+    global GPIO
+    with LOCK:
+        if GPIO is None:
+            GPIO = SimGPIO()
+            GPIO.attach(SimMCP3008(GPIO))
+        return GPIO
+
+def dhtreader():
+    """Get the simulated dhtreader.
+
+    Returns:
+        SimDHTReader The simulated dhtreader.
+
+    """
+    global DHTREADER
+    with LOCK:
+        if DHTREADER is None:
+            DHTREADER = SimDHTReader()
+        return DHTREADER
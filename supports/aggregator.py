@@ -0,0 +1,340 @@
+"""Streaming aggregation of samples.
+
+Summarises the readings from each channel over a period (see
+'averageFreq' in settings.cfg) without keeping the readings themselves,
+so memory and CPU use per sample stay the same however long the period.
+Each channel reports one statistic, chosen with 'aggregate' in
+sensors.cfg:
++ mean    - the mean (Welford's method). The default.
++ sum     - the total. The default for 'pulseCount' channels (e.g. rain
+            gauge bucket tips).
++ min     - the smallest value.
++ max     - the largest value.
++ stddev  - the (sample) standard deviation.
++ count   - the number of values.
++ median  - the median.
++ pNN     - the NNth percentile, e.g. p90 or p99.5.
+The median and percentiles are exact for up to P2Quantile.EXACT values;
+beyond that they are estimated using the P-squared algorithm (Jain &
+Chlamtac, 1985), which keeps just five markers per quantile.
+
+"""
+
+import math
+import time
+import sampleframe
+
+def parse_statistic(name):
+    """Check the name of a statistic.
+
+    Args:
+        name: The name of the statistic (e.g. "mean", "p90").
+
+    Returns:
+        tuple The name in lower case, and the quantile (between 0 and
+              1) for a median or percentile, or None for anything else.
+
+    Raises:
+        ValueError: The statistic is not recognised.
+
+    """
+    name = name.strip().lower()
+    if name in ["mean", "sum", "min", "max", "stddev", "count"]:
+        return name, None
+    if name == "median":
+        return name, 0.5
+    if name.startswith("p"):
+        try:
+            quantile = float(name[1:]) / 100.0
+        except ValueError:
+            quantile = None
+        if quantile is not None and 0 < quantile < 1:
+            return name, quantile
+    raise ValueError("Unknown aggregate statistic '" + name + "'")
+
+class P2Quantile(object):
+    """Estimate a quantile of a stream of values (P-squared algorithm).
+
+    The first EXACT values are kept, so the quantile of a short stream is
+    exact. After that the five P-squared markers are placed on those
+    values, and the values themselves are discarded.
+
+    """
+
+    __slots__ = ("quantile", "heights", "positions", "desired", "increments")
+
+    EXACT = 50
+
+    def __init__(self, quantile):
+        """Initialise.
+
+        Args:
+            self: self.
+            quantile: The quantile to estimate (between 0 and 1).
+
+        """
+        self.quantile = quantile
+        self.heights = []
+        self.positions = None
+        self.desired = None
+        self.increments = [0.0, quantile / 2, quantile, (1 + quantile) / 2,
+                           1.0]
+
+    def start_markers(self):
+        """Place the five markers on the values kept so far.
+
+        Args:
+            self: self.
+
+        """
+        values = sorted(self.heights)
+        last = len(values) - 1
+        self.desired = [1 + last * increment for increment in self.increments]
+        positions = [float(int(round(desired))) for desired in self.desired]
+        # The markers must be on different values
+        for i in range(1, 4):
+            positions[i] = max(positions[i], positions[i - 1] + 1)
+        for i in range(3, 0, -1):
+            positions[i] = min(positions[i], positions[i + 1] - 1)
+        self.positions = positions
+        self.heights = [values[int(position) - 1]
+                        for position in self.positions]
+
+    def add(self, value):
+        """Add a value.
+
+        Args:
+            self: self.
+            value: The value.
+
+        """
+        if self.positions is None:
+            self.heights.append(value)
+            if len(self.heights) > self.EXACT:
+                self.start_markers()
+            return
+        heights = self.heights
+        positions = self.positions
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = 0
+            while value >= heights[cell + 1]:
+                cell += 1
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in range(1, 4):
+            offset = self.desired[i] - positions[i]
+            if ((offset >= 1 and positions[i + 1] - positions[i] > 1) or
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if offset > 0 else -1
+                height = self.parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self.linear(i, step)
+                heights[i] = height
+                positions[i] += step
+
+    def parabolic(self, i, step):
+        """Piecewise-parabolic prediction of a marker's new height."""
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step / (positions[i + 1] - positions[i - 1]) * (
+            (positions[i] - positions[i - 1] + step) *
+            (heights[i + 1] - heights[i]) / (positions[i + 1] - positions[i]) +
+            (positions[i + 1] - positions[i] - step) *
+            (heights[i] - heights[i - 1]) / (positions[i] - positions[i - 1]))
+
+    def linear(self, i, step):
+        """Linear prediction of a marker's new height."""
+        heights = self.heights
+        positions = self.positions
+        return heights[i] + step * (heights[i + step] - heights[i]) / (
+            positions[i + step] - positions[i])
+
+    def value(self):
+        """Get the current estimate.
+
+        Returns:
+            float The estimate, or None if no values have been added.
+
+        """
+        if not self.heights:
+            return None
+        if self.positions is None:
+            # Still few enough values to work it out exactly
+            values = sorted(self.heights)
+            rank = self.quantile * (len(values) - 1)
+            below = int(rank)
+            if below + 1 >= len(values):
+                return values[below]
+            return values[below] + (rank - below) * (values[below + 1] -
+                                                     values[below])
+        return self.heights[2]
+
+class Statistics(object):
+    """Running statistics for one channel."""
+
+    __slots__ = ("count", "mean", "m2", "minimum", "maximum", "total",
+                 "quantile")
+
+    def __init__(self, quantile=None):
+        """Initialise.
+
+        Args:
+            self: self.
+            quantile: The quantile to estimate, or None if not required.
+
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+        self.total = 0
+        self.quantile = None
+        if quantile is not None:
+            self.quantile = P2Quantile(quantile)
+
+    def add(self, value):
+        """Add a value.
+
+        Args:
+            self: self.
+            value: The value.
+
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+        self.total += value
+        if self.quantile is not None:
+            self.quantile.add(value)
+
+    def get(self, statistic):
+        """Get a statistic.
+
+        Args:
+            self: self.
+            statistic: The name of the statistic (see parse_statistic()).
+
+        Returns:
+            The value of the statistic, or None if there are no values
+            (or, for 'stddev', fewer than two).
+
+        """
+        if statistic == "count":
+            return self.count
+        if self.count == 0:
+            return None
+        if statistic == "mean":
+            return self.mean
+        if statistic == "sum":
+            return self.total
+        if statistic == "min":
+            return self.minimum
+        if statistic == "max":
+            return self.maximum
+        if statistic == "stddev":
+            if self.count < 2:
+                return None
+            return math.sqrt(self.m2 / (self.count - 1))
+        return self.quantile.value()
+
+class Aggregator(object):
+    """Aggregate SampleFrames over a period."""
+
+    def __init__(self, schema, statistics):
+        """Initialise.
+
+        Args:
+            self: self.
+            schema: The SampleFrame Schema for the sensor channels.
+            statistics: List giving the statistic to report for each
+                        channel in the schema, or None for the default.
+
+        """
+        self.schema = schema
+        self.statistics = []
+        for channel in schema.channels:
+            statistic = statistics[channel.index]
+            if statistic is None:
+                if channel.readingtype == "pulseCount":
+                    statistic = "sum"
+                else:
+                    statistic = "mean"
+            self.statistics.append(parse_statistic(statistic))
+        self.reset()
+
+    def reset(self):
+        """Start a new period.
+
+        Args:
+            self: self.
+
+        """
+        self.channels = [None] * len(self.schema)
+        self.breach = bytearray(len(self.schema))
+
+    def add(self, frame, index):
+        """Add one channel's reading from a frame.
+
+        Stale and missing values are skipped, so that repeated stale
+        values do not skew the result. GPS data are not aggregated.
+
+        Args:
+            self: self.
+            frame: The SampleFrame containing the reading.
+            index: The index of the channel.
+
+        """
+        if self.schema.channels[index].gps:
+            return
+        stats = self.channels[index]
+        if stats is None:
+            stats = Statistics(self.statistics[index][1])
+            self.channels[index] = stats
+        if frame.breach[index]:
+            self.breach[index] = 1
+        if (frame.stale[index] or frame.state[index] not in
+                [sampleframe.VALUE, sampleframe.INTEGER]):
+            return
+        value = frame.value(index)
+        if not math.isnan(value):
+            stats.add(value)
+
+    def result(self):
+        """Report the statistics for the period, and start a new one.
+
+        Returns:
+            SampleFrame The statistic for each channel which was read. A
+                        channel with no usable values (e.g. every
+                        reading was stale) has a value of None. The
+                        'readingtype' is "average" for the mean, or the
+                        name of the statistic otherwise.
+
+        """
+        frame = sampleframe.SampleFrame(self.schema)
+        timestamp = time.time()
+        for index, stats in enumerate(self.channels):
+            if stats is None:
+                continue
+            statistic = self.statistics[index][0]
+            frame.set(index, stats.get(statistic), self.breach[index], False,
+                timestamp)
+            if statistic == "mean":
+                frame.setreadingtype(index, "average")
+            else:
+                frame.setreadingtype(index, statistic)
+        self.reset()
+        return frame
@@ -7,6 +7,7 @@ settings config file (usually AirPi/settings.cfg).
 """
 
 import math
+import threading
 import support
 
 class Calibration(support.Support):
@@ -41,6 +42,10 @@ class Calibration(support.Support):
         self.calibrations = []
         self.calibrated = []
         self.lastuncalibrated = []
+        # Which calibrations apply to which channels, for each schema
+        self.plans = {}
+        # Output plugins may calibrate from their own worker threads
+        self.lock = threading.RLock()
         temp = dict((k.lower(), v) for k,v in self.params.iteritems())
         for name, detail in temp.iteritems():
             if name.startswith('func_') and detail is not False:
@@ -60,29 +65,69 @@ class Calibration(support.Support):
         Args:
             self: self.
             datapoints: The datapoints to be calibrated. This is usually
-                        a dict containing another dict for each
-                        property.
+                        a SampleFrame (see sampleframe.py), or a list
+                        containing a dict for each property.
 
         """
-        if datapoints == self.lastuncalibrated:
-            # The same datapoints object, so the calculations would turn
-            # out the same, so we can just return the result of the last
-            # calculations.
+        with self.lock:
+            if datapoints == self.lastuncalibrated:
+                # The same datapoints object, so the calculations would
+                # turn out the same, so we can just return the result of
+                # the last calculations.
+                return self.calibrated
+
+            if getattr(datapoints, "schema", None) is not None:
+                return self.calibrate_frame(datapoints)
+
+            calibrated = list(datapoints)
+            # findval() looks at this while the calculations are done
+            self.calibrated = calibrated
+            # Recreate so we don't overwrite un-calibrated data:
+            for i in range(0, len(calibrated)):
+                calibrated[i] = dict(calibrated[i]) # recreate again
+                for j in self.calibrations:
+                    if calibrated[i]["name"].lower() == j["name"]:
+                        if calibrated[i]["value"] != None:
+                            calibrated[i]["value"] = \
+                                j["function"](calibrated[i]["value"])
+                            calibrated[i]["symbol"] = j["symbol"]
+            # Update which object we last worked on:
+            self.lastuncalibrated = datapoints
             return self.calibrated
 
-        self.calibrated = list(datapoints)
-        # Recreate so we don't overwrite un-calibrated data:
-        for i in range(0, len(self.calibrated)):
-            self.calibrated[i] = dict(self.calibrated[i]) # recreate again
-            for j in self.calibrations:
-                if self.calibrated[i]["name"].lower() == j["name"]:
-                    if self.calibrated[i]["value"] != None:
-                        self.calibrated[i]["value"] = \
-                            j["function"](self.calibrated[i]["value"])
-                        self.calibrated[i]["symbol"] = j["symbol"]
-        # Update which object we last worked on:
-        self.lastuncalibrated = datapoints
-        return self.calibrated
+    def calibrate_frame(self, frame):
+        """Calibrate a SampleFrame.
+
+        Works directly on the frame's values, so no dicts are built.
+        Must be called with the lock held.
+
+        Args:
+            self: self.
+            frame: The SampleFrame to be calibrated.
+
+        Returns:
+            SampleFrame A calibrated copy of the frame.
+
+        """
+        plan = self.plans.get(frame.schema)
+        if plan is None:
+            plan = []
+            for channel in frame.schema.channels:
+                for j in self.calibrations:
+                    if channel.name.lower() == j["name"]:
+                        plan.append((channel.index, j["function"],
+                                     j["symbol"]))
+            self.plans[frame.schema] = plan
+        calibrated = frame.copy()
+        # findval() looks at this while the calculations are done
+        self.calibrated = calibrated
+        for index, function, symbol in plan:
+            value = calibrated.value(index)
+            if value is not None:
+                calibrated.setvalue(index, function(value))
+                calibrated.setsymbol(index, symbol)
+        self.lastuncalibrated = frame
+        return calibrated
 
     def findval(self, key):
         """Find (calibrated) data value for a given key.
@@ -104,7 +149,13 @@ class Calibration(support.Support):
         """
         found = 0
         num = 0
-        for i in Calibration.sharedClass.calibrated:
+        calibrated = Calibration.sharedClass.calibrated
+        if getattr(calibrated, "schema", None) is not None:
+            values = calibrated.find(key)
+            if values:
+                return sum(values) / float(len(values))
+            return found
+        for i in calibrated:
             if i["name"] == key and i["value"] != None:
                 found = found + i["value"]
                 num += 1
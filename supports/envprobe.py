@@ -0,0 +1,199 @@
+"""Shared checks of the AirPi's environment.
+
+Output and notification plugins with 'target = internet' need to know
+whether there is internet connectivity, and several plugins put the
+hostname into file names and messages. Each used to check for itself,
+which meant a 5 second connection attempt per plugin (and a reverse DNS
+lookup per hostname), one after another, when the AirPi is offline.
+Here the checks are run once, at the same time as each other, and the
+results are shared. Connectivity is checked again in the background once
+the result is older than the re-check interval, so plugins find out when
+it is lost or comes back without the AirPi being restarted; asking for
+it never waits, except for the very first check.
+
+"""
+
+import socket
+import threading
+import time
+import urllib2
+
+CONNURL = "http://www.google.com"
+CONNTIMEOUT = 5
+RECHECK = 60
+
+class EnvProbe(object):
+    """Cached connectivity and hostname checks."""
+
+    def __init__(self, url=CONNURL, recheck=RECHECK, timeout=CONNTIMEOUT):
+        """Initialise, and start the checks.
+
+        Args:
+            self: self.
+            url: The address to connect to when checking connectivity.
+            recheck: How old (seconds) the connectivity result can be
+                     before it is checked again.
+            timeout: How long (seconds) to allow for connecting.
+
+        """
+        self.url = url
+        self.recheck = recheck
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.online = None
+        self.checked = None
+        self.checking = False
+        self.firstcheck = threading.Event()
+        self.host = None
+        self.hostready = threading.Event()
+        self.listeners = []
+        self.start_check()
+        thread = threading.Thread(target=self.find_hostname,
+                                  name="EnvProbe-hostname")
+        thread.daemon = True
+        thread.start()
+
+    def start_check(self):
+        """Start checking connectivity, unless a check is under way.
+
+        Args:
+            self: self.
+
+        """
+        with self.lock:
+            if self.checking:
+                return
+            self.checking = True
+        thread = threading.Thread(target=self.check, name="EnvProbe-conn")
+        thread.daemon = True
+        thread.start()
+
+    def check(self):
+        """Check connectivity (in a background thread).
+
+        Args:
+            self: self.
+
+        """
+        try:
+            urllib2.urlopen(self.url, timeout=self.timeout)
+            online = True
+        except Exception:
+            online = False
+        with self.lock:
+            previous = self.online
+            self.online = online
+            self.checked = time.time()
+            self.checking = False
+            listeners = list(self.listeners)
+        self.firstcheck.set()
+        if previous is not None and previous != online:
+            for listener in listeners:
+                listener(online)
+
+    def connected(self):
+        """Check whether there is internet connectivity.
+
+        Only the very first call waits for the result; after that the
+        latest result is returned straight away, and a new check is
+        started in the background if it is out of date.
+
+        Args:
+            self: self.
+
+        Returns:
+            boolean True if the AirPi could connect to the internet
+                    when last checked.
+
+        """
+        self.firstcheck.wait()
+        if time.time() - self.checked >= self.recheck:
+            self.start_check()
+        return self.online
+
+    def on_change(self, listener):
+        """Ask to be told when connectivity is lost or comes back.
+
+        Args:
+            self: self.
+            listener: Function to call (from a background thread) with
+                      True when connectivity returns, or False when it is
+                      lost.
+
+        """
+        with self.lock:
+            self.listeners.append(listener)
+
+    def find_hostname(self):
+        """Look up the hostname (in a background thread).
+
+        Args:
+            self: self.
+
+        """
+        try:
+            host = socket.gethostname()
+            if host.find('.') < 0:
+                host = socket.gethostbyaddr(host)[0]
+        except Exception:
+            host = socket.gethostname()
+        self.host = host
+        self.hostready.set()
+
+    def hostname(self):
+        """Get the hostname of the Raspberry Pi.
+
+        Args:
+            self: self.
+
+        Returns:
+            string The hostname (fully-qualified, if it can be found).
+
+        """
+        self.hostready.wait()
+        return self.host
+
+PROBE = None
+PROBELOCK = threading.Lock()
+
+def configure(url=CONNURL, recheck=RECHECK):
+    """Set up the shared probe, and start its checks.
+
+    This should be called as early as possible, so that the checks run
+    while everything else is being set up. If it isn't called, the probe
+    is set up with the defaults when it is first used.
+
+    Args:
+        url: The address to connect to when checking connectivity.
+        recheck: How old (seconds) the connectivity result can be
+                 before it is checked again.
+
+    Returns:
+        EnvProbe The shared probe.
+
+    """
+    global PROBE
+    with PROBELOCK:
+        PROBE = EnvProbe(url, recheck)
+        return PROBE
+
+def probe():
+    """Get the shared probe.
+
+    Returns:
+        EnvProbe The shared probe.
+
+    """
+    global PROBE
+    with PROBELOCK:
+        if PROBE is None:
+            PROBE = EnvProbe()
+        return PROBE
+
+def connected():
+    """Check whether there is internet connectivity (see EnvProbe)."""
+    return probe().connected()
+
+def hostname():
+    """Get the hostname of the Raspberry Pi (see EnvProbe)."""
+    return probe().hostname()
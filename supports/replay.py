@@ -0,0 +1,329 @@
+"""Read back samples recorded by the CSV and JSON outputs.
+
+Used by `airpi.py --replay` to push previously recorded data through
+calibration, limits, averaging and the outputs again, e.g. to backfill a
+new output or to load-test the outputs.
+A file may contain several runs (the outputs append to an existing
+file), each possibly with metadata, and the channels recorded may differ
+from run to run. So the file is scanned once when it is opened, to find
+every channel which appears in it, and then read again, one sample at a
+time, as it is replayed; it is never held in memory all at once.
+
+"""
+
+import csv
+import datetime
+import re
+
+# The GPS values, in the order the outputs write them
+GPSPROPS = ["latitude", "longitude", "altitude", "exposure", "disposition"]
+GPSNAME = "Location"
+
+TIMEFORMATS = ["%Y-%m-%d %H:%M:%S,%f", "%Y-%m-%d %H:%M:%S.%f",
+               "%Y-%m-%d %H:%M:%S"]
+
+# A CSV column heading: "<sensor> <name> (<symbol>) (<readingtype>)"
+CSVHEADING = re.compile(r'^(\S+) (.+) \((.*)\) \(([^()]*)\)$')
+# A "key":"value" pair in a line written by JSONOutput. Older versions
+# of JSONOutput did not always write valid JSON (e.g. GPS values had no
+# opening quote), and names can be repeated, so the pairs are picked out
+# one by one rather than using the json module.
+JSONPAIR = re.compile(r'"([^"]*)":"?([^",}]*)"?')
+
+def parse_value(text):
+    """Convert a recorded value back to a Python value.
+
+    Args:
+        text: The value as written by the output (i.e. str(value)).
+
+    Returns:
+        int, float, bool, None, or the text itself if it is none of
+        these (e.g. a GPS disposition).
+
+    """
+    text = text.strip()
+    if text in ["", "None"]:
+        return None
+    if text in ["True", "False"]:
+        return text == "True"
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+def parse_time(text):
+    """Convert a recorded "Date and time" back to a datetime.
+
+    Args:
+        text: The date and time as written by the output.
+
+    Returns:
+        datetime The time, or None if it isn't a date and time.
+
+    """
+    for timeformat in TIMEFORMATS:
+        try:
+            return datetime.datetime.strptime(text.strip(), timeformat)
+        except ValueError:
+            pass
+    return None
+
+class Column(object):
+    """A channel which appears in a recording."""
+
+    __slots__ = ("key", "name", "sensor", "symbol", "readingtype", "gps")
+
+    def __init__(self, key, name, sensor=None, symbol=None,
+                 readingtype=None, gps=False):
+        """Initialise.
+
+        Args:
+            self: self.
+            key: What identifies the channel in the file.
+            name: The property name (e.g. "Temperature-BMP").
+            sensor: The sensor name, if recorded (CSV only).
+            symbol: The unit symbol, if recorded (CSV only).
+            readingtype: The reading type, if recorded (CSV only).
+            gps: Whether this is the GPS.
+
+        """
+        self.key = key
+        self.name = name
+        self.sensor = sensor
+        self.symbol = symbol
+        self.readingtype = readingtype
+        self.gps = gps
+
+class Recording(object):
+    """A file written by CSVOutput or JSONOutput.
+
+    Iterating over a Recording gives a (sampletime, readings) tuple for
+    each sample in the file, where readings is a list of (column index,
+    value) tuples. The GPS value is a dict, as from read_gps() in
+    airpi.py.
+
+    """
+
+    def __init__(self, path):
+        """Initialise.
+
+        Args:
+            self: self.
+            path: The file to read. Its format is worked out from its
+                  contents.
+
+        Raises:
+            IOError: The file can't be read.
+            ValueError: The file contains no samples.
+
+        """
+        self.path = path
+        self.format = self.detect_format()
+        self.columns = []
+        self.indexes = {}
+        self.count = 0
+        for _, readings in self.rows():
+            for column, _ in readings:
+                if column.key not in self.indexes:
+                    self.indexes[column.key] = len(self.columns)
+                    self.columns.append(column)
+            self.count += 1
+        if self.count == 0:
+            raise ValueError("No samples found in " + path)
+
+    def detect_format(self):
+        """Work out whether the file is CSV or JSON.
+
+        Args:
+            self: self.
+
+        Returns:
+            string 'csv' or 'json'.
+
+        """
+        with open(self.path, "r") as thefile:
+            for line in thefile:
+                if line.strip():
+                    if line.lstrip().startswith("{"):
+                        return "json"
+                    return "csv"
+        return "csv"
+
+    def rows(self):
+        """Read the samples from the file.
+
+        Args:
+            self: self.
+
+        Returns:
+            generator A (sampletime, readings) tuple for each sample,
+                      where readings is a list of (Column, value)
+                      tuples.
+
+        """
+        if self.format == "json":
+            return self.json_rows()
+        return self.csv_rows()
+
+    def csv_rows(self):
+        """Read the samples from a CSV file.
+
+        A heading row (starting "Date and time") gives the columns for the
+        data rows which follow it. Metadata rows, and anything else which
+        doesn't start with a date and time, are skipped.
+
+        Args:
+            self: self.
+
+        Returns:
+            generator See rows().
+
+        """
+        columns = None
+        with open(self.path, "rb") as thefile:
+            for row in csv.reader(thefile):
+                if not row:
+                    continue
+                if row[0] == "Date and time":
+                    columns = self.csv_columns(row[2:])
+                    continue
+                sampletime = parse_time(row[0])
+                if columns is None or sampletime is None:
+                    continue
+                readings = []
+                gps = None
+                for (column, prop), text in zip(columns, row[2:]):
+                    if column is None:
+                        continue
+                    if prop is not None:
+                        if gps is None:
+                            gps = {}
+                            readings.append((column, gps))
+                        gps[prop] = parse_value(text)
+                    else:
+                        readings.append((column, parse_value(text)))
+                yield sampletime, readings
+
+    def csv_columns(self, headings):
+        """Work out the columns from a CSV heading row.
+
+        Args:
+            self: self.
+            headings: The headings after "Date and time" and "Unix time".
+
+        Returns:
+            list A (Column, GPS property) tuple for each heading. The GPS
+                 headings all share one Column; the property is None for
+                 everything else. The Column is None for headings which
+                 aren't recognised.
+
+        """
+        columns = []
+        seen = {}
+        gpscolumn = Column((GPSNAME, None), GPSNAME, gps=True)
+        gpsprops = iter(GPSPROPS)
+        for heading in headings:
+            # Older versions of CSVOutput missed a quote before "Altitude"
+            heading = heading.strip().strip('"')
+            match = CSVHEADING.match(heading)
+            if match:
+                sensor, name, symbol, readingtype = match.groups()
+                occurrence = seen.get((sensor, name), 0)
+                seen[(sensor, name)] = occurrence + 1
+                columns.append((Column((sensor, name, occurrence), name,
+                                       sensor, symbol, readingtype), None))
+            elif heading.split(" ")[0].lower() in GPSPROPS:
+                # The values are written in GPSPROPS order, whatever the
+                # headings say
+                prop = next(gpsprops, None)
+                columns.append((gpscolumn if prop else None, prop))
+            else:
+                columns.append((None, None))
+        return columns
+
+    def json_rows(self):
+        """Read the samples from a JSON file.
+
+        Each line is one sample; lines without a "Date and time" (e.g.
+        metadata) are skipped. Names which appear more than once in a line
+        (e.g. two sensors both measuring "Temperature") are kept apart by
+        the order in which they appear.
+
+        Args:
+            self: self.
+
+        Returns:
+            generator See rows().
+
+        """
+        with open(self.path, "r") as thefile:
+            for line in thefile:
+                pairs = JSONPAIR.findall(line)
+                if not pairs or pairs[0][0] != "Date and time":
+                    continue
+                sampletime = parse_time(pairs[0][1])
+                if sampletime is None:
+                    continue
+                readings = []
+                seen = {}
+                gps = None
+                for name, text in pairs[1:]:
+                    if name in ["Unix time", "BREACHES"]:
+                        continue
+                    if name in GPSPROPS:
+                        if gps is None:
+                            gps = {}
+                            readings.append((Column((GPSNAME, None), GPSNAME,
+                                                    gps=True), gps))
+                        gps[name] = parse_value(text)
+                        continue
+                    occurrence = seen.get(name, 0)
+                    seen[name] = occurrence + 1
+                    readings.append((Column((None, name, occurrence), name),
+                                     parse_value(text)))
+                yield sampletime, readings
+
+    def match(self, sensorplugins):
+        """Match the recorded channels to sensor plugins.
+
+        A recorded channel matches a plugin with the same sensor name (if
+        recorded) and property name. If several channels have the same
+        names, they are matched to plugins in order.
+
+        Args:
+            self: self.
+            sensorplugins: The sensor plugins set up from sensors.cfg.
+
+        Returns:
+            list The plugin for each column, or None where there isn't
+                 one.
+
+        """
+        unused = list(sensorplugins)
+        matched = []
+        for column in self.columns:
+            found = None
+            for plugin in unused:
+                if column.gps:
+                    if plugin.valname == GPSNAME:
+                        found = plugin
+                elif (plugin.valname == column.name and
+                        column.sensor in [None, plugin.sensorname]):
+                    found = plugin
+                if found is not None:
+                    unused.remove(found)
+                    break
+            matched.append(found)
+        return matched
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for sampletime, readings in self.rows():
+            yield sampletime, [(self.indexes[column.key], value)
+                               for column, value in readings]
@@ -0,0 +1,314 @@
+"""Compact storage for samples.
+
+A sample used to be a list of dicts, one per sensor, each holding the
+same static details (unit, symbol, name, etc.) every time. Here the
+static details of each sensor channel are registered once, in a Schema,
+and each SampleFrame only holds the things which change from sample to
+sample: the values, breach and stale flags, and reading times. These are
+kept in arrays, so a sample costs a handful of allocations however many
+sensors there are.
+Output plugins which expect the old list of dicts can still iterate over
+a frame, or index it, as if it were that list; the dict for each reading
+is only built when it is first asked for.
+
+"""
+
+import array
+
+# What a frame holds for each channel
+ABSENT = 0   # Nothing (the channel was not read for this sample)
+VALUE = 1    # A number, in 'values'
+NONE = 2     # The sensor returned None
+OBJECT = 3   # Something else (e.g. GPS data), in 'objects'
+INTEGER = 4  # A whole number (e.g. a count), in 'values'
+
+class Channel(object):
+    """The static details of one sensor channel."""
+
+    __slots__ = ("index", "name", "unit", "symbol", "sensor", "description",
+                 "readingtype", "gps")
+
+class Schema(object):
+    """The channels which can appear in a SampleFrame."""
+
+    def __init__(self):
+        """Initialise.
+
+        Args:
+            self: self.
+
+        """
+        self.channels = []
+
+    def register(self, sensorplugin, gps=False):
+        """Register a sensor plugin as a channel.
+
+        Args:
+            self: self.
+            sensorplugin: The sensor plugin.
+            gps: Whether the plugin is the GPS, which gives several values
+                 (latitude, longitude, etc.) rather than just one.
+
+        Returns:
+            int The index of the new channel.
+
+        """
+        return self.add(sensorplugin.valname, sensorplugin.sensorname,
+                        getattr(sensorplugin, "valunit", None),
+                        getattr(sensorplugin, "valsymbol", None),
+                        getattr(sensorplugin, "description", None),
+                        getattr(sensorplugin, "readingtype", None), gps)
+
+    def add(self, name, sensor, unit=None, symbol=None, description=None,
+            readingtype=None, gps=False):
+        """Add a channel.
+
+        Args:
+            self: self.
+            name: The property name (e.g. "Temperature-BMP").
+            sensor: The sensor name.
+            unit: The unit of the values.
+            symbol: The unit symbol.
+            description: A description of the sensor.
+            readingtype: The reading type (e.g. "sample").
+            gps: Whether the channel is the GPS.
+
+        Returns:
+            int The index of the new channel.
+
+        """
+        channel = Channel()
+        channel.index = len(self.channels)
+        channel.name = name
+        channel.sensor = sensor
+        channel.gps = gps
+        channel.unit = unit
+        channel.symbol = symbol
+        channel.description = description
+        channel.readingtype = readingtype
+        self.channels.append(channel)
+        return channel.index
+
+    def __len__(self):
+        return len(self.channels)
+
+class SampleFrame(object):
+    """One sample: a value (or nothing) for each channel in a Schema."""
+
+    __slots__ = ("schema", "state", "values", "breach", "stale", "times",
+                 "objects", "readingtypes", "symbols", "views", "order")
+
+    def __init__(self, schema, template=None):
+        """Initialise.
+
+        Args:
+            self: self.
+            schema: The Schema describing the channels.
+            template: Another SampleFrame to copy the contents of, or None
+                      for an empty frame.
+
+        """
+        self.schema = schema
+        if template is not None:
+            self.state = bytearray(template.state)
+            self.values = array.array("d", template.values)
+            self.breach = bytearray(template.breach)
+            self.stale = bytearray(template.stale)
+            self.times = array.array("d", template.times)
+            self.objects = dict(template.objects)
+            self.readingtypes = dict(template.readingtypes)
+            self.symbols = dict(template.symbols)
+        else:
+            size = len(schema)
+            self.state = bytearray(size)
+            self.values = array.array("d", [0.0]) * size
+            self.breach = bytearray(size)
+            self.stale = bytearray(size)
+            self.times = array.array("d", [0.0]) * size
+            self.objects = {}
+            self.readingtypes = {}
+            self.symbols = {}
+        self.views = {}
+        self.order = None
+
+    def copy(self):
+        """Make a copy of the frame.
+
+        Returns:
+            SampleFrame The copy.
+
+        """
+        return SampleFrame(self.schema, self)
+
+    def set(self, index, value, breach=False, stale=False, timestamp=0.0):
+        """Record the reading for a channel.
+
+        Args:
+            self: self.
+            index: The index of the channel.
+            value: The value read (None if the sensor failed).
+            breach: Whether the value breaches its limits.
+            stale: Whether this is an old value re-used because the sensor
+                   missed its deadline.
+            timestamp: The time (time.time()) at which it was read.
+
+        """
+        self.setvalue(index, value)
+        self.breach[index] = 1 if breach else 0
+        self.stale[index] = 1 if stale else 0
+        self.times[index] = timestamp
+
+    def setvalue(self, index, value):
+        """Change the value for a channel, leaving its flags alone.
+
+        Args:
+            self: self.
+            index: The index of the channel.
+            value: The new value.
+
+        """
+        self.objects.pop(index, None)
+        if value is None:
+            self.state[index] = NONE
+        elif isinstance(value, bool):
+            self.state[index] = OBJECT
+            self.objects[index] = value
+        elif isinstance(value, float):
+            self.state[index] = VALUE
+            self.values[index] = value
+        elif isinstance(value, (int, long)):
+            self.state[index] = INTEGER
+            self.values[index] = value
+        else:
+            self.state[index] = OBJECT
+            self.objects[index] = value
+        self.views.pop(index, None)
+        self.order = None
+
+    def setsymbol(self, index, symbol):
+        """Override the symbol for a channel (e.g. after calibration).
+
+        Args:
+            self: self.
+            index: The index of the channel.
+            symbol: The symbol to use.
+
+        """
+        self.symbols[index] = symbol
+        self.views.pop(index, None)
+
+    def setreadingtype(self, index, readingtype):
+        """Override the reading type for a channel (e.g. "average").
+
+        Args:
+            self: self.
+            index: The index of the channel.
+            readingtype: The reading type to use.
+
+        """
+        self.readingtypes[index] = readingtype
+        self.views.pop(index, None)
+
+    def value(self, index):
+        """Get the value for a channel.
+
+        Args:
+            self: self.
+            index: The index of the channel.
+
+        Returns:
+            The value, or None if there is none.
+
+        """
+        state = self.state[index]
+        if state == VALUE:
+            return self.values[index]
+        if state == INTEGER:
+            return int(self.values[index])
+        if state == OBJECT:
+            return self.objects[index]
+        return None
+
+    def present(self):
+        """List the channels which have a reading in this frame.
+
+        Returns:
+            list Channel indexes, in the order they were registered.
+
+        """
+        if self.order is None:
+            self.order = [index for index, state in enumerate(self.state)
+                          if state]
+        return self.order
+
+    def view(self, index):
+        """Get the old-style dict for a channel's reading.
+
+        The dict is built the first time it is asked for, and the same
+        dict is returned after that.
+
+        Args:
+            self: self.
+            index: The index of the channel.
+
+        Returns:
+            dict The sensor data, with the keys output plugins have always
+                 been given. Whether the reading is stale (see self.stale)
+                 is left out, so that outputs which write out the whole
+                 dict keep their format.
+
+        """
+        if index in self.views:
+            return self.views[index]
+        channel = self.schema.channels[index]
+        if channel.gps:
+            reading = dict(self.objects.get(index) or {"latitude": None,
+                                                      "longitude": None,
+                                                      "disposition": None,
+                                                      "exposure": None})
+        else:
+            reading = {"value": self.value(index),
+                       "unit": channel.unit,
+                       "symbol": self.symbols.get(index, channel.symbol),
+                       "description": channel.description,
+                       "readingtype": self.readingtypes.get(index,
+                                                            channel.readingtype),
+                       "breach": bool(self.breach[index])}
+        reading["name"] = channel.name
+        reading["sensor"] = channel.sensor
+        self.views[index] = reading
+        return reading
+
+    def find(self, name):
+        """Find the values for all channels with a given name.
+
+        Args:
+            self: self.
+            name: The property name (e.g. "Temperature").
+
+        Returns:
+            list The values (not None) of the matching channels.
+
+        """
+        found = []
+        for channel in self.schema.channels:
+            if channel.name == name:
+                value = self.value(channel.index)
+                if value is not None:
+                    found.append(value)
+        return found
+
+    def __len__(self):
+        return len(self.present())
+
+    def __iter__(self):
+        for index in list(self.present()):
+            yield self.view(index)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self.view(index) for index in self.present()[item]]
+        return self.view(self.present()[item])
+
+    def __repr__(self):
+        return repr(list(self))
@@ -0,0 +1,147 @@
+""" Tests for sensors/domoticzs.py, against a stand-in Domoticz server.
+
+The stand-in is a small HTTP server on localhost which answers the
+Domoticz JSON API requests the sensor makes, and records each of them.
+Run from the top of the repository with:
+    python -m unittest discover tests
+
+"""
+import BaseHTTPServer
+import SocketServer
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "sensors"))
+
+import domoticzs
+
+DEVICES = [{"idx": "10", "Temp": 21.5, "Barometer": 1013.2},
+           {"idx": "11", "Temp": 18.25, "Barometer": 1009.0},
+           {"idx": "12", "Temp": 5.0}]
+
+class StandIn(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ A stand-in Domoticz server.
+
+    'mode' sets how it answers: "ok" with the devices asked for, "slow"
+    not until after the sensor has stopped waiting, or "error" with a
+    500.
+
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", 0), Handler)
+        self.mode = "ok"
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def url(self):
+        return "http://127.0.0.1:" + str(self.server_address[1])
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Answer one request to the stand-in server. """
+
+    def do_GET(self):
+        request = urlparse.urlparse(self.path)
+        query = urlparse.parse_qs(request.query)
+        with self.server.lock:
+            self.server.requests.append((request.path, query))
+        if self.server.mode == "slow":
+            # The sensor has given up by now
+            time.sleep(0.5)
+            return
+        if self.server.mode == "error":
+            self.send_response(500)
+            self.end_headers()
+            self.wfile.write("Internal error")
+            return
+        if "rid" in query:
+            devices = [device for device in DEVICES
+                       if device["idx"] == query["rid"][0]]
+        else:
+            devices = DEVICES
+        body = json.dumps({"status": "OK", "result": devices})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class DomoticzTest(unittest.TestCase):
+    """ Requests made by Domoticz sensors sharing a server. """
+
+    def setUp(self):
+        domoticzs.SERVERS.clear()
+        self.standin = StandIn()
+        self.thread = threading.Thread(target=self.standin.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        self.standin.shutdown()
+        self.standin.server_close()
+        self.thread.join()
+
+    def sensor(self, measurement, idx):
+        return domoticzs.domoticzs({"measurement": measurement,
+                                    "URL": self.standin.url(),
+                                    "IDX": str(idx)})
+
+    def sample(self, sensors):
+        return [sensor.getval() for sensor in sensors]
+
+    def test_one_request_per_sample(self):
+        sensors = [self.sensor("temp", 10), self.sensor("pres", 10),
+                   self.sensor("temp", 11), self.sensor("pres", 11)]
+        self.assertEqual(self.sample(sensors), [21.5, 1013.2, 18.25, 1009.0])
+        self.assertEqual(len(self.standin.requests), 1)
+        self.sample(sensors)
+        self.assertEqual(len(self.standin.requests), 2)
+
+    def test_single_idx(self):
+        sensors = [self.sensor("temp", 10), self.sensor("pres", 10)]
+        self.assertEqual(self.sample(sensors), [21.5, 1013.2])
+        self.assertEqual(self.standin.requests,
+                         [("/json.htm", {"type": ["devices"],
+                                         "rid": ["10"]})])
+
+    def test_several_idxs(self):
+        sensors = [self.sensor("temp", 10), self.sensor("temp", 12)]
+        self.assertEqual(self.sample(sensors), [21.5, 5.0])
+        self.assertEqual(self.standin.requests,
+                         [("/json.htm", {"type": ["devices"],
+                                         "filter": ["all"],
+                                         "used": ["true"]})])
+
+    def test_missing_field(self):
+        sensors = [self.sensor("temp", 12), self.sensor("pres", 12)]
+        self.assertEqual(self.sample(sensors), [5.0, None])
+
+    def test_timeout(self):
+        self.standin.mode = "slow"
+        sensors = [self.sensor("temp", 10), self.sensor("pres", 10),
+                   self.sensor("temp", 11)]
+        domoticzs.server(self.standin.url()).TIMEOUT = 0.2
+        began = time.time()
+        self.assertEqual(self.sample(sensors), [None, None, None])
+        # One timed out request, not one for each sensor
+        self.assertTrue(time.time() - began < 0.45)
+        self.assertEqual(len(self.standin.requests), 1)
+
+    def test_error(self):
+        self.standin.mode = "error"
+        sensors = [self.sensor("temp", 10), self.sensor("temp", 11)]
+        self.assertEqual(self.sample(sensors), [None, None])
+        self.assertEqual(len(self.standin.requests), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,163 @@
+""" Tests for sensors/pulsecounter.py, using the simulated GPIO.
+
+Synthetic streams of edges are applied to pins of the simulated GPIO
+(see sensors/simhw.py), which calls the counters' edge detection
+callbacks just as RPi.GPIO does.
+Run from the top of the repository with:
+    python -m unittest discover tests
+
+"""
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "sensors"))
+
+import clock
+import hal
+import simhw
+import pulsecounter
+
+hal.use("sim")
+
+def stream(gpio, pin, rate, seconds):
+    """Apply pulses to a pin at a steady rate.
+
+    Args:
+        gpio: The simulated GPIO.
+        pin: The pin.
+        rate: Pulses per second.
+        seconds: How long to keep it up.
+
+    """
+    due = clock.monotonic()
+    for dummy in range(int(rate * seconds)):
+        due += 1.0 / rate
+        clock.sleep_until(due)
+        gpio.pulse(pin)
+
+class PulseCounterTest(unittest.TestCase):
+    """ Counts, frequencies and gusts from synthetic edge streams. """
+
+    PIN = 5
+
+    def setUp(self):
+        # A fresh simulated GPIO and set of counters for each test
+        simhw.GPIO = None
+        pulsecounter.COUNTERS.clear()
+        self.gpio = hal.gpio()
+
+    def sensor(self, **options):
+        data = {"pinnumber": str(self.PIN)}
+        data.update(options)
+        return pulsecounter.PulseCounter(data)
+
+    def test_count(self):
+        count = self.sensor()
+        for dummy in range(50):
+            self.gpio.pulse(self.PIN)
+        self.assertEqual(count.getval(), 50)
+        self.assertEqual(count.getval(), 0)
+        self.gpio.pulse(self.PIN)
+        self.assertEqual(count.getval(), 1)
+
+    def test_count_scale_and_edges(self):
+        count = self.sensor(scale="0.5", edge="both")
+        for dummy in range(10):
+            self.gpio.pulse(self.PIN)
+        # Both edges of each pulse are counted
+        self.assertEqual(count.getval(), 10.0)
+
+    def test_frequency(self):
+        frequency = self.sensor(output="frequency", window="0.5")
+        stream(self.gpio, self.PIN, 200, 0.5)
+        self.assertAlmostEqual(frequency.getval(), 200, delta=30)
+
+    def test_gust(self):
+        frequency = self.sensor(output="frequency", window="1")
+        gust = self.sensor(output="gust", window="1", gustWindow="0.2")
+        stream(self.gpio, self.PIN, 50, 0.5)
+        stream(self.gpio, self.PIN, 200, 0.3)
+        self.assertAlmostEqual(gust.getval(), 200, delta=30)
+        self.assertLess(frequency.getval(), 120)
+
+    def test_gust_function(self):
+        times = [0.0, 1.0, 1.1, 1.2, 1.3, 3.0]
+        self.assertEqual(pulsecounter.gust(times, 0.0, 3.0, 0.5), 8.0)
+        # Edges before 'since' are left out
+        self.assertEqual(pulsecounter.gust(times, 1.25, 3.0, 0.5), 2.0)
+        self.assertEqual(pulsecounter.gust([], 0.0, 3.0, 0.5), 0.0)
+        # An interval shorter than the gust window is divided by its length
+        self.assertEqual(pulsecounter.gust(times[1:4], 1.0, 1.25, 0.5), 12.0)
+        self.assertEqual(pulsecounter.gust(times, 1.0, 1.0, 0.5), 0.0)
+
+    def test_gust_at_start(self):
+        frequency = self.sensor(output="frequency", window="10")
+        gust = self.sensor(output="gust", window="10", gustWindow="3")
+        stream(self.gpio, self.PIN, 100, 0.5)
+        # Less than a gust window has passed, so the gust is the mean
+        self.assertAlmostEqual(gust.getval(), frequency.getval(), delta=20)
+
+    def test_pulse_train(self):
+        frequency = self.sensor(output="frequency", window="1")
+        train = simhw.PulseTrain(self.gpio, self.PIN, 100.0)
+        train.start()
+        clock.sleep_until(clock.monotonic() + 1.0)
+        # The simulated rate varies by up to half either way
+        self.assertTrue(40 <= frequency.getval() <= 160)
+        self.gpio.cleanup(self.PIN)
+        train.join(1.0)
+        self.assertFalse(train.is_alive())
+
+class EdgeCounterWrapTest(unittest.TestCase):
+    """ Reads of a small ring buffer which is being written quickly. """
+
+    PIN = 6
+    SIZE = 16
+
+    def setUp(self):
+        simhw.GPIO = None
+        pulsecounter.COUNTERS.clear()
+        self.gpio = hal.gpio()
+        self.checkinterval = sys.getcheckinterval()
+        # Switch threads as often as possible, so that reads land between
+        # every step of the writer
+        sys.setcheckinterval(1)
+
+    def tearDown(self):
+        sys.setcheckinterval(self.checkinterval)
+
+    def test_wrap_under_fast_writer(self):
+        counter = pulsecounter.EdgeCounter(self.PIN, size=self.SIZE)
+        stop = threading.Event()
+        def write():
+            while not stop.is_set():
+                self.gpio.pulse(self.PIN)
+        writer = threading.Thread(target=write)
+        writer.start()
+        try:
+            lastcount = 0
+            reads = 0
+            deadline = clock.monotonic() + 3.0
+            while clock.monotonic() < deadline:
+                count, times = counter.read()
+                reads += 1
+                self.assertTrue(count >= lastcount)
+                self.assertTrue(len(times) < self.SIZE)
+                self.assertTrue(len(times) <= count)
+                self.assertEqual(times, sorted(times))
+                if count >= self.SIZE:
+                    # The initial (empty) slots have all been overwritten
+                    self.assertNotIn(0.0, times)
+                lastcount = count
+        finally:
+            stop.set()
+            writer.join()
+        # The buffer wrapped many times over while it was being read
+        self.assertTrue(counter.count > 10 * self.SIZE)
+        self.assertTrue(reads > 100)
+
+if __name__ == "__main__":
+    unittest.main()